@@ -43,8 +43,12 @@ def create_app(config_name=None):
     # Настройка логирования
     setup_logging(app)
     
-    # Импорт моделей
-    from app import models
+    # Импорт моделей, обработчиков событий ORM и загрузчика пользователей
+    from app import models, results, attendance, dashboard_stats, principals, choices
+    
+    # Сброс кэшей в остальных рабочих процессах (PostgreSQL LISTEN/NOTIFY)
+    from app.cache_bus import init_cache_bus
+    init_cache_bus(app)
     
     # Регистрация blueprints
     register_blueprints(app)
@@ -79,6 +83,40 @@ def create_app(config_name=None):
         except Exception as e:
             app.logger.warning(f'Не удалось проверить дедлайны: {e}')
     
+    # Маски посещаемости на базе, обновленной с версии без них
+    with app.app_context():
+        try:
+            from app.attendance import backfill_attendance_bitmaps
+            count = backfill_attendance_bitmaps()
+            if count:
+                app.logger.info(f'Построено масок посещаемости: {count}')
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f'Не удалось построить маски посещаемости: {e}')
+    
+    # Существующие базы получают уникальность попыток только через flask renumber-attempts
+    with app.app_context():
+        try:
+            from app.results import ATTEMPT_CONSTRAINT, has_attempt_constraint
+            if not has_attempt_constraint(db.session.connection()):
+                app.logger.warning(
+                    f'В standard_results нет ограничения {ATTEMPT_CONSTRAINT}: '
+                    f'выполните flask renumber-attempts'
+                )
+            db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f'Не удалось проверить ограничения результатов: {e}')
+    
+    # Задачи импорта, оставшиеся от завершившихся процессов
+    with app.app_context():
+        try:
+            from app.jobs import fail_orphaned_jobs
+            fail_orphaned_jobs()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f'Не удалось проверить задачи импорта: {e}')
+    
     return app
 
 
@@ -298,13 +336,6 @@ def setup_logging(app):
         app.logger.info('PE System startup')
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    """Загрузка пользователя по ID для Flask-Login"""
-    from app.models import User
-    return User.query.get(int(user_id))
-
-
 def register_cli_commands(app):
     """Регистрация CLI команд"""
     
@@ -0,0 +1,725 @@
+import calendar
+from datetime import date
+from itertools import groupby
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from sqlalchemy import and_, event, inspect, text
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Attendance, AttendanceBitmap, AttendanceDailyRollup, Student, Group, Specialty
+from app.dashboard_stats import mark_stats_changed
+
+
+ATTENDANCE_STATUSES = ['присутствовал', 'отсутствовал', 'уважительная']
+
+# Отметки в ячейках журнала
+JOURNAL_MARKS = {'присутствовал': '+', 'отсутствовал': 'н', 'уважительная': 'у'}
+
+# Размер порции строк при потоковом чтении журнала
+JOURNAL_FETCH_SIZE = 2000
+
+
+# ===================== ЗАПИСЬ ПОСЕЩАЕМОСТИ =====================
+
+def _dialect_insert(table):
+    """INSERT с поддержкой ON CONFLICT для текущей СУБД"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def upsert_attendance(attendance_date, records, created_by):
+    """
+    Сохранить отметки посещаемости за дату одним запросом
+    
+    Используется INSERT ... ON CONFLICT (student_id, date) DO UPDATE по
+    ограничению unique_student_date. Коммит выполняет вызывающий код.
+    
+    Args:
+        attendance_date: Дата занятия
+        records: Список словарей {student_id, status, comment}
+        created_by: ID пользователя, выставившего отметки
+    
+    Returns:
+        int: Количество сохраненных записей
+    """
+    if not records:
+        return 0
+    
+    # Повторные отметки одного студента в запросе: побеждает последняя
+    rows = {}
+    for record in records:
+        rows[record['student_id']] = {
+            'student_id': record['student_id'],
+            'date': attendance_date,
+            'status': record['status'],
+            'comment': record.get('comment'),
+            'created_by': created_by
+        }
+    
+    statement = _dialect_insert(Attendance.__table__).values(list(rows.values()))
+    statement = statement.on_conflict_do_update(
+        index_elements=['student_id', 'date'],
+        set_={
+            'status': statement.excluded.status,
+            'comment': statement.excluded.comment
+        }
+    )
+    db.session.execute(statement)
+    
+    # Core-запрос не проходит через flush, производные таблицы обновляются явно
+    term_start = get_term_start(attendance_date)
+    refresh_attendance_bitmaps((student_id, term_start) for student_id in rows)
+    group_ids = [
+        group_id for (group_id,) in db.session.query(Student.group_id).filter(
+            Student.id.in_(list(rows))
+        ).distinct().all()
+    ]
+    refresh_daily_rollup((attendance_date, group_id) for group_id in group_ids)
+    mark_stats_changed(group_ids)
+    
+    return len(rows)
+
+
+# ===================== ЧТЕНИЕ ПОСЕЩАЕМОСТИ =====================
+
+def get_attendance_counts(student_ids=None, group_ids=None, date_from=None, date_to=None):
+    """
+    Количество отметок посещаемости по студентам одним запросом
+    
+    Статусы считаются условной агрегацией (SUM(CASE ...)) в одном GROUP BY.
+    
+    Args:
+        student_ids: Список ID студентов или None
+        group_ids: Список ID групп или None (если оба None - все студенты)
+        date_from: Начальная дата (включительно) или None
+        date_to: Конечная дата (включительно) или None
+    
+    Returns:
+        dict: {student_id: {'total', 'present', 'absent', 'excused'}}
+              (студенты без отметок в словарь не попадают)
+    """
+    from app.utils import _scoped
+    
+    query = db.session.query(
+        Attendance.student_id,
+        db.func.count(Attendance.id),
+        db.func.sum(db.case((Attendance.status == 'присутствовал', 1), else_=0)),
+        db.func.sum(db.case((Attendance.status == 'отсутствовал', 1), else_=0)),
+        db.func.sum(db.case((Attendance.status == 'уважительная', 1), else_=0))
+    )
+    query = _scoped(query, Attendance.student_id, student_ids, group_ids)
+    
+    if date_from is not None:
+        query = query.filter(Attendance.date >= date_from)
+    if date_to is not None:
+        query = query.filter(Attendance.date <= date_to)
+    
+    return {
+        student_id: {
+            'total': total,
+            'present': present or 0,
+            'absent': absent or 0,
+            'excused': excused or 0
+        }
+        for student_id, total, present, absent, excused in query.group_by(Attendance.student_id).all()
+    }
+
+
+def get_group_attendance_for_date(group_id, attendance_date):
+    """
+    Отметки студентов группы за дату одним запросом
+    
+    Args:
+        group_id: ID группы
+        attendance_date: Дата занятия
+    
+    Returns:
+        dict: {student_id: Attendance} (только отмеченные студенты)
+    """
+    records = Attendance.query.join(
+        Student, Student.id == Attendance.student_id
+    ).filter(
+        Student.group_id == group_id,
+        Attendance.date == attendance_date
+    ).all()
+    
+    return {record.student_id: record for record in records}
+
+
+# ===================== БИТОВЫЕ МАСКИ ПОСЕЩАЕМОСТИ =====================
+
+# Ключ advisory-блокировки PostgreSQL на время первичного построения масок
+BITMAP_BACKFILL_LOCK = 731003
+
+# Статус отметки -> столбец маски в AttendanceBitmap
+STATUS_BITMAPS = {
+    'присутствовал': 'present',
+    'отсутствовал': 'absent',
+    'уважительная': 'excused'
+}
+
+
+def get_term_start(day):
+    """Начало полугодия, к которому относится дата (1 сентября или 1 февраля)"""
+    if day.month >= 9:
+        return date(day.year, 9, 1)
+    if day.month == 1:
+        return date(day.year - 1, 9, 1)
+    return date(day.year, 2, 1)
+
+
+def get_term_end(term_start):
+    """Начало следующего полугодия (граница не включается)"""
+    if term_start.month == 9:
+        return date(term_start.year + 1, 2, 1)
+    return date(term_start.year, 9, 1)
+
+
+def _to_bytes(mask):
+    return mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+
+def _from_bytes(data):
+    return int.from_bytes(data or b'', 'little')
+
+
+def _build_bitmaps(rows):
+    """
+    Собрать маски из строк (student_id, date, status)
+    
+    Бит i маски соответствует дню term_start + i.
+    
+    Returns:
+        dict: {(student_id, term_start): {'present': int, 'absent': int, 'excused': int}}
+    """
+    bitmaps = {}
+    for student_id, day, status in rows:
+        field = STATUS_BITMAPS.get(status)
+        if field is None:
+            continue
+        
+        term_start = get_term_start(day)
+        masks = bitmaps.setdefault((student_id, term_start), {'present': 0, 'absent': 0, 'excused': 0})
+        masks[field] |= 1 << (day - term_start).days
+    
+    return bitmaps
+
+
+def _bitmap_rows(bitmaps):
+    return [
+        {
+            'student_id': student_id,
+            'term_start': term_start,
+            'present': _to_bytes(masks['present']),
+            'absent': _to_bytes(masks['absent']),
+            'excused': _to_bytes(masks['excused'])
+        }
+        for (student_id, term_start), masks in bitmaps.items()
+    ]
+
+
+def rebuild_attendance_bitmaps(connection, pairs):
+    """
+    Пересобрать маски для пар (студент, начало полугодия) по таблице attendance
+    
+    Args:
+        connection: Соединение SQLAlchemy (текущая транзакция)
+        pairs: Множество (student_id, term_start)
+    """
+    pairs = {(student_id, term_start) for student_id, term_start in pairs
+             if student_id is not None and term_start is not None}
+    if not pairs:
+        return
+    
+    rows = connection.execute(
+        db.select(Attendance.student_id, Attendance.date, Attendance.status).where(
+            Attendance.student_id.in_({student_id for student_id, _ in pairs}),
+            Attendance.date >= min(term_start for _, term_start in pairs),
+            Attendance.date < max(get_term_end(term_start) for _, term_start in pairs)
+        )
+    ).all()
+    bitmaps = {key: masks for key, masks in _build_bitmaps(rows).items() if key in pairs}
+    
+    connection.execute(
+        db.delete(AttendanceBitmap).where(
+            db.tuple_(AttendanceBitmap.student_id, AttendanceBitmap.term_start).in_(list(pairs))
+        )
+    )
+    if bitmaps:
+        connection.execute(db.insert(AttendanceBitmap), _bitmap_rows(bitmaps))
+
+
+def refresh_attendance_bitmaps(pairs):
+    """Пересобрать маски в текущей транзакции сессии"""
+    rebuild_attendance_bitmaps(db.session.connection(), pairs)
+
+
+def rebuild_all_attendance_bitmaps(chunk_size=1000):
+    """
+    Полностью перестроить маски посещаемости по таблице attendance
+    
+    Returns:
+        int: Количество масок (студент x полугодие)
+    """
+    connection = db.session.connection()
+    connection.execute(db.delete(AttendanceBitmap))
+    
+    rows = db.session.query(
+        Attendance.student_id, Attendance.date, Attendance.status
+    ).yield_per(10000)
+    bitmaps = _build_bitmaps(rows)
+    
+    items = _bitmap_rows(bitmaps)
+    for i in range(0, len(items), chunk_size):
+        connection.execute(db.insert(AttendanceBitmap), items[i:i + chunk_size])
+    
+    return len(items)
+
+
+def backfill_attendance_bitmaps():
+    """
+    Построить маски на базе, где их таблица еще пуста (первый запуск после обновления)
+    
+    Вызывается при запуске приложения: без масок серии посещений и
+    календарь студента были бы пустыми до ручного запуска
+    flask rebuild-attendance-bitmaps. На PostgreSQL маски строит один
+    процесс под advisory-блокировкой, остальные пропускают шаг.
+    
+    Returns:
+        int: Количество построенных масок (0 - построение не требовалось)
+    """
+    def needs_backfill():
+        return (db.session.query(AttendanceBitmap.student_id).first() is None
+                and db.session.query(Attendance.id).first() is not None)
+    
+    if not needs_backfill():
+        return 0
+    
+    if db.session.get_bind().dialect.name == 'postgresql':
+        locked = db.session.execute(
+            text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': BITMAP_BACKFILL_LOCK}
+        ).scalar()
+        # Маски уже строит или построил другой процесс
+        if not locked or not needs_backfill():
+            db.session.rollback()
+            return 0
+    
+    count = rebuild_all_attendance_bitmaps()
+    db.session.commit()
+    return count
+
+
+def get_bitmap_counts(student_ids):
+    """
+    Количество отметок по статусам через подсчет единичных битов
+    
+    Args:
+        student_ids: Список ID студентов
+    
+    Returns:
+        dict: {student_id: {'total', 'present', 'absent', 'excused'}}
+    """
+    counts = {}
+    for bitmap in AttendanceBitmap.query.filter(AttendanceBitmap.student_id.in_(student_ids)).all():
+        item = counts.setdefault(bitmap.student_id, {'total': 0, 'present': 0, 'absent': 0, 'excused': 0})
+        for field in ('present', 'absent', 'excused'):
+            bits = _from_bytes(getattr(bitmap, field)).bit_count()
+            item[field] += bits
+            item['total'] += bits
+    
+    return counts
+
+
+def get_attendance_streaks(student_id):
+    """
+    Серии посещений подряд (по отмеченным занятиям)
+    
+    Returns:
+        dict: {'current': текущая серия, 'longest': лучшая серия}
+    """
+    current = longest = 0
+    
+    bitmaps = AttendanceBitmap.query.filter_by(student_id=student_id).order_by(AttendanceBitmap.term_start).all()
+    for bitmap in bitmaps:
+        present = _from_bytes(bitmap.present)
+        marked = present | _from_bytes(bitmap.absent) | _from_bytes(bitmap.excused)
+        
+        while marked:
+            lowest = marked & -marked
+            if present & lowest:
+                current += 1
+                longest = max(longest, current)
+            else:
+                current = 0
+            marked ^= lowest
+    
+    return {'current': current, 'longest': longest}
+
+
+def get_month_heatmap(student_id, year, month):
+    """
+    Статусы по дням месяца из среза битовых масок
+    
+    Returns:
+        dict: {день: статус или None}
+    """
+    first_day = date(year, month, 1)
+    days_count = calendar.monthrange(year, month)[1]
+    heatmap = {day: None for day in range(1, days_count + 1)}
+    
+    term_start = get_term_start(first_day)
+    bitmap = db.session.get(AttendanceBitmap, (student_id, term_start))
+    if bitmap is None:
+        return heatmap
+    
+    offset = (first_day - term_start).days
+    window = (1 << days_count) - 1
+    for status, field in STATUS_BITMAPS.items():
+        bits = (_from_bytes(getattr(bitmap, field)) >> offset) & window
+        while bits:
+            lowest = bits & -bits
+            heatmap[lowest.bit_length()] = status
+            bits ^= lowest
+    
+    return heatmap
+
+
+# ===================== ДНЕВНЫЕ СВОДКИ =====================
+
+def rebuild_daily_rollup(connection, keys):
+    """
+    Пересчитать сводку attendance_daily_rollup для пар (дата, группа)
+    
+    Args:
+        connection: Соединение SQLAlchemy (текущая транзакция)
+        keys: Множество (date, group_id)
+    """
+    keys = {(day, group_id) for day, group_id in keys if day is not None and group_id is not None}
+    if not keys:
+        return
+    
+    rows = connection.execute(
+        db.select(
+            Attendance.date,
+            Student.group_id,
+            Attendance.status,
+            db.func.count(Attendance.id)
+        ).join(
+            Student, Student.id == Attendance.student_id
+        ).where(
+            db.tuple_(Attendance.date, Student.group_id).in_(list(keys))
+        ).group_by(Attendance.date, Student.group_id, Attendance.status)
+    ).all()
+    
+    connection.execute(
+        db.delete(AttendanceDailyRollup).where(
+            db.tuple_(AttendanceDailyRollup.date, AttendanceDailyRollup.group_id).in_(list(keys))
+        )
+    )
+    if rows:
+        connection.execute(db.insert(AttendanceDailyRollup), [
+            {'date': day, 'group_id': group_id, 'status': status, 'count': count}
+            for day, group_id, status, count in rows
+        ])
+
+
+def refresh_daily_rollup(keys):
+    """Пересчитать дневную сводку в текущей транзакции сессии"""
+    rebuild_daily_rollup(db.session.connection(), keys)
+
+
+def rebuild_all_daily_rollup():
+    """
+    Полностью перестроить дневную сводку одним INSERT ... SELECT
+    
+    Returns:
+        int: Количество строк сводки
+    """
+    connection = db.session.connection()
+    connection.execute(db.delete(AttendanceDailyRollup))
+    connection.execute(
+        db.insert(AttendanceDailyRollup).from_select(
+            ['date', 'group_id', 'status', 'count'],
+            db.select(
+                Attendance.date,
+                Student.group_id,
+                Attendance.status,
+                db.func.count(Attendance.id)
+            ).join(
+                Student, Student.id == Attendance.student_id
+            ).group_by(Attendance.date, Student.group_id, Attendance.status)
+        )
+    )
+    
+    return db.session.query(db.func.count()).select_from(AttendanceDailyRollup).scalar()
+
+
+def _rollup_query(*columns, date_from=None, date_to=None, group_ids=None, faculty_id=None):
+    """Запрос к дневной сводке с фильтрами по периоду, группам и факультету"""
+    query = db.session.query(*columns)
+    
+    if date_from is not None:
+        query = query.filter(AttendanceDailyRollup.date >= date_from)
+    if date_to is not None:
+        query = query.filter(AttendanceDailyRollup.date <= date_to)
+    if group_ids is not None:
+        query = query.filter(AttendanceDailyRollup.group_id.in_(group_ids))
+    if faculty_id is not None:
+        query = query.filter(AttendanceDailyRollup.group_id.in_(
+            db.select(Group.id).join(Specialty, Specialty.id == Group.specialty_id)
+            .where(Specialty.faculty_id == faculty_id)
+        ))
+    
+    return query
+
+
+def _present_count():
+    return db.func.sum(db.case(
+        (AttendanceDailyRollup.status == 'присутствовал', AttendanceDailyRollup.count), else_=0
+    ))
+
+
+def get_attendance_dynamics(date_from=None, date_to=None, group_ids=None, faculty_id=None):
+    """
+    Посещаемость по дням из дневной сводки
+    
+    Args:
+        date_from: Начальная дата или None
+        date_to: Конечная дата или None
+        group_ids: Список ID групп или None (все группы)
+        faculty_id: ID факультета или None
+    
+    Returns:
+        list: [{'date', 'total', 'present', 'percentage'}] по возрастанию даты
+    """
+    query = _rollup_query(
+        AttendanceDailyRollup.date,
+        db.func.sum(AttendanceDailyRollup.count),
+        _present_count(),
+        date_from=date_from, date_to=date_to, group_ids=group_ids, faculty_id=faculty_id
+    )
+    
+    dynamics = []
+    for day, total, present in query.group_by(AttendanceDailyRollup.date).order_by(AttendanceDailyRollup.date).all():
+        present = present or 0
+        dynamics.append({
+            'date': day,
+            'total': total,
+            'present': present,
+            'percentage': round((present / total * 100) if total > 0 else 0, 2)
+        })
+    
+    return dynamics
+
+
+def get_attendance_by_group(date_from=None, date_to=None, faculty_id=None):
+    """
+    Посещаемость групп за период из дневной сводки
+    
+    Returns:
+        dict: {group_id: {'total', 'present', 'percentage'}}
+    """
+    query = _rollup_query(
+        AttendanceDailyRollup.group_id,
+        db.func.sum(AttendanceDailyRollup.count),
+        _present_count(),
+        date_from=date_from, date_to=date_to, faculty_id=faculty_id
+    )
+    
+    by_group = {}
+    for group_id, total, present in query.group_by(AttendanceDailyRollup.group_id).all():
+        present = present or 0
+        by_group[group_id] = {
+            'total': total,
+            'present': present,
+            'percentage': round((present / total * 100) if total > 0 else 0, 2)
+        }
+    
+    return by_group
+
+
+# ===================== ЖУРНАЛ ПОСЕЩАЕМОСТИ =====================
+
+def get_journal_dates(group_id, date_from=None, date_to=None):
+    """
+    Даты занятий группы за период (столбцы журнала) из дневной сводки
+    
+    Returns:
+        list: Даты по возрастанию
+    """
+    query = _rollup_query(
+        AttendanceDailyRollup.date,
+        date_from=date_from, date_to=date_to, group_ids=[group_id]
+    )
+    return [day for (day,) in query.distinct().order_by(AttendanceDailyRollup.date)]
+
+
+def iter_journal_rows(group_id, date_from=None, date_to=None):
+    """
+    Отметки студентов группы за период одним упорядоченным запросом
+    
+    Студенты соединяются с отметками внешним соединением, строки читаются
+    порциями (yield_per) и группируются по студенту на лету, поэтому в
+    памяти держатся только отметки одного студента.
+    
+    Args:
+        group_id: ID группы
+        date_from: Начало периода или None
+        date_to: Конец периода или None
+    
+    Yields:
+        tuple: (ФИО, номер студента, список (дата, статус))
+    """
+    join_condition = [Attendance.student_id == Student.id]
+    if date_from is not None:
+        join_condition.append(Attendance.date >= date_from)
+    if date_to is not None:
+        join_condition.append(Attendance.date <= date_to)
+    
+    query = db.session.query(
+        Student.id,
+        Student.full_name,
+        Student.student_number,
+        Attendance.date,
+        Attendance.status
+    ).outerjoin(
+        Attendance, and_(*join_condition)
+    ).filter(
+        Student.group_id == group_id
+    ).order_by(
+        Student.full_name, Student.id, Attendance.date
+    ).yield_per(JOURNAL_FETCH_SIZE)
+    
+    for (_, full_name, student_number), rows in groupby(query, key=lambda row: row[:3]):
+        yield full_name, student_number, [(row[3], row[4]) for row in rows if row[3] is not None]
+
+
+def write_attendance_journal(fileobj, group, date_from=None, date_to=None):
+    """
+    Записать журнал посещаемости группы (студенты x даты) в .xlsx
+    
+    Книга пишется в режиме write_only построчно: по строке на студента
+    с итогами по статусам и процентом посещаемости, внизу - итоги по
+    каждой дате. Память ограничена одной строкой и счетчиками по датам
+    независимо от длины периода и размера группы.
+    
+    Args:
+        fileobj: Путь или файловый объект для сохранения книги
+        group: Объект Group
+        date_from: Начало периода или None
+        date_to: Конец периода или None
+    """
+    dates = get_journal_dates(group.id, date_from, date_to)
+    column_index = {day: index for index, day in enumerate(dates)}
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Журнал')
+    
+    sheet.column_dimensions['A'].width = 6
+    sheet.column_dimensions['B'].width = 36
+    sheet.column_dimensions['C'].width = 14
+    for index in range(len(dates)):
+        sheet.column_dimensions[get_column_letter(index + 4)].width = 6
+    
+    def bold(value):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.font = Font(bold=True)
+        return cell
+    
+    period = ' - '.join(day.strftime('%d.%m.%Y') for day in (date_from, date_to) if day is not None)
+    sheet.append([bold(f'Журнал посещаемости группы {group.name}'), None, period])
+    sheet.append([])
+    sheet.append([bold(value) for value in (
+        ['№', 'ФИО студента', 'Номер'] + [day.strftime('%d.%m') for day in dates] +
+        ['Присутствовал', 'Отсутствовал', 'Уважительная', '%']
+    )])
+    
+    by_date = {status: [0] * len(dates) for status in ATTENDANCE_STATUSES}
+    
+    for number, (full_name, student_number, marks) in enumerate(iter_journal_rows(group.id, date_from, date_to), start=1):
+        cells = [None] * len(dates)
+        counts = dict.fromkeys(ATTENDANCE_STATUSES, 0)
+        
+        for day, status in marks:
+            index = column_index.get(day)
+            if index is None or status not in counts:
+                continue
+            cells[index] = JOURNAL_MARKS[status]
+            counts[status] += 1
+            by_date[status][index] += 1
+        
+        total = sum(counts.values())
+        present = counts['присутствовал']
+        percentage = round(present / total * 100, 1) if total > 0 else 0
+        
+        sheet.append([number, full_name, student_number] + cells + [
+            present, counts['отсутствовал'], counts['уважительная'], percentage
+        ])
+    
+    sheet.append([])
+    titles = ['Присутствовало', 'Отсутствовало', 'По уважительной причине']
+    for position, (status, title) in enumerate(zip(ATTENDANCE_STATUSES, titles)):
+        # Общий итог статуса - под столбцом этого статуса
+        sheet.append([None, bold(title), None] + by_date[status] + [None] * position + [sum(by_date[status])])
+    
+    workbook.save(fileobj)
+
+
+# ===================== СИНХРОНИЗАЦИЯ =====================
+
+@event.listens_for(Session, 'after_flush')
+def _sync_attendance_projections(session, flush_context):
+    """Обновить битовые маски и дневную сводку по изменениям в сессии"""
+    bitmap_pairs = set()
+    rollup_students = {}
+    
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Attendance):
+            continue
+        
+        state = inspect(obj)
+        student_ids = {obj.student_id, *(state.attrs.student_id.history.deleted or ())}
+        dates = {obj.date, *(state.attrs.date.history.deleted or ())}
+        for student_id in student_ids:
+            for day in dates:
+                if day is not None:
+                    bitmap_pairs.add((student_id, get_term_start(day)))
+                    rollup_students.setdefault(student_id, set()).add(day)
+    
+    rollup_keys = set()
+    
+    # Перевод студента в другую группу переносит его отметки между группами
+    for obj in session.dirty:
+        if not isinstance(obj, Student):
+            continue
+        old_groups = inspect(obj).attrs.group_id.history.deleted
+        if not old_groups:
+            continue
+        days = [row[0] for row in session.connection().execute(
+            db.select(Attendance.date).where(Attendance.student_id == obj.id).distinct()
+        ).all()]
+        for group_id in [obj.group_id, *old_groups]:
+            rollup_keys.update((day, group_id) for day in days)
+    
+    if rollup_students:
+        # Группа удаленного студента известна только из объекта в сессии
+        groups = {obj.id: obj.group_id for obj in session.deleted if isinstance(obj, Student)}
+        missing = [student_id for student_id in rollup_students if student_id not in groups]
+        if missing:
+            groups.update(session.connection().execute(
+                db.select(Student.id, Student.group_id).where(Student.id.in_(missing))
+            ).all())
+        for student_id, days in rollup_students.items():
+            group_id = groups.get(student_id)
+            rollup_keys.update((day, group_id) for day in days)
+    
+    if bitmap_pairs:
+        rebuild_attendance_bitmaps(session.connection(), bitmap_pairs)
+    if rollup_keys:
+        rebuild_daily_rollup(session.connection(), rollup_keys)
+
@@ -0,0 +1,659 @@
+import csv
+import os
+from datetime import date, datetime
+from sqlalchemy import bindparam, text
+from app import db
+from app.models import (Group, Student, Standard, StandardResult, Attendance, ImportJob,
+                        JOB_RUNNING, JOB_DONE, JOB_FAILED)
+from app.attendance import ATTENDANCE_STATUSES, _dialect_insert
+from app.dashboard_stats import mark_stats_changed
+from app.imports import MALE_VALUES, FEMALE_VALUES, get_imports_folder
+
+
+# Размер пачки строк для executemany (резервный путь без COPY)
+BULK_CHUNK_SIZE = 5000
+
+# Столбцы CSV-файлов по видам загрузки (первая строка файла - заголовок)
+BULK_COLUMNS = {
+    'students': ['full_name', 'student_number', 'group_name', 'gender', 'birth_date', 'medical_group'],
+    'attendance': ['student_number', 'date', 'status', 'comment'],
+    'results': ['student_number', 'standard_id', 'result_value', 'date']
+}
+
+BULK_DELIMITERS = (',', ';', '\t')
+
+DATE_PATTERN = r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])$'
+NUMBER_PATTERN = r'^-?\d+(\.\d+)?$'
+
+
+def _invalid_date_sql(column):
+    """
+    SQL-условие "значение не является существующей датой ГГГГ-ММ-ДД"
+    
+    Шаблон пропускает несуществующие даты (2024-02-30), а приведение ::date
+    на них падает и прерывает всю загрузку. Число дня сравнивается с длиной
+    месяца; CASE гарантирует, что числа из строки извлекаются только после
+    проверки шаблоном.
+    """
+    value = f'trim({column})'
+    return f"""(CASE
+        WHEN {value} !~ '{DATE_PATTERN}' THEN true
+        WHEN substr({value}, 1, 4)::int = 0 THEN true
+        ELSE substr({value}, 9, 2)::int > extract(day from
+            make_date(substr({value}, 1, 4)::int, substr({value}, 6, 2)::int, 1)
+            + interval '1 month - 1 day')
+    END)"""
+
+
+# ===================== МАССОВАЯ ЗАГРУЗКА CSV =====================
+
+def bulk_load(kind, stream, created_by, delimiter=',', on_error=None):
+    """
+    Загрузить CSV-файл студентов, посещаемости или результатов
+    
+    На PostgreSQL файл копируется во временную таблицу через COPY
+    (copy_expert), проверяется набором UPDATE и сливается в целевую
+    таблицу одним INSERT ... SELECT ... ON CONFLICT. На остальных СУБД
+    строки проверяются в Python и вставляются пачками через executemany.
+    После загрузки перестраиваются записи производных таблиц и рейтинги
+    только затронутых студентов. Коммит выполняет вызывающий код.
+    
+    Args:
+        kind: Вид загрузки ('students', 'attendance', 'results')
+        stream: Текстовый поток CSV
+        created_by: ID пользователя (для посещаемости и результатов)
+        delimiter: Разделитель CSV
+        on_error: Функция (номер строки, текст ошибки) или None -
+                  тогда ошибки собираются в список errors
+    
+    Returns:
+        dict: loaded - загружено строк, error_count - отклонено строк,
+              errors - список (номер строки, текст ошибки), если on_error не задан
+    """
+    if kind not in BULK_COLUMNS:
+        raise ValueError(f'Неизвестный вид загрузки: {kind}')
+    if delimiter not in BULK_DELIMITERS:
+        raise ValueError(f'Недопустимый разделитель: {delimiter!r}')
+    
+    summary = {'loaded': 0, 'error_count': 0, 'errors': []}
+    if on_error is None:
+        on_error = lambda line_no, message: summary['errors'].append((line_no, message))
+    
+    def report(line_no, message):
+        summary['error_count'] += 1
+        on_error(line_no, message)
+    
+    if db.session.get_bind().dialect.name == 'postgresql':
+        student_ids, keys = _copy_load(kind, stream, created_by, delimiter, report, summary)
+    else:
+        student_ids, keys = _executemany_load(kind, stream, created_by, delimiter, report, summary)
+    
+    _refresh_after_load(kind, student_ids, keys)
+    return summary
+
+
+def _chunks(items, size=BULK_CHUNK_SIZE):
+    """Отсортированные пачки элементов множества"""
+    items = sorted(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _refresh_after_load(kind, student_ids, keys):
+    """
+    Перестроить производные таблицы после загрузки в обход ORM
+    
+    Пересчитываются только затронутые записи проекций, пачками.
+    
+    Args:
+        kind: Вид загрузки
+        student_ids: ID затронутых студентов
+        keys: Для посещаемости - (student_id, date) загруженных отметок,
+              для результатов - (student_id, standard_id),
+              для студентов - (student_id, старая группа, новая группа)
+              переведенных в другую группу
+    """
+    from app.attendance import get_term_start, refresh_attendance_bitmaps, refresh_daily_rollup
+    from app.results import refresh_best_results
+    from app.scoring import RESCORE_CHUNK_SIZE
+    from app.utils import refresh_student_ratings, create_student_ratings
+    
+    db.session.info['results_changed'] = True
+    mark_stats_changed()
+    
+    rollup_keys = set()
+    if kind == 'attendance':
+        for chunk in _chunks({(student_id, get_term_start(day)) for student_id, day in keys}):
+            refresh_attendance_bitmaps(chunk)
+        
+        groups = {}
+        for chunk in _chunks({student_id for student_id, _ in keys}):
+            groups.update(db.session.query(Student.id, Student.group_id).filter(Student.id.in_(chunk)).all())
+        rollup_keys = {(day, groups.get(student_id)) for student_id, day in keys}
+    
+    elif kind == 'students':
+        # Перевод студента переносит его отметки из сводок старой группы в новую
+        moved = {student_id: (old_group, new_group) for student_id, old_group, new_group in keys}
+        for chunk in _chunks(moved):
+            for student_id, day in db.session.query(Attendance.student_id, Attendance.date).filter(
+                Attendance.student_id.in_(chunk)
+            ).distinct():
+                rollup_keys.update((day, group_id) for group_id in moved[student_id])
+    
+    elif kind == 'results':
+        for chunk in _chunks(keys):
+            refresh_best_results(chunk)
+    
+    for chunk in _chunks(rollup_keys):
+        refresh_daily_rollup(chunk)
+    
+    for chunk in _chunks(student_ids, RESCORE_CHUNK_SIZE):
+        if kind == 'students':
+            # Рейтинги новых студентов (у обновленных записи уже есть)
+            create_student_ratings(chunk)
+        else:
+            refresh_student_ratings(student_ids=chunk)
+
+
+def _score_results(rows):
+    """
+    Баллы для загруженных результатов через numpy по каждой шкале
+    
+    Args:
+        rows: Список (result_id, student_id, standard_id, result_value)
+    
+    Returns:
+        list: [{'id', 'points'}] для пакетного UPDATE
+    """
+    from app.scoring import get_scale_index
+    import numpy as np
+    
+    genders = {}
+    student_ids = list({row[1] for row in rows})
+    for i in range(0, len(student_ids), BULK_CHUNK_SIZE):
+        genders.update(db.session.query(Student.id, Student.gender).filter(
+            Student.id.in_(student_ids[i:i + BULK_CHUNK_SIZE])
+        ).all())
+    
+    grouped = {}
+    for result_id, student_id, standard_id, result_value in rows:
+        grouped.setdefault((standard_id, genders.get(student_id)), []).append((result_id, result_value))
+    
+    index = get_scale_index()
+    updates = []
+    for key, items in grouped.items():
+        scale = index['scales'].get(key)
+        if key[0] not in index['standards'] or scale is None:
+            points = [0] * len(items)
+        else:
+            points = scale.score_array(np.asarray([value for _, value in items], dtype=float)).tolist()
+        updates.extend({'id': result_id, 'points': p} for (result_id, _), p in zip(items, points))
+    
+    return updates
+
+
+# ===================== POSTGRESQL: COPY =====================
+
+def _copy_load(kind, stream, created_by, delimiter, report, summary):
+    """Загрузка через временную таблицу и COPY; возвращает ID студентов и ключи (см. _refresh_after_load)"""
+    columns = BULK_COLUMNS[kind]
+    stage = f'bulk_stage_{kind}'
+    
+    db.session.execute(text(f'DROP TABLE IF EXISTS {stage}'))
+    db.session.execute(text(
+        f'CREATE TEMP TABLE {stage} (line_no serial, '
+        + ', '.join(f'{column} text' for column in columns)
+        + ', error text) ON COMMIT DROP'
+    ))
+    
+    # COPY выполняется в той же транзакции, что и сессия
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {stage} ({', '.join(columns)}) FROM STDIN "
+            f"WITH (FORMAT csv, HEADER true, DELIMITER '{delimiter}')",
+            stream
+        )
+    finally:
+        cursor.close()
+    
+    params = {
+        'male': list(MALE_VALUES),
+        'female': list(FEMALE_VALUES),
+        'statuses': ATTENDANCE_STATUSES,
+        'created_by': created_by
+    }
+    
+    for statement in _VALIDATION_SQL[kind]:
+        db.session.execute(statement, params)
+    
+    # Номер строки файла: заголовок - первая строка
+    for line_no, error in db.session.execute(text(
+        f'SELECT line_no + 1, error FROM {stage} WHERE error IS NOT NULL ORDER BY line_no'
+    )).yield_per(BULK_CHUNK_SIZE):
+        report(line_no, error)
+    
+    # Переводы между группами видны только до слияния
+    moved = db.session.execute(_MOVED_SQL).all() if kind == 'students' else []
+    
+    rows = db.session.execute(_MERGE_SQL[kind], params).all()
+    
+    if kind == 'results':
+        for result_id, _, _, _, line_no in rows:
+            if result_id is None:
+                report(line_no, 'номер попытки занят параллельной загрузкой, повторите строку')
+        rows = [row[:4] for row in rows if row[0] is not None]
+    
+    summary['loaded'] = len(rows)
+    
+    if kind == 'results' and rows:
+        updates = _score_results(rows)
+        for i in range(0, len(updates), BULK_CHUNK_SIZE):
+            db.session.execute(db.update(StandardResult), updates[i:i + BULK_CHUNK_SIZE])
+    
+    if kind == 'students':
+        return {row[0] for row in rows}, set(moved)
+    if kind == 'attendance':
+        return {row[0] for row in rows}, {tuple(row) for row in rows}
+    return {row[1] for row in rows}, {(row[1], row[2]) for row in rows}
+
+
+def _expanding(statement, *names):
+    return text(statement).bindparams(*(bindparam(name, expanding=True) for name in names))
+
+
+_VALIDATION_SQL = {
+    'students': [
+        _expanding(f"""
+            UPDATE bulk_stage_students s SET error = CASE
+                WHEN coalesce(trim(full_name), '') = '' OR coalesce(trim(student_number), '') = ''
+                     OR coalesce(trim(group_name), '') = '' OR coalesce(trim(gender), '') = ''
+                    THEN 'отсутствуют обязательные поля'
+                WHEN lower(trim(gender)) NOT IN :male AND lower(trim(gender)) NOT IN :female
+                    THEN 'неверный пол'
+                WHEN NOT EXISTS (SELECT 1 FROM groups g WHERE g.name = trim(s.group_name))
+                    THEN 'группа "' || trim(group_name) || '" не найдена'
+                WHEN coalesce(trim(birth_date), '') <> '' AND {_invalid_date_sql('birth_date')}
+                    THEN 'неверная дата рождения'
+            END
+        """, 'male', 'female'),
+        text("""
+            UPDATE bulk_stage_students s SET error = 'номер повторяется в файле'
+            FROM (
+                SELECT line_no, row_number() OVER (PARTITION BY trim(student_number) ORDER BY line_no) AS n
+                FROM bulk_stage_students WHERE error IS NULL
+            ) d
+            WHERE d.line_no = s.line_no AND d.n > 1
+        """)
+    ],
+    'attendance': [
+        _expanding(f"""
+            UPDATE bulk_stage_attendance s SET error = CASE
+                WHEN coalesce(trim(student_number), '') = '' OR coalesce(trim(date), '') = ''
+                     OR coalesce(trim(status), '') = ''
+                    THEN 'отсутствуют обязательные поля'
+                WHEN trim(status) NOT IN :statuses
+                    THEN 'неверный статус'
+                WHEN {_invalid_date_sql('date')}
+                    THEN 'неверная дата'
+                WHEN NOT EXISTS (SELECT 1 FROM students st WHERE st.student_number = trim(s.student_number))
+                    THEN 'студент с номером ' || trim(student_number) || ' не найден'
+            END
+        """, 'statuses'),
+        text("""
+            UPDATE bulk_stage_attendance s SET error = 'отметка повторяется в файле'
+            FROM (
+                SELECT line_no, row_number() OVER (
+                    PARTITION BY trim(student_number), trim(date) ORDER BY line_no
+                ) AS n
+                FROM bulk_stage_attendance WHERE error IS NULL
+            ) d
+            WHERE d.line_no = s.line_no AND d.n > 1
+        """)
+    ],
+    'results': [
+        text(f"""
+            UPDATE bulk_stage_results s SET error = CASE
+                WHEN coalesce(trim(student_number), '') = '' OR coalesce(trim(standard_id), '') = ''
+                     OR coalesce(trim(result_value), '') = '' OR coalesce(trim(date), '') = ''
+                    THEN 'отсутствуют обязательные поля'
+                WHEN trim(standard_id) !~ '^\\d{{1,9}}$'
+                    THEN 'норматив ' || trim(standard_id) || ' не найден'
+                WHEN NOT EXISTS (SELECT 1 FROM standards n WHERE n.id = trim(s.standard_id)::int)
+                    THEN 'норматив ' || trim(standard_id) || ' не найден'
+                WHEN trim(result_value) !~ '{NUMBER_PATTERN}'
+                    THEN 'неверное значение результата'
+                WHEN {_invalid_date_sql('date')}
+                    THEN 'неверная дата'
+                WHEN NOT EXISTS (SELECT 1 FROM students st WHERE st.student_number = trim(s.student_number))
+                    THEN 'студент с номером ' || trim(student_number) || ' не найден'
+            END
+        """)
+    ]
+}
+
+# Существующие студенты, которых загрузка переведет в другую группу
+_MOVED_SQL = text("""
+    SELECT st.id, st.group_id, g.id
+    FROM bulk_stage_students s
+    JOIN (SELECT name, min(id) AS id FROM groups GROUP BY name) g ON g.name = trim(s.group_name)
+    JOIN students st ON st.student_number = trim(s.student_number)
+    WHERE s.error IS NULL AND st.group_id <> g.id
+""")
+
+_MERGE_SQL = {
+    'students': _expanding("""
+        INSERT INTO students (full_name, student_number, gender, birth_date, medical_group, group_id, created_at)
+        SELECT trim(s.full_name),
+               trim(s.student_number),
+               CASE WHEN lower(trim(s.gender)) IN :male THEN 'male' ELSE 'female' END,
+               nullif(trim(s.birth_date), '')::date,
+               coalesce(nullif(trim(s.medical_group), ''), 'основная'),
+               g.id,
+               now() AT TIME ZONE 'utc'
+        FROM bulk_stage_students s
+        JOIN (SELECT name, min(id) AS id FROM groups GROUP BY name) g ON g.name = trim(s.group_name)
+        WHERE s.error IS NULL
+        ON CONFLICT (student_number) DO UPDATE SET
+            full_name = EXCLUDED.full_name,
+            gender = EXCLUDED.gender,
+            birth_date = coalesce(EXCLUDED.birth_date, students.birth_date),
+            medical_group = EXCLUDED.medical_group,
+            group_id = EXCLUDED.group_id
+        RETURNING id
+    """, 'male'),
+    'attendance': text("""
+        INSERT INTO attendance (student_id, date, status, comment, created_by, created_at)
+        SELECT st.id, trim(s.date)::date, trim(s.status), nullif(s.comment, ''), :created_by,
+               now() AT TIME ZONE 'utc'
+        FROM bulk_stage_attendance s
+        JOIN students st ON st.student_number = trim(s.student_number)
+        WHERE s.error IS NULL
+        ON CONFLICT (student_id, date) DO UPDATE SET
+            status = EXCLUDED.status,
+            comment = EXCLUDED.comment
+        RETURNING student_id, date
+    """),
+    # Номер попытки может оказаться занят параллельной записью: такие строки
+    # не вставляются и возвращаются с id = NULL и номером строки файла
+    'results': text("""
+        WITH staged AS (
+            SELECT s.line_no,
+                   st.id AS student_id,
+                   trim(s.standard_id)::int AS standard_id,
+                   trim(s.result_value)::float AS result_value,
+                   trim(s.date)::date AS date,
+                   row_number() OVER (
+                       PARTITION BY st.id, trim(s.standard_id)::int ORDER BY s.line_no
+                   ) AS n
+            FROM bulk_stage_results s
+            JOIN students st ON st.student_number = trim(s.student_number)
+            WHERE s.error IS NULL
+        ),
+        numbered AS (
+            SELECT staged.*,
+                   coalesce((
+                       SELECT max(r.attempt_number) FROM standard_results r
+                       WHERE r.student_id = staged.student_id AND r.standard_id = staged.standard_id
+                   ), 0) + staged.n AS attempt_number
+            FROM staged
+        ),
+        inserted AS (
+            INSERT INTO standard_results
+                (student_id, standard_id, result_value, points, date, attempt_number, created_by, created_at)
+            SELECT n.student_id, n.standard_id, n.result_value, 0, n.date, n.attempt_number,
+                   :created_by,
+                   now() AT TIME ZONE 'utc'
+            FROM numbered n
+            ON CONFLICT (student_id, standard_id, attempt_number) DO NOTHING
+            RETURNING id, student_id, standard_id, result_value, attempt_number
+        )
+        SELECT i.id, i.student_id, i.standard_id, i.result_value, NULL::int AS line_no
+        FROM inserted i
+        UNION ALL
+        SELECT NULL, n.student_id, n.standard_id, n.result_value, n.line_no + 1
+        FROM numbered n
+        WHERE NOT EXISTS (
+            SELECT 1 FROM inserted i
+            WHERE i.student_id = n.student_id AND i.standard_id = n.standard_id
+                  AND i.attempt_number = n.attempt_number
+        )
+        ORDER BY line_no NULLS FIRST
+    """)
+}
+
+
+# ===================== РЕЗЕРВНЫЙ ПУТЬ: EXECUTEMANY =====================
+
+def _parse_date(value):
+    """Дата в формате ГГГГ-ММ-ДД или None"""
+    try:
+        return date.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _executemany_load(kind, stream, created_by, delimiter, report, summary):
+    """Загрузка с проверкой в Python и пачками executemany; возвращает ID студентов и ключи (см. _refresh_after_load)"""
+    columns = BULK_COLUMNS[kind]
+    reader = csv.reader(stream, delimiter=delimiter)
+    next(reader, None)  # Заголовок
+    
+    if kind == 'students':
+        groups = dict(db.session.query(Group.name, Group.id).all())
+    else:
+        students = {number: student_id for number, student_id in db.session.query(
+            Student.student_number, Student.id
+        ).all()}
+    if kind == 'results':
+        standard_ids = {standard_id for (standard_id,) in db.session.query(Standard.id).all()}
+        attempts = {(student_id, standard_id): number for student_id, standard_id, number in db.session.query(
+            StandardResult.student_id,
+            StandardResult.standard_id,
+            db.func.max(StandardResult.attempt_number)
+        ).group_by(StandardResult.student_id, StandardResult.standard_id).all()}
+    
+    seen = set()
+    student_ids = set()
+    keys = set()
+    chunk = []
+    
+    def flush_chunk():
+        if kind == 'results':
+            rows = db.session.execute(
+                db.insert(StandardResult).returning(
+                    StandardResult.id, StandardResult.student_id,
+                    StandardResult.standard_id, StandardResult.result_value,
+                    sort_by_parameter_order=True
+                ),
+                chunk
+            ).all()
+            db.session.execute(db.update(StandardResult), _score_results(rows))
+        else:
+            table = Student if kind == 'students' else Attendance
+            statement = _dialect_insert(table)
+            if kind == 'students':
+                # Переводы между группами видны только до вставки
+                old_groups = dict(db.session.query(Student.student_number, Student.group_id).filter(
+                    Student.student_number.in_([row['student_number'] for row in chunk])
+                ).all())
+                statement = statement.on_conflict_do_update(
+                    index_elements=['student_number'],
+                    set_={
+                        'full_name': statement.excluded.full_name,
+                        'gender': statement.excluded.gender,
+                        'birth_date': db.func.coalesce(statement.excluded.birth_date, Student.birth_date),
+                        'medical_group': statement.excluded.medical_group,
+                        'group_id': statement.excluded.group_id
+                    }
+                )
+                ids = db.session.scalars(
+                    statement.returning(Student.id, sort_by_parameter_order=True), chunk
+                ).all()
+                student_ids.update(ids)
+                keys.update(
+                    (student_id, old_groups[row['student_number']], row['group_id'])
+                    for student_id, row in zip(ids, chunk)
+                    if old_groups.get(row['student_number'], row['group_id']) != row['group_id']
+                )
+            else:
+                statement = statement.on_conflict_do_update(
+                    index_elements=['student_id', 'date'],
+                    set_={'status': statement.excluded.status, 'comment': statement.excluded.comment}
+                )
+                db.session.execute(statement, chunk)
+        summary['loaded'] += len(chunk)
+        chunk.clear()
+    
+    for line_no, row in enumerate(reader, start=2):
+        if not any(row):
+            continue
+        
+        values = dict(zip(columns, [cell.strip() for cell in row] + [''] * (len(columns) - len(row))))
+        required = [column for column in columns if column not in ('birth_date', 'medical_group', 'comment')]
+        if not all(values[column] for column in required):
+            report(line_no, 'отсутствуют обязательные поля')
+            continue
+        
+        if kind == 'students':
+            gender = values['gender'].lower()
+            if gender not in MALE_VALUES and gender not in FEMALE_VALUES:
+                report(line_no, 'неверный пол')
+                continue
+            if values['group_name'] not in groups:
+                report(line_no, f'группа "{values["group_name"]}" не найдена')
+                continue
+            birth_date = _parse_date(values['birth_date'])
+            if values['birth_date'] and birth_date is None:
+                report(line_no, 'неверная дата рождения')
+                continue
+            if values['student_number'] in seen:
+                report(line_no, 'номер повторяется в файле')
+                continue
+            seen.add(values['student_number'])
+            chunk.append({
+                'full_name': values['full_name'],
+                'student_number': values['student_number'],
+                'gender': 'male' if gender in MALE_VALUES else 'female',
+                'birth_date': birth_date,
+                'medical_group': values['medical_group'] or 'основная',
+                'group_id': groups[values['group_name']]
+            })
+        
+        elif kind == 'attendance':
+            record_date = _parse_date(values['date'])
+            if values['status'] not in ATTENDANCE_STATUSES:
+                report(line_no, 'неверный статус')
+                continue
+            if record_date is None:
+                report(line_no, 'неверная дата')
+                continue
+            student_id = students.get(values['student_number'])
+            if student_id is None:
+                report(line_no, f'студент с номером {values["student_number"]} не найден')
+                continue
+            if (student_id, record_date) in seen:
+                report(line_no, 'отметка повторяется в файле')
+                continue
+            seen.add((student_id, record_date))
+            student_ids.add(student_id)
+            keys.add((student_id, record_date))
+            chunk.append({
+                'student_id': student_id,
+                'date': record_date,
+                'status': values['status'],
+                'comment': values['comment'] or None,
+                'created_by': created_by
+            })
+        
+        else:
+            standard_id = int(values['standard_id']) if values['standard_id'].isdigit() else None
+            if standard_id not in standard_ids:
+                report(line_no, f'норматив {values["standard_id"]} не найден')
+                continue
+            try:
+                result_value = float(values['result_value'])
+            except ValueError:
+                report(line_no, 'неверное значение результата')
+                continue
+            result_date = _parse_date(values['date'])
+            if result_date is None:
+                report(line_no, 'неверная дата')
+                continue
+            student_id = students.get(values['student_number'])
+            if student_id is None:
+                report(line_no, f'студент с номером {values["student_number"]} не найден')
+                continue
+            key = (student_id, standard_id)
+            attempts[key] = (attempts.get(key) or 0) + 1
+            student_ids.add(student_id)
+            keys.add(key)
+            chunk.append({
+                'student_id': student_id,
+                'standard_id': standard_id,
+                'result_value': result_value,
+                'points': 0,
+                'date': result_date,
+                'attempt_number': attempts[key],
+                'created_by': created_by
+            })
+        
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            flush_chunk()
+    
+    if chunk:
+        flush_chunk()
+    
+    return student_ids, keys
+
+
+# ===================== ФОНОВАЯ ЗАГРУЗКА =====================
+
+def run_bulk_load_job(job_id, filepath, kind, delimiter=','):
+    """
+    Выполнить массовую загрузку CSV как фоновую задачу импорта
+    
+    Args:
+        job_id: ID задачи ImportJob
+        filepath: Путь к файлу CSV
+        kind: Вид загрузки
+        delimiter: Разделитель CSV
+    """
+    job = db.session.get(ImportJob, job_id)
+    job.status = JOB_RUNNING
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    
+    error_path = os.path.join(get_imports_folder(), f'import_{job_id}_errors.csv')
+    
+    try:
+        with open(error_path, 'w', newline='', encoding='utf-8-sig') as error_file, \
+                open(filepath, newline='', encoding='utf-8-sig') as stream:
+            writer = csv.writer(error_file, delimiter=';')
+            writer.writerow(['Строка', 'Ошибка'])
+            
+            summary = bulk_load(
+                kind, stream, job.created_by, delimiter,
+                on_error=lambda line_no, message: writer.writerow([line_no, message])
+            )
+        
+        job.imported = summary['loaded']
+        job.error_count = summary['error_count']
+        job.rows_processed = summary['loaded'] + summary['error_count']
+        job.status = JOB_DONE
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job.status = JOB_FAILED
+        job.message = str(e)
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    
+    if job.error_count and os.path.exists(error_path):
+        job.error_file = os.path.basename(error_path)
+    elif os.path.exists(error_path):
+        os.remove(error_path)
+    
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
@@ -0,0 +1,192 @@
+import json
+import os
+import select
+import socket
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+
+
+# Канал PostgreSQL для сообщений о сбросе кэшей
+CACHE_CHANNEL = 'cache_invalidation'
+
+# Максимальный размер сообщения NOTIFY (ограничение PostgreSQL - 8000 байт)
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+# Период ожидания сообщений и пауза перед переподключением (секунды)
+LISTEN_TIMEOUT = 5
+RECONNECT_DELAY = 5
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+# ===================== ПУБЛИКАЦИЯ =====================
+
+def get_worker_id():
+    """Идентификатор рабочего процесса (узел и PID)"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def is_cache_bus_enabled():
+    """Шина работает только на PostgreSQL и может быть отключена в конфигурации"""
+    return (current_app.config.get('CACHE_BUS_ENABLED', True)
+            and db.engine.dialect.name == 'postgresql')
+
+
+def publish_invalidation(cache, keys=None):
+    """
+    Сообщить остальным рабочим процессам о сбросе кэша
+    
+    Вызывается после коммита изменивших данные транзакций: сообщение
+    отправляется отдельным соединением в автокоммите, поэтому получатели
+    не перечитают данные раньше, чем они зафиксированы.
+    
+    Args:
+        cache: Имя кэша ('curriculum', 'scale_index', 'standards_completion', 'stats',
+               'principals', 'choices')
+        keys: Ключи сбрасываемых записей (например, ID групп, пользователей или
+              имена таблиц) или None - весь кэш
+    """
+    if not is_cache_bus_enabled():
+        return
+    
+    message = {'origin': get_worker_id(), 'cache': cache, 'keys': None}
+    if keys is not None:
+        message['keys'] = sorted(keys)
+    
+    payload = json.dumps(message)
+    if len(payload.encode('utf-8')) > NOTIFY_PAYLOAD_LIMIT:
+        # Слишком много ключей для одного сообщения - сбросить кэш целиком
+        message['keys'] = None
+        payload = json.dumps(message)
+    
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(
+                text('SELECT pg_notify(:channel, :payload)'),
+                {'channel': CACHE_CHANNEL, 'payload': payload}
+            )
+            connection.commit()
+    except SQLAlchemyError as e:
+        current_app.logger.warning(f'Не удалось отправить сброс кэша {cache}: {e}')
+
+
+# ===================== ПРИЕМ =====================
+
+def _local_invalidators():
+    """Локальный сброс кэшей по имени (без повторной публикации)"""
+    from app.curriculum import invalidate_curriculum
+    from app.scoring import invalidate_scale_index
+    from app.results import invalidate_standards_completion
+    from app.dashboard_stats import invalidate_stats
+    from app.principals import invalidate_principals
+    from app.choices import invalidate_choices
+    
+    return {
+        'curriculum': lambda keys: invalidate_curriculum(broadcast=False),
+        'scale_index': lambda keys: invalidate_scale_index(broadcast=False),
+        'standards_completion': lambda keys: invalidate_standards_completion(broadcast=False),
+        'stats': lambda keys: invalidate_stats(keys, broadcast=False),
+        'principals': lambda keys: invalidate_principals(keys, broadcast=False),
+        'choices': lambda keys: invalidate_choices(keys, broadcast=False)
+    }
+
+
+def apply_invalidation(payload):
+    """
+    Применить полученное сообщение о сбросе кэша
+    
+    Собственные сообщения процесса пропускаются: локальный кэш уже
+    сброшен при публикации.
+    
+    Args:
+        payload: Текст сообщения NOTIFY (JSON)
+    """
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        current_app.logger.warning(f'Некорректное сообщение сброса кэша: {payload!r}')
+        return
+    
+    if message.get('origin') == get_worker_id():
+        return
+    
+    invalidate = _local_invalidators().get(message.get('cache'))
+    if invalidate is not None:
+        invalidate(message.get('keys'))
+
+
+def invalidate_all_local():
+    """Сбросить все локальные кэши (после переподключения сообщения могли быть пропущены)"""
+    for invalidate in _local_invalidators().values():
+        invalidate(None)
+
+
+def _listen(app):
+    """Цикл потока-слушателя: LISTEN на отдельном соединении с переподключением"""
+    with app.app_context():
+        engine = db.engine
+    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+    
+    while True:
+        connection = None
+        try:
+            connection = engine.dialect.loaded_dbapi.connect(*cargs, **cparams)
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CACHE_CHANNEL}')
+            
+            with app.app_context():
+                invalidate_all_local()
+            
+            while True:
+                if select.select([connection], [], [], LISTEN_TIMEOUT) == ([], [], []):
+                    continue
+                
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    with app.app_context():
+                        apply_invalidation(notify.payload)
+        except Exception as e:
+            app.logger.warning(f'Слушатель сброса кэшей остановлен: {e}')
+        finally:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+        
+        time.sleep(RECONNECT_DELAY)
+
+
+def start_cache_listener():
+    """
+    Запустить поток-слушатель в текущем процессе, если он еще не запущен
+    
+    Проверка по PID: после fork (gunicorn --preload) поток родителя в
+    дочернем процессе не существует, и каждый рабочий процесс запускает
+    свой.
+    """
+    global _listener_pid
+    
+    if _listener_pid == os.getpid() or not is_cache_bus_enabled():
+        return
+    
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        
+        app = current_app._get_current_object()
+        thread = threading.Thread(target=_listen, args=(app,), name='cache-listener', daemon=True)
+        thread.start()
+        _listener_pid = os.getpid()
+
+
+def init_cache_bus(app):
+    """Подключить шину сброса кэшей: слушатель стартует с первым запросом процесса"""
+    app.before_request(start_cache_listener)
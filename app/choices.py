@@ -0,0 +1,235 @@
+import threading
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Faculty, Specialty, EducationForm, User, Group, Module, Theme, Standard
+from app.cache_bus import publish_invalidation
+
+
+# Таблицы, из которых строятся списки выбора форм
+CHOICES_TABLES = frozenset(model.__tablename__ for model in (
+    Faculty, Specialty, EducationForm, User, Group, Module, Theme, Standard
+))
+
+
+# ===================== КЭШ СПИСКОВ ВЫБОРА =====================
+
+class ChoicesCache:
+    """
+    Списки выбора (id, подпись) с версиями таблиц
+    
+    Запись хранит версии таблиц, из которых построен список, на момент
+    начала построения. Изменение таблицы увеличивает ее версию, и записи,
+    построенные по старой версии, перестраиваются при следующем обращении.
+    """
+    
+    def __init__(self):
+        self._versions = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def versions(self, tables):
+        """Текущие версии таблиц"""
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+    
+    def get(self, name, versions):
+        """Список или None, если его нет или он построен по старым версиям"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != versions:
+                return None
+            return entry[1]
+    
+    def put(self, name, versions, choices):
+        with self._lock:
+            self._entries[name] = (versions, choices)
+    
+    def bump(self, tables=None):
+        """
+        Увеличить версии таблиц
+        
+        Args:
+            tables: Имена таблиц или None - все таблицы списков выбора
+        """
+        with self._lock:
+            for table in (CHOICES_TABLES if tables is None else tables):
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+
+def get_choices_cache():
+    """Кэш списков выбора текущего приложения (создается при первом обращении)"""
+    cache = current_app.extensions.get('choices_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('choices_cache', ChoicesCache())
+    return cache
+
+
+def cached_choices(name, tables, build):
+    """
+    Получить список выбора из кэша или построить его
+    
+    Args:
+        name: Имя списка
+        tables: Таблицы, от которых зависит список
+        build: Функция без аргументов, возвращающая список (id, подпись)
+    
+    Returns:
+        tuple: Пары (id, подпись) - общий объект, не изменять
+    """
+    cache = get_choices_cache()
+    versions = cache.versions(tables)
+    
+    choices = cache.get(name, versions)
+    if choices is None:
+        choices = tuple(build())
+        cache.put(name, versions, choices)
+    return choices
+
+
+# ===================== СПИСКИ =====================
+
+def get_faculty_choices():
+    """Факультеты: 'код - название'"""
+    return cached_choices('faculties', ('faculties',), lambda: [
+        (faculty_id, f'{code} - {name}')
+        for faculty_id, code, name in db.session.query(
+            Faculty.id, Faculty.code, Faculty.name
+        ).order_by(Faculty.name).all()
+    ])
+
+
+def get_specialty_choices():
+    """Специальности: 'код - название'"""
+    return cached_choices('specialties', ('specialties',), lambda: [
+        (specialty_id, f'{code} - {name}')
+        for specialty_id, code, name in db.session.query(
+            Specialty.id, Specialty.code, Specialty.name
+        ).order_by(Specialty.name).all()
+    ])
+
+
+def get_education_form_choices():
+    """Формы обучения: 'название (N лет)'"""
+    return cached_choices('education_forms', ('education_forms',), lambda: [
+        (form_id, f'{name} ({duration_years} лет)')
+        for form_id, name, duration_years in db.session.query(
+            EducationForm.id, EducationForm.name, EducationForm.duration_years
+        ).order_by(EducationForm.name).all()
+    ])
+
+
+def get_teacher_choices(include_inactive=False):
+    """
+    Преподаватели: ФИО
+    
+    Args:
+        include_inactive: Включить заблокированных (для групп, за которыми
+                          они еще закреплены, и фильтров по ним)
+    """
+    def build():
+        query = db.session.query(User.id, User.full_name).filter_by(role='teacher')
+        if not include_inactive:
+            query = query.filter_by(is_active=True)
+        return [(user_id, full_name) for user_id, full_name in query.order_by(User.full_name).all()]
+    
+    return cached_choices('all_teachers' if include_inactive else 'teachers', ('users',), build)
+
+
+def get_group_choices():
+    """Группы: номер группы"""
+    return cached_choices('groups', ('groups',), lambda: [
+        (group_id, name)
+        for group_id, name in db.session.query(Group.id, Group.name).order_by(Group.name).all()
+    ])
+
+
+def get_module_choices():
+    """Модули: 'Модуль N: название (макс. P баллов)'"""
+    return cached_choices('modules', ('modules',), lambda: [
+        (module_id, f'Модуль {number}: {name} (макс. {max_points} баллов)')
+        for module_id, number, name, max_points in db.session.query(
+            Module.id, Module.number, Module.name, Module.max_points
+        ).order_by(Module.number).all()
+    ])
+
+
+def get_theme_choices():
+    """Темы: 'модуль - тема'"""
+    return cached_choices('themes', ('themes', 'modules'), lambda: [
+        (theme_id, f'{module_name} - {name}')
+        for theme_id, name, module_name in db.session.query(
+            Theme.id, Theme.name, Module.name
+        ).join(Theme.module).order_by(Theme.id).all()
+    ])
+
+
+def get_active_standard_choices():
+    """Активные нормативы: 'название (единица)'"""
+    return cached_choices('active_standards', ('standards',), lambda: [
+        (standard_id, f'{name} ({unit})')
+        for standard_id, name, unit in db.session.query(
+            Standard.id, Standard.name, Standard.unit
+        ).filter_by(is_active=True).order_by(Standard.id).all()
+    ])
+
+
+def get_active_standard_options():
+    """
+    Активные нормативы для формы оценочной шкалы
+    
+    Returns:
+        tuple: Тройки (id, 'норматив - модуль', единица измерения); единица
+               нужна странице для подписей полей
+    """
+    return cached_choices('active_standard_options', ('standards', 'themes', 'modules'), lambda: [
+        (standard_id, f'{name} - {module_name}', unit)
+        for standard_id, name, unit, module_name in db.session.query(
+            Standard.id, Standard.name, Standard.unit, Module.name
+        ).join(Standard.theme).join(Theme.module).filter(
+            Standard.is_active.is_(True)
+        ).order_by(Standard.id).all()
+    ])
+
+
+# ===================== СБРОС =====================
+
+def invalidate_choices(tables=None, broadcast=True):
+    """
+    Увеличить версии таблиц после их изменения
+    
+    Args:
+        tables: Имена таблиц или None - все таблицы списков выбора
+        broadcast: Сообщить о сбросе остальным рабочим процессам
+    """
+    get_choices_cache().bump(tables)
+    
+    if broadcast:
+        publish_invalidation('choices', tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_choices_changes(session, flush_context):
+    tables = {
+        obj.__tablename__
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if getattr(obj, '__tablename__', None) in CHOICES_TABLES
+    }
+    if tables:
+        session.info.setdefault('choices_tables_changed', set()).update(tables)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_choices_after_commit(session):
+    tables = session.info.pop('choices_tables_changed', None)
+    
+    # Сообщение публикуется, даже если в этом процессе списки еще не строились
+    if tables and current_app:
+        invalidate_choices(tables)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_choices_changes(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('choices_tables_changed', None)
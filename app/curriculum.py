@@ -0,0 +1,123 @@
+from collections import namedtuple
+from types import MappingProxyType
+from flask import current_app
+from app import db
+from app.models import Module, Theme, Standard
+from app.cache_bus import publish_invalidation
+
+
+# ===================== СНИМОК СТРУКТУРЫ КУРСА =====================
+
+StandardNode = namedtuple('StandardNode', [
+    'id', 'name', 'theme_id', 'unit', 'comparison_type', 'gender', 'is_active'
+])
+
+ThemeNode = namedtuple('ThemeNode', [
+    'id', 'name', 'module_id', 'max_points', 'standards', 'active_standards'
+])
+
+ModuleNode = namedtuple('ModuleNode', [
+    'id', 'number', 'name', 'max_points', 'themes'
+])
+
+Curriculum = namedtuple('Curriculum', [
+    'version', 'modules', 'modules_by_number', 'themes', 'standards'
+])
+
+
+def build_curriculum(version=0):
+    """
+    Построить неизменяемый снимок дерева модуль -> тема -> норматив
+    
+    Выполняет три запроса по столбцам; узлы - namedtuple, словари - только
+    для чтения, поэтому снимок можно безопасно разделять между потоками.
+    
+    Args:
+        version: Номер версии снимка
+    
+    Returns:
+        Curriculum: Снимок структуры курса
+    """
+    standards_by_theme = {}
+    standards = {}
+    for row in db.session.query(
+        Standard.id, Standard.name, Standard.theme_id, Standard.unit,
+        Standard.comparison_type, Standard.gender, Standard.is_active
+    ).order_by(Standard.id).all():
+        node = StandardNode(*row[:6], is_active=bool(row[6]))
+        standards[node.id] = node
+        standards_by_theme.setdefault(node.theme_id, []).append(node)
+    
+    themes_by_module = {}
+    themes = {}
+    for theme_id, name, module_id, max_points in db.session.query(
+        Theme.id, Theme.name, Theme.module_id, Theme.max_points
+    ).order_by(Theme.id).all():
+        theme_standards = tuple(standards_by_theme.get(theme_id, ()))
+        node = ThemeNode(
+            id=theme_id,
+            name=name,
+            module_id=module_id,
+            max_points=max_points,
+            standards=theme_standards,
+            active_standards=tuple(s for s in theme_standards if s.is_active)
+        )
+        themes[theme_id] = node
+        themes_by_module.setdefault(module_id, []).append(node)
+    
+    modules = tuple(
+        ModuleNode(
+            id=module_id,
+            number=number,
+            name=name,
+            max_points=max_points,
+            themes=tuple(themes_by_module.get(module_id, ()))
+        )
+        for module_id, number, name, max_points in db.session.query(
+            Module.id, Module.number, Module.name, Module.max_points
+        ).order_by(Module.number).all()
+    )
+    
+    return Curriculum(
+        version=version,
+        modules=modules,
+        modules_by_number=MappingProxyType({m.number: m for m in modules}),
+        themes=MappingProxyType(themes),
+        standards=MappingProxyType(standards)
+    )
+
+
+def get_curriculum():
+    """
+    Текущий снимок структуры курса
+    
+    Строится при первом обращении после запуска или изменения структуры
+    в админ-панели и хранится в app.extensions.
+    """
+    curriculum = current_app.extensions.get('curriculum')
+    version = current_app.extensions.get('curriculum_version', 0)
+    
+    if curriculum is None or curriculum.version != version:
+        curriculum = build_curriculum(version)
+        current_app.extensions['curriculum'] = curriculum
+    
+    return curriculum
+
+
+def get_curriculum_version():
+    """Номер версии структуры курса (меняется при каждом сбросе снимка)"""
+    return current_app.extensions.get('curriculum_version', 0)
+
+
+def invalidate_curriculum(broadcast=True):
+    """
+    Сбросить снимок после изменения модулей, тем или нормативов
+    
+    Args:
+        broadcast: Сообщить о сбросе остальным рабочим процессам
+    """
+    current_app.extensions['curriculum_version'] = get_curriculum_version() + 1
+    current_app.extensions.pop('curriculum', None)
+    
+    if broadcast:
+        publish_invalidation('curriculum')
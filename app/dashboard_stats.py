@@ -0,0 +1,389 @@
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from app.models import (Attendance, StandardResult, Assignment, Student, StudentRating,
+                        Group)
+from app.cache_bus import publish_invalidation
+from app.single_flight import coalesce
+
+
+# Максимальное число блоков статистики в кэше процесса
+STATS_CACHE_SIZE = 1024
+
+_MISSING = object()
+
+
+# ===================== КЭШ БЛОКОВ СТАТИСТИКИ =====================
+
+class StatsCache:
+    """
+    LRU-кэш вычисленных блоков статистики панелей
+    
+    Каждая запись помнит группы, от данных которых она зависит (None -
+    от всех). Сброс по группам удаляет только зависящие от них записи.
+    Счетчик поколений не дает сохранить значение, вычисленное до сброса,
+    который произошел во время вычисления.
+    """
+    
+    def __init__(self, max_size=STATS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, key):
+        """Значение по ключу или _MISSING (обращение делает запись самой свежей)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, value, group_ids=None, generation=None):
+        """
+        Сохранить значение
+        
+        Args:
+            key: Ключ записи
+            value: Вычисленный блок
+            group_ids: Группы, от которых зависит блок, или None - от всех
+            generation: Поколение на момент начала вычисления; если с тех пор
+                        был сброс, значение не сохраняется
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            
+            self._entries[key] = (value, frozenset(group_ids) if group_ids is not None else None)
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, group_ids=None):
+        """
+        Удалить записи, зависящие от групп
+        
+        Args:
+            group_ids: ID измененных групп или None - удалить все записи
+        """
+        with self._lock:
+            self.generation += 1
+            
+            if group_ids is None:
+                removed = list(self._entries)
+            else:
+                group_ids = set(group_ids)
+                removed = [
+                    key for key, (_, depends_on) in self._entries.items()
+                    if depends_on is None or depends_on & group_ids
+                ]
+            
+            for key in removed:
+                del self._entries[key]
+            self.invalidations += len(removed)
+    
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests * 100, 1) if requests else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def get_stats_cache():
+    """Кэш статистики текущего приложения (создается при первом обращении)"""
+    cache = current_app.extensions.get('stats_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'stats_cache',
+            StatsCache(current_app.config.get('STATS_CACHE_SIZE', STATS_CACHE_SIZE))
+        )
+    return cache
+
+
+def cached_stats(key, compute, group_ids=None, cache=None):
+    """
+    Получить блок статистики из кэша или вычислить его
+    
+    При промахе одновременные запросы одного блока вычисляют его один раз
+    (см. app.single_flight.coalesce).
+    
+    Args:
+        key: Ключ блока, например ('teacher', teacher_id) или ('department',)
+        compute: Функция без аргументов, вычисляющая блок
+        group_ids: Группы, от которых зависит блок, или None - от всех
+        cache: StatsCache для хранения или None - кэш статистики панелей
+    
+    Returns:
+        Значение блока (общий объект - не изменять)
+    """
+    if cache is None:
+        cache = get_stats_cache()
+    value = cache.get(key)
+    if value is _MISSING:
+        def compute_and_store():
+            generation = cache.generation
+            value = compute()
+            cache.put(key, value, group_ids, generation)
+            return value
+        
+        value = coalesce(('stats',) + tuple(key), compute_and_store)
+    return value
+
+
+# ===================== СТАТИСТИКА ГРУПП =====================
+
+def compute_group_stats(group_ids):
+    """
+    Суммарные показатели групп без кэша
+    
+    Рейтинги и счетчики посещаемости всех групп читаются одним вызовом
+    каждый. Хранятся суммы, а не средние, чтобы блоки групп можно было
+    складывать в показатели преподавателя и кафедры.
+    
+    Args:
+        group_ids: Список ID групп
+    
+    Returns:
+        dict: {group_id: {'students_count', 'passed', 'rating_sum',
+               'attendance_percent_sum', 'attendance_total', 'attendance_present'}}
+    """
+    from app.utils import get_student_ratings
+    from app.attendance import get_attendance_counts
+    
+    blocks = {
+        group_id: {
+            'students_count': 0,
+            'passed': 0,
+            'rating_sum': 0,
+            'attendance_percent_sum': 0,
+            'attendance_total': 0,
+            'attendance_present': 0
+        }
+        for group_id in group_ids
+    }
+    if not blocks:
+        return blocks
+    
+    ratings = get_student_ratings(group_ids=list(blocks))
+    counts = get_attendance_counts(group_ids=list(blocks))
+    
+    for student_id, group_id in db.session.query(Student.id, Student.group_id).filter(
+        Student.group_id.in_(list(blocks))
+    ).all():
+        block = blocks[group_id]
+        rating = ratings[student_id]
+        student_counts = counts.get(student_id)
+        
+        block['students_count'] += 1
+        block['rating_sum'] += rating['total']
+        if rating['passed']:
+            block['passed'] += 1
+        
+        # Как в calculate_attendance_percentages
+        if student_counts and student_counts['total']:
+            block['attendance_percent_sum'] += round(
+                (student_counts['present'] + student_counts['excused']) / student_counts['total'] * 100, 1
+            )
+            block['attendance_total'] += student_counts['total']
+            block['attendance_present'] += student_counts['present']
+    
+    return blocks
+
+
+def get_group_stats(group_ids):
+    """
+    Блоки показателей групп из кэша (ключ ('group', group_id))
+    
+    Отсутствующие в кэше группы вычисляются одним пакетом; одновременные
+    запросы одинакового пакета вычисляют его один раз.
+    
+    Args:
+        group_ids: Список ID групп
+    
+    Returns:
+        dict: {group_id: блок compute_group_stats}
+    """
+    cache = get_stats_cache()
+    
+    blocks = {}
+    missing = []
+    for group_id in group_ids:
+        block = cache.get(('group', group_id))
+        if block is _MISSING:
+            missing.append(group_id)
+        else:
+            blocks[group_id] = block
+    
+    if missing:
+        def compute_and_store():
+            generation = cache.generation
+            computed = compute_group_stats(missing)
+            for group_id, block in computed.items():
+                cache.put(('group', group_id), block, [group_id], generation)
+            return computed
+        
+        blocks.update(coalesce(('stats_groups',) + tuple(sorted(missing)), compute_and_store))
+    
+    return blocks
+
+
+def summarize_group_stats(blocks, ndigits=2):
+    """
+    Сложить блоки групп в сводные показатели
+    
+    Args:
+        blocks: Итерируемые блоки compute_group_stats
+        ndigits: Точность округления средних
+    
+    Returns:
+        dict: students_count, passed, failed, avg_rating, avg_attendance
+              (средний процент студента), pass_rate, attendance_total,
+              attendance_present
+    """
+    summary = {
+        'students_count': 0,
+        'passed': 0,
+        'rating_sum': 0,
+        'attendance_percent_sum': 0,
+        'attendance_total': 0,
+        'attendance_present': 0
+    }
+    for block in blocks:
+        for key in summary:
+            summary[key] += block[key]
+    
+    students_count = summary['students_count']
+    return {
+        'students_count': students_count,
+        'passed': summary['passed'],
+        'failed': students_count - summary['passed'],
+        'avg_rating': round(summary['rating_sum'] / students_count, ndigits) if students_count > 0 else 0,
+        'avg_attendance': round(summary['attendance_percent_sum'] / students_count, ndigits) if students_count > 0 else 0,
+        'pass_rate': round(summary['passed'] / students_count * 100, ndigits) if students_count > 0 else 0,
+        'attendance_total': summary['attendance_total'],
+        'attendance_present': summary['attendance_present']
+    }
+
+
+# ===================== СБРОС =====================
+
+def invalidate_stats(group_ids=None, broadcast=True):
+    """
+    Сбросить блоки статистики групп
+    
+    Args:
+        group_ids: ID групп или None - все блоки
+        broadcast: Сообщить о сбросе остальным рабочим процессам
+    """
+    get_stats_cache().invalidate(group_ids)
+    
+    if broadcast:
+        publish_invalidation('stats', group_ids)
+
+
+def mark_stats_changed(group_ids=None):
+    """
+    Отметить в текущей сессии изменение данных групп
+    
+    Для Core-запросов, не проходящих через flush. Кэш сбрасывается
+    после коммита.
+    
+    Args:
+        group_ids: ID групп или None - изменены данные всех групп
+    """
+    if group_ids is None:
+        db.session.info['stats_all_changed'] = True
+    else:
+        db.session.info.setdefault('stats_groups_changed', set()).update(group_ids)
+
+
+def _changed_group_ids(session):
+    """
+    Группы, затронутые изменениями в сессии
+    
+    Returns:
+        set или None: ID групп; None - изменения затрагивают все группы
+                      (перевод групп между преподавателями и т.п.)
+    """
+    group_ids = set()
+    student_ids = set()
+    
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Group):
+            return None
+        
+        if isinstance(obj, Student):
+            group_ids.add(obj.group_id)
+            group_ids.update(inspect(obj).attrs.group_id.history.deleted or ())
+        elif isinstance(obj, (Attendance, StandardResult, Assignment, StudentRating)):
+            student_ids.add(obj.student_id)
+            student_ids.update(inspect(obj).attrs.student_id.history.deleted or ())
+    
+    student_ids.discard(None)
+    if student_ids:
+        group_ids.update(
+            group_id for (group_id,) in session.connection().execute(
+                db.select(Student.group_id).where(Student.id.in_(student_ids)).distinct()
+            )
+        )
+    
+    group_ids.discard(None)
+    return group_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stats_changes(session, flush_context):
+    group_ids = _changed_group_ids(session)
+    
+    if group_ids is None:
+        session.info['stats_all_changed'] = True
+    elif group_ids:
+        session.info.setdefault('stats_groups_changed', set()).update(group_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_stats_after_commit(session):
+    all_changed = session.info.pop('stats_all_changed', False)
+    group_ids = session.info.pop('stats_groups_changed', None)
+    
+    if not current_app or not (all_changed or group_ids):
+        return
+    
+    if all_changed:
+        group_ids = None
+    
+    # Локальный кэш сбрасывается, только если он уже создан, а остальным
+    # процессам сообщение отправляется всегда: писать может процесс без
+    # кэша (CLI-команда, фоновое задание, еще не открывавший панели)
+    cache = current_app.extensions.get('stats_cache')
+    if cache is not None:
+        cache.invalidate(group_ids)
+    publish_invalidation('stats', group_ids)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_stats_changes(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('stats_all_changed', None)
+        session.info.pop('stats_groups_changed', None)
@@ -5,6 +5,9 @@ from wtforms.validators import (DataRequired, Email, Length, Optional,
                                ValidationError, NumberRange, EqualTo)
 from flask_wtf.file import FileAllowed
 from app.models import User, Student, Group, Faculty, Specialty, EducationForm
+from app.choices import (get_faculty_choices, get_specialty_choices, get_education_form_choices,
+                         get_teacher_choices, get_group_choices, get_module_choices,
+                         get_theme_choices, get_active_standard_choices)
 from datetime import date
 
 
@@ -139,9 +142,7 @@ class SpecialtyForm(FlaskForm):
         super(SpecialtyForm, self).__init__(*args, **kwargs)
         self.specialty_id = specialty_id
         # Загрузить факультеты
-        self.faculty_id.choices = [
-            (f.id, f'{f.code} - {f.name}') for f in Faculty.query.order_by(Faculty.name).all()
-        ]
+        self.faculty_id.choices = list(get_faculty_choices())
     
     def validate_code(self, field):
         """Проверка уникальности кода"""
@@ -209,22 +210,13 @@ class GroupForm(FlaskForm):
         self.group_id = group_id
         
         # Загрузить специальности
-        self.specialty_id.choices = [
-            (s.id, f'{s.code} - {s.name}') 
-            for s in Specialty.query.order_by(Specialty.name).all()
-        ]
+        self.specialty_id.choices = list(get_specialty_choices())
         
         # Загрузить формы обучения
-        self.education_form_id.choices = [
-            (f.id, f'{f.name} ({f.duration_years} лет)') 
-            for f in EducationForm.query.order_by(EducationForm.name).all()
-        ]
+        self.education_form_id.choices = list(get_education_form_choices())
         
         # Загрузить преподавателей
-        self.teacher_id.choices = [(0, '-- Не назначен --')] + [
-            (t.id, t.full_name) 
-            for t in User.query.filter_by(role='teacher', is_active=True).order_by(User.full_name).all()
-        ]
+        self.teacher_id.choices = [(0, '-- Не назначен --')] + list(get_teacher_choices())
     
     def validate_name(self, field):
         """Проверка уникальности названия"""
@@ -271,9 +263,7 @@ class StudentForm(FlaskForm):
         self.student_id = student_id
         
         # Загрузить группы
-        self.group_id.choices = [
-            (g.id, g.name) for g in Group.query.order_by(Group.name).all()
-        ]
+        self.group_id.choices = list(get_group_choices())
     
     def validate_student_number(self, field):
         """Проверка уникальности номера студенческого"""
@@ -335,11 +325,7 @@ class ThemeForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(ThemeForm, self).__init__(*args, **kwargs)
-        from app.models import Module
-        self.module_id.choices = [
-            (m.id, f'Модуль {m.number}: {m.name}') 
-            for m in Module.query.order_by(Module.number).all()
-        ]
+        self.module_id.choices = list(get_module_choices())
 
 
 # ===================== НОРМАТИВЫ =====================
@@ -369,11 +355,7 @@ class StandardForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(StandardForm, self).__init__(*args, **kwargs)
-        from app.models import Theme
-        self.theme_id.choices = [
-            (t.id, f'{t.module.name} - {t.name}') 
-            for t in Theme.query.join(Theme.module).all()
-        ]
+        self.theme_id.choices = list(get_theme_choices())
 
 
 class StandardScaleForm(FlaskForm):
@@ -397,11 +379,7 @@ class StandardScaleForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(StandardScaleForm, self).__init__(*args, **kwargs)
-        from app.models import Standard
-        self.standard_id.choices = [
-            (s.id, f'{s.name} ({s.unit})') 
-            for s in Standard.query.filter_by(is_active=True).all()
-        ]
+        self.standard_id.choices = list(get_active_standard_choices())
 
 
 # ===================== ПОСЕЩАЕМОСТЬ =====================
@@ -556,6 +534,4 @@ class ImportStudentsForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(ImportStudentsForm, self).__init__(*args, **kwargs)
-        self.group_id.choices = [(0, '-- Не выбрано --')] + [
-            (g.id, g.name) for g in Group.query.order_by(Group.name).all()
-        ]
\ No newline at end of file
+        self.group_id.choices = [(0, '-- Не выбрано --')] + list(get_group_choices())
\ No newline at end of file
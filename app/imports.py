@@ -0,0 +1,243 @@
+import csv
+import os
+from datetime import date, datetime
+from flask import current_app
+from openpyxl import load_workbook
+from app import db
+from app.models import Group, Student, ImportJob, JOB_RUNNING, JOB_DONE, JOB_FAILED
+from app.jobs import submit_job
+from app.dashboard_stats import mark_stats_changed
+from app.utils import create_student_ratings
+
+
+# Размер пачки строк, вставляемых одним запросом
+IMPORT_CHUNK_SIZE = 2000
+
+MALE_VALUES = {'м', 'male', 'мужской'}
+FEMALE_VALUES = {'ж', 'female', 'женский'}
+
+
+# ===================== ИМПОРТ СТУДЕНТОВ =====================
+
+def iter_sheet_rows(filepath, min_row=2):
+    """
+    Потоковое чтение строк активного листа (режим read_only)
+    
+    Args:
+        filepath: Путь к файлу .xlsx
+        min_row: Первая читаемая строка (по умолчанию - после заголовка)
+    
+    Yields:
+        tuple: (номер строки, кортеж значений)
+    """
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        for row_num, row in enumerate(sheet.iter_rows(min_row=min_row, values_only=True), start=min_row):
+            yield row_num, row
+    finally:
+        workbook.close()
+
+
+def parse_student_row(row, groups, known_numbers):
+    """
+    Проверить строку файла импорта и подготовить значения студента
+    
+    Args:
+        row: Кортеж значений (ФИО, номер, группа, пол, дата рождения, медгруппа)
+        groups: Словарь {название группы: ID}
+        known_numbers: Множество уже занятых номеров студентов
+    
+    Returns:
+        dict: Значения для вставки в таблицу students
+    
+    Raises:
+        ValueError: Текст ошибки для отчета
+    """
+    row = tuple(row) + (None,) * (6 - len(row))
+    full_name, student_number, group_name, gender, birth_date, medical_group = row[:6]
+    
+    # Проверка обязательных полей
+    if not all([full_name, student_number, group_name, gender]):
+        raise ValueError('отсутствуют обязательные поля')
+    
+    # Проверка и нормализация пола
+    gender = str(gender).strip().lower()
+    if gender in MALE_VALUES:
+        gender = 'male'
+    elif gender in FEMALE_VALUES:
+        gender = 'female'
+    else:
+        raise ValueError('неверный пол')
+    
+    group_name = str(group_name).strip()
+    group_id = groups.get(group_name)
+    if group_id is None:
+        raise ValueError(f'группа "{group_name}" не найдена')
+    
+    student_number = str(student_number).strip()
+    if student_number in known_numbers:
+        raise ValueError(f'студент с номером {student_number} уже существует')
+    
+    if isinstance(birth_date, datetime):
+        birth_date = birth_date.date()
+    elif not isinstance(birth_date, date):
+        birth_date = None
+    
+    return {
+        'full_name': str(full_name).strip(),
+        'student_number': student_number,
+        'gender': gender,
+        'birth_date': birth_date,
+        'medical_group': medical_group or 'основная',
+        'group_id': group_id
+    }
+
+
+def import_students_file(filepath, chunk_size=IMPORT_CHUNK_SIZE, on_error=None, on_progress=None):
+    """
+    Импортировать студентов из Excel потоково, пачками
+    
+    Лист читается в режиме read_only, группы и занятые номера загружаются
+    заранее одним запросом каждый, строки вставляются пачками по
+    chunk_size одним INSERT. Коммит выполняет вызывающий код
+    (например, в on_progress после каждой пачки).
+    
+    Args:
+        filepath: Путь к файлу .xlsx
+        chunk_size: Размер пачки вставки
+        on_error: Функция (номер строки, текст ошибки) или None -
+                  тогда ошибки собираются в список errors
+        on_progress: Функция (обработано строк, добавлено, ошибок),
+                     вызывается после каждой пачки
+    
+    Returns:
+        dict: imported - добавлено студентов, error_count - число ошибок,
+              errors - список (номер строки, текст ошибки), если on_error не задан
+    """
+    groups = dict(db.session.query(Group.name, Group.id).all())
+    known_numbers = {number for (number,) in db.session.query(Student.student_number).all()}
+    
+    summary = {'imported': 0, 'error_count': 0, 'errors': []}
+    if on_error is None:
+        on_error = lambda row_num, message: summary['errors'].append((row_num, message))
+    
+    rows_processed = 0
+    chunk = []
+    
+    def flush_chunk():
+        student_ids = db.session.scalars(db.insert(Student).returning(Student.id), chunk).all()
+        # Core-вставка не проходит через flush: создать рейтинги и сбросить
+        # зависящие от состава студентов кэши
+        create_student_ratings(student_ids)
+        db.session.info['results_changed'] = True
+        mark_stats_changed(list({row['group_id'] for row in chunk}))
+        summary['imported'] += len(chunk)
+        chunk.clear()
+        if on_progress is not None:
+            on_progress(rows_processed, summary['imported'], summary['error_count'])
+    
+    for row_num, row in iter_sheet_rows(filepath):
+        if not row or not row[0]:  # Пустая строка
+            continue
+        
+        rows_processed += 1
+        try:
+            values = parse_student_row(row, groups, known_numbers)
+        except ValueError as e:
+            summary['error_count'] += 1
+            on_error(row_num, str(e))
+            continue
+        
+        known_numbers.add(values['student_number'])
+        chunk.append(values)
+        
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+    
+    if chunk:
+        flush_chunk()
+    elif on_progress is not None:
+        on_progress(rows_processed, summary['imported'], summary['error_count'])
+    
+    return summary
+
+
+# ===================== ФОНОВЫЙ ИМПОРТ =====================
+
+def get_imports_folder():
+    """Папка загруженных файлов импорта и отчетов об ошибках"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'imports')
+
+
+def create_student_import_job(filepath, filename, created_by):
+    """
+    Создать задачу импорта студентов и поставить ее в очередь
+    
+    Args:
+        filepath: Путь к сохраненному файлу
+        filename: Исходное имя файла
+        created_by: ID пользователя
+    
+    Returns:
+        ImportJob: Созданная задача (уже закоммичена)
+    """
+    job = ImportJob(kind='students', filename=filename, created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    
+    submit_job(run_student_import_job, job.id, filepath)
+    return job
+
+
+def run_student_import_job(job_id, filepath):
+    """
+    Выполнить задачу импорта студентов
+    
+    Каждая пачка коммитится вместе с прогрессом задачи, ошибки строк
+    пишутся построчно в CSV-отчет. Файл импорта удаляется по окончании.
+    
+    Args:
+        job_id: ID задачи
+        filepath: Путь к файлу .xlsx
+    """
+    job = db.session.get(ImportJob, job_id)
+    job.status = JOB_RUNNING
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    
+    error_path = os.path.join(get_imports_folder(), f'import_{job_id}_errors.csv')
+    
+    def on_progress(rows_processed, imported, error_count):
+        job.rows_processed = rows_processed
+        job.imported = imported
+        job.error_count = error_count
+        db.session.commit()
+    
+    try:
+        with open(error_path, 'w', newline='', encoding='utf-8-sig') as error_file:
+            writer = csv.writer(error_file, delimiter=';')
+            writer.writerow(['Строка', 'Ошибка'])
+            
+            import_students_file(
+                filepath,
+                on_error=lambda row_num, message: writer.writerow([row_num, message]),
+                on_progress=on_progress
+            )
+        
+        job.status = JOB_DONE
+    except Exception as e:
+        db.session.rollback()
+        job.status = JOB_FAILED
+        job.message = str(e)
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    
+    if job.error_count and os.path.exists(error_path):
+        job.error_file = os.path.basename(error_path)
+    elif os.path.exists(error_path):
+        os.remove(error_path)
+    
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
@@ -0,0 +1,112 @@
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import ImportJob, JOB_QUEUED, JOB_RUNNING, JOB_FAILED
+from app.cache_bus import get_worker_id
+
+
+# Число потоков фоновых задач в одном процессе
+JOB_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# ===================== ФОНОВЫЕ ЗАДАЧИ =====================
+
+def _get_executor():
+    """Пул потоков процесса (создается при первой задаче)"""
+    global _executor
+    
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('JOB_WORKERS', JOB_WORKERS),
+                thread_name_prefix='background-job'
+            )
+    return _executor
+
+
+def _run_job(app, func, args):
+    """Выполнить задачу в контексте приложения со своей сессией БД"""
+    with app.app_context():
+        try:
+            func(*args)
+        except Exception:
+            app.logger.exception('Ошибка фоновой задачи %s', func.__name__)
+        finally:
+            db.session.remove()
+
+
+def submit_job(func, *args):
+    """
+    Запустить функцию в фоновом потоке текущего процесса
+    
+    Внешний брокер не нужен: состояние задачи хранится в БД, поэтому
+    прогресс виден из любого рабочего процесса веб-сервера.
+    
+    Args:
+        func: Функция задачи (вызывается в контексте приложения)
+        args: Аргументы функции
+    
+    Returns:
+        Future: Результат выполнения
+    """
+    app = current_app._get_current_object()
+    return _get_executor().submit(_run_job, app, func, args)
+
+
+# ===================== ОСИРОТЕВШИЕ ЗАДАЧИ =====================
+
+def _is_worker_gone(worker):
+    """
+    Завершился ли процесс, в пуле которого выполнялась задача
+    
+    Вызывается при запуске процесса: запись с его же идентификатором
+    оставлена прежним процессом с тем же PID. Процессы других узлов
+    проверить нельзя - их задачи помечает их собственный запуск.
+    """
+    if not worker or worker == get_worker_id():
+        return True
+    
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname() or os.name == 'nt':
+        return False
+    
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (OSError, ValueError):
+        # Процесс чужого пользователя или неизвестный формат - считаем живым
+        pass
+    return False
+
+
+def fail_orphaned_jobs():
+    """
+    Пометить ошибкой задачи, процесс которых завершился (при запуске процесса)
+    
+    Пул потоков живет внутри рабочего процесса: если процесс перезапущен
+    или упал, его задачи остались бы "в очереди" или "выполняется" навсегда.
+    
+    Returns:
+        int: Число помеченных задач
+    """
+    jobs = ImportJob.query.filter(ImportJob.status.in_((JOB_QUEUED, JOB_RUNNING))).all()
+    orphaned = [job for job in jobs if _is_worker_gone(job.worker)]
+    
+    now = datetime.utcnow()
+    for job in orphaned:
+        job.status = JOB_FAILED
+        job.message = 'Процесс, выполнявший задачу, завершился. Загрузите файл повторно.'
+        job.finished_at = now
+    
+    if orphaned:
+        db.session.commit()
+        current_app.logger.warning(f'Задач импорта прервано завершением процесса: {len(orphaned)}')
+    return len(orphaned)
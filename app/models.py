@@ -1,12 +1,8 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from app import db, login_manager
-
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+from app import db
+from app.cache_bus import get_worker_id
 
 
 class User(UserMixin, db.Model):
@@ -144,15 +140,15 @@ class Student(db.Model):
     attendances = db.relationship('Attendance', backref='student', lazy='dynamic', cascade='all, delete-orphan')
     results = db.relationship('StandardResult', backref='student', lazy='dynamic', cascade='all, delete-orphan')
     assignments = db.relationship('Assignment', backref='student', lazy='dynamic', cascade='all, delete-orphan')
+    rating_record = db.relationship('StudentRating', backref='student', uselist=False, cascade='all, delete-orphan')
     
     def get_attendance_percentage(self):
-        total = self.attendances.count()
-        if total == 0:
+        from app.attendance import get_attendance_counts
+        counts = get_attendance_counts(student_ids=[self.id]).get(self.id)
+        if not counts or counts['total'] == 0:
             return 0
-        present = self.attendances.filter(
-            (Attendance.status == 'присутствовал') | (Attendance.status == 'уважительная')
-        ).count()
-        return round((present / total) * 100, 1)
+        present = counts['present'] + counts['excused']
+        return round((present / counts['total']) * 100, 1)
     
     def to_dict(self, include_rating=False):
         data = {
@@ -175,6 +171,38 @@ class Student(db.Model):
         return data
 
 
+class StudentRating(db.Model):
+    __tablename__ = 'student_ratings'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    attendance_points = db.Column(db.Integer, nullable=False, default=0)
+    module1_points = db.Column(db.Float, nullable=False, default=0)
+    module2_points = db.Column(db.Float, nullable=False, default=0)
+    bonus_points = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    grade = db.Column(db.String(50), nullable=False)
+    passed = db.Column(db.Boolean, nullable=False, default=False)
+    last_recomputed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_rating(self):
+        """Рейтинг в формате calculate_student_rating"""
+        return {
+            'attendance': self.attendance_points,
+            'module1': self.module1_points,
+            'module2': self.module2_points,
+            'bonus': self.bonus_points,
+            'total': self.total,
+            'passed': self.passed,
+            'grade': self.grade
+        }
+    
+    def to_dict(self):
+        data = self.to_rating()
+        data['student_id'] = self.student_id
+        data['last_recomputed_at'] = self.last_recomputed_at.isoformat() if self.last_recomputed_at else None
+        return data
+
+
 class Module(db.Model):
     __tablename__ = 'modules'
     
@@ -296,6 +324,27 @@ class Attendance(db.Model):
         }
 
 
+class AttendanceBitmap(db.Model):
+    """Посещаемость студента за полугодие в виде битовых масок (поддерживается app.attendance)"""
+    __tablename__ = 'attendance_bitmaps'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), primary_key=True)
+    term_start = db.Column(db.Date, primary_key=True)
+    present = db.Column(db.LargeBinary, nullable=False, default=b'')
+    absent = db.Column(db.LargeBinary, nullable=False, default=b'')
+    excused = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+
+class AttendanceDailyRollup(db.Model):
+    """Количество отметок за день по группе и статусу (поддерживается app.attendance)"""
+    __tablename__ = 'attendance_daily_rollup'
+    
+    date = db.Column(db.Date, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
 class StandardResult(db.Model):
     __tablename__ = 'standard_results'
     
@@ -311,6 +360,10 @@ class StandardResult(db.Model):
     
     creator = db.relationship('User', foreign_keys=[created_by])
     
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'standard_id', 'attempt_number', name='unique_student_standard_attempt'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -326,6 +379,18 @@ class StandardResult(db.Model):
         }
 
 
+class StudentBestResult(db.Model):
+    """Лучшая попытка студента по нормативу (поддерживается app.results)"""
+    __tablename__ = 'student_best_results'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), primary_key=True)
+    standard_id = db.Column(db.Integer, db.ForeignKey('standards.id', ondelete='CASCADE'), primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey('standard_results.id', ondelete='CASCADE'), nullable=False)
+    points = db.Column(db.Integer, nullable=False)
+    
+    result = db.relationship('StandardResult', foreign_keys=[result_id])
+
+
 class Assignment(db.Model):
     __tablename__ = 'assignments'
     
@@ -390,4 +455,54 @@ class Statement(db.Model):
             'dean_name': self.dean_name,
             'file_path': self.file_path,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+# Статусы фоновой задачи импорта
+JOB_QUEUED = 'в очереди'
+JOB_RUNNING = 'выполняется'
+JOB_DONE = 'завершен'
+JOB_FAILED = 'ошибка'
+
+
+class ImportJob(db.Model):
+    """Фоновая задача импорта (выполняется app.jobs)"""
+    __tablename__ = 'import_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, default='students')
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(50), nullable=False, default=JOB_QUEUED)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    error_file = db.Column(db.String(255))
+    message = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Процесс (узел:PID), в пуле которого выполняется задача
+    worker = db.Column(db.String(255), default=get_worker_id)
+    
+    creator = db.relationship('User', foreign_keys=[created_by])
+    
+    @property
+    def is_finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'filename': self.filename,
+            'status': self.status,
+            'is_finished': self.is_finished,
+            'rows_processed': self.rows_processed,
+            'imported': self.imported,
+            'error_count': self.error_count,
+            'has_error_file': bool(self.error_file),
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, abort
+from flask_login import UserMixin, current_user
+from app import db, login_manager
+from app.models import User
+from app.cache_bus import publish_invalidation
+
+
+# Время жизни записи кэша пользователей (секунды)
+USER_CACHE_TTL = 60
+
+
+# ===================== ПРИНЦИПАЛ =====================
+
+class Principal(namedtuple('Principal', ['id', 'role', 'is_active', 'full_name']), UserMixin):
+    """
+    Неизменяемые сведения о пользователе для Flask-Login
+    
+    Заменяет объект User в current_user: для проверки ролей и подписей в
+    шаблонах достаточно этих полей, а кортеж можно разделять между
+    потоками. Полная запись нужна только страницам профиля и смены
+    пароля - ее возвращает get_current_user_record.
+    """
+    
+    __slots__ = ()
+
+
+class PrincipalCache:
+    """
+    Кэш принципалов по ID пользователя с ограниченным временем жизни
+    
+    Счетчик поколений не дает сохранить запись, прочитанную до сброса,
+    который произошел во время чтения.
+    """
+    
+    def __init__(self, ttl=USER_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+    
+    def get(self, user_id):
+        """Принципал или None, если записи нет или она устарела"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            return principal
+    
+    def put(self, principal, generation=None):
+        """Сохранить принципал, если с начала чтения не было сброса"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+    
+    def invalidate(self, user_ids=None):
+        """
+        Удалить записи пользователей
+        
+        Args:
+            user_ids: ID пользователей или None - все записи
+        """
+        with self._lock:
+            self.generation += 1
+            
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+
+
+def get_principal_cache():
+    """Кэш принципалов текущего приложения (создается при первом обращении)"""
+    cache = current_app.extensions.get('principal_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'principal_cache',
+            PrincipalCache(current_app.config.get('USER_CACHE_TTL', USER_CACHE_TTL))
+        )
+    return cache
+
+
+# ===================== ЗАГРУЗКА =====================
+
+def load_principal(user_id):
+    """
+    Принципал пользователя из кэша или из БД (один запрос по столбцам)
+    
+    Args:
+        user_id: ID пользователя
+    
+    Returns:
+        Principal или None, если пользователь не найден
+    """
+    cache = get_principal_cache()
+    principal = cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    generation = cache.generation
+    row = db.session.query(User.id, User.role, User.is_active, User.full_name).filter(
+        User.id == user_id
+    ).first()
+    if row is None:
+        return None
+    
+    principal = Principal(id=row.id, role=row.role, is_active=bool(row.is_active), full_name=row.full_name)
+    cache.put(principal, generation)
+    return principal
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    """Загрузка пользователя по ID для Flask-Login"""
+    return load_principal(int(user_id))
+
+
+def get_current_user_record():
+    """
+    Полная запись User текущего пользователя (для профиля и смены пароля)
+    
+    Returns:
+        User: Запись в сессии текущего запроса (404, если пользователь удален)
+    """
+    user = db.session.get(User, current_user.id)
+    if user is None:
+        abort(404)
+    return user
+
+
+# ===================== СБРОС =====================
+
+def invalidate_principals(user_ids=None, broadcast=True):
+    """
+    Сбросить кэш после изменения или удаления пользователей
+    
+    Вызывается после коммита.
+    
+    Args:
+        user_ids: ID пользователей или None - все записи
+        broadcast: Сообщить о сбросе остальным рабочим процессам
+    """
+    get_principal_cache().invalidate(user_ids)
+    
+    if broadcast:
+        publish_invalidation('principals', user_ids)
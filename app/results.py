@@ -0,0 +1,483 @@
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from app.models import (Student, Standard, StandardResult, StudentBestResult,
+                        Group, Specialty)
+from app.cache_bus import publish_invalidation
+from app.dashboard_stats import StatsCache, STATS_CACHE_SIZE, cached_stats
+
+
+# Сколько раз повторять вставку при конфликте номеров попыток
+ATTEMPT_RETRIES = 5
+
+# Уникальность (student_id, standard_id, attempt_number) в standard_results
+ATTEMPT_CONSTRAINT = 'unique_student_standard_attempt'
+
+
+# ===================== ЛУЧШИЕ РЕЗУЛЬТАТЫ =====================
+
+def _best_attempts_select(connection, *criteria):
+    """
+    Запрос лучших попыток по каждой паре (студент, норматив)
+    
+    На PostgreSQL - SELECT DISTINCT ON, на остальных СУБД - эквивалент
+    через row_number(). Лучшей считается попытка с максимальными баллами,
+    при равенстве - более ранняя.
+    
+    Args:
+        connection: Соединение SQLAlchemy (для определения диалекта)
+        criteria: Условия отбора результатов
+    
+    Returns:
+        Select: Столбцы id, student_id, standard_id, points
+    """
+    columns = (
+        StandardResult.id,
+        StandardResult.student_id,
+        StandardResult.standard_id,
+        StandardResult.points
+    )
+    
+    if connection.dialect.name == 'postgresql':
+        return db.select(*columns).where(*criteria).distinct(
+            StandardResult.student_id, StandardResult.standard_id
+        ).order_by(
+            StandardResult.student_id,
+            StandardResult.standard_id,
+            StandardResult.points.desc(),
+            StandardResult.id
+        )
+    
+    ranked = db.select(
+        *columns,
+        db.func.row_number().over(
+            partition_by=(StandardResult.student_id, StandardResult.standard_id),
+            order_by=(StandardResult.points.desc(), StandardResult.id)
+        ).label('position')
+    ).where(*criteria).subquery()
+    
+    return db.select(
+        ranked.c.id, ranked.c.student_id, ranked.c.standard_id, ranked.c.points
+    ).where(ranked.c.position == 1)
+
+
+def rebuild_best_results(connection, pairs):
+    """
+    Пересчитать проекцию student_best_results для пар (студент, норматив)
+    
+    Работает на уровне соединения, поэтому может вызываться
+    из обработчика after_flush.
+    
+    Args:
+        connection: Соединение SQLAlchemy (текущая транзакция)
+        pairs: Множество (student_id, standard_id)
+    """
+    pairs = {(student_id, standard_id) for student_id, standard_id in pairs
+             if student_id is not None and standard_id is not None}
+    if not pairs:
+        return
+    
+    rows = connection.execute(_best_attempts_select(
+        connection,
+        db.tuple_(StandardResult.student_id, StandardResult.standard_id).in_(list(pairs))
+    )).all()
+    
+    connection.execute(
+        db.delete(StudentBestResult).where(
+            db.tuple_(StudentBestResult.student_id, StudentBestResult.standard_id).in_(list(pairs))
+        )
+    )
+    if rows:
+        connection.execute(db.insert(StudentBestResult), [
+            {'result_id': result_id, 'student_id': student_id, 'standard_id': standard_id, 'points': points}
+            for result_id, student_id, standard_id, points in rows
+        ])
+
+
+def refresh_best_results(pairs):
+    """Пересчитать лучшие результаты в текущей транзакции сессии"""
+    rebuild_best_results(db.session.connection(), pairs)
+    db.session.info['results_changed'] = True
+
+
+def rebuild_all_best_results():
+    """
+    Полностью перестроить проекцию лучших результатов одним INSERT ... SELECT
+    
+    Returns:
+        int: Количество записей в проекции
+    """
+    connection = db.session.connection()
+    db.session.info['results_changed'] = True
+    connection.execute(db.delete(StudentBestResult))
+    connection.execute(
+        db.insert(StudentBestResult).from_select(
+            ['result_id', 'student_id', 'standard_id', 'points'],
+            _best_attempts_select(connection)
+        )
+    )
+    
+    return db.session.query(db.func.count()).select_from(StudentBestResult).scalar()
+
+
+def get_best_results(student_ids=None, group_ids=None, standard_ids=None):
+    """
+    Лучшие попытки студентов одним запросом по проекции
+    
+    Args:
+        student_ids: Список ID студентов или None
+        group_ids: Список ID групп или None
+        standard_ids: Список ID нормативов или None (все)
+    
+    Returns:
+        dict: {(student_id, standard_id): StandardResult}
+    """
+    from app.utils import _scoped
+    
+    query = StandardResult.query.join(
+        StudentBestResult, StudentBestResult.result_id == StandardResult.id
+    )
+    query = _scoped(query, StudentBestResult.student_id, student_ids, group_ids)
+    if standard_ids is not None:
+        query = query.filter(StudentBestResult.standard_id.in_(standard_ids))
+    
+    return {(result.student_id, result.standard_id): result for result in query.all()}
+
+
+def get_best_points(student_ids=None, group_ids=None):
+    """
+    Баллы лучших попыток без загрузки самих результатов
+    
+    Returns:
+        dict: {(student_id, standard_id): points}
+    """
+    from app.utils import _scoped
+    
+    query = db.session.query(
+        StudentBestResult.student_id,
+        StudentBestResult.standard_id,
+        StudentBestResult.points
+    )
+    query = _scoped(query, StudentBestResult.student_id, student_ids, group_ids)
+    
+    return {(student_id, standard_id): points for student_id, standard_id, points in query.all()}
+
+
+def get_result_matrix(group_id, standard_ids):
+    """
+    Матрица лучших результатов группы для таблицы нормативов одним запросом
+    
+    Студенты группы соединяются с проекцией лучших попыток внешним
+    соединением, поэтому студенты без результатов тоже попадают в матрицу.
+    
+    Args:
+        group_id: ID группы
+        standard_ids: Список ID нормативов (столбцы матрицы)
+    
+    Returns:
+        list: [{'student': Student, 'results': {standard_id: StandardResult|None}}]
+              в порядке ФИО
+    """
+    standard_ids = list(standard_ids)
+    
+    rows = db.session.query(Student, StandardResult).outerjoin(
+        StudentBestResult,
+        db.and_(
+            StudentBestResult.student_id == Student.id,
+            StudentBestResult.standard_id.in_(standard_ids)
+        )
+    ).outerjoin(
+        StandardResult, StandardResult.id == StudentBestResult.result_id
+    ).filter(
+        Student.group_id == group_id
+    ).order_by(Student.full_name, Student.id).all()
+    
+    matrix = []
+    by_student = {}
+    for student, result in rows:
+        item = by_student.get(student.id)
+        if item is None:
+            item = {'student': student, 'results': dict.fromkeys(standard_ids)}
+            by_student[student.id] = item
+            matrix.append(item)
+        if result is not None:
+            item['results'][result.standard_id] = result
+    
+    return matrix
+
+
+# ===================== ВЫПОЛНЕНИЕ НОРМАТИВОВ =====================
+
+def get_completion_cache():
+    """Кэш сводки выполнения нормативов текущего приложения"""
+    cache = current_app.extensions.get('standards_completion')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'standards_completion',
+            StatsCache(current_app.config.get('STATS_CACHE_SIZE', STATS_CACHE_SIZE))
+        )
+    return cache
+
+
+def get_standards_completion(faculty_id=None, course=None, semester=None):
+    """
+    Сводка выполнения нормативов одним сгруппированным запросом
+    
+    Фильтры применяются в SQL. Результат хранится в ограниченном кэше
+    (см. get_completion_cache) по набору фильтров и сбрасывается после
+    коммита, изменившего результаты или состав студентов.
+    
+    Без фильтров считаются все студенты и результаты, без соединения с группами.
+    
+    Args:
+        faculty_id: ID факультета или None
+        course: Курс или None
+        semester: Семестр или None
+    
+    Returns:
+        dict: {'total_students': int,
+               'standards': {standard_id: {'completed_by', 'attempts', 'avg_points'}}}
+    """
+    return cached_stats(
+        ('standards_completion', faculty_id, course, semester),
+        lambda: compute_standards_completion(faculty_id, course, semester),
+        cache=get_completion_cache()
+    )
+
+
+def compute_standards_completion(faculty_id=None, course=None, semester=None):
+    """Сводка выполнения нормативов без кэша (аргументы как у get_standards_completion)"""
+    criteria = []
+    if faculty_id is not None:
+        criteria.append(Group.specialty_id.in_(
+            db.select(Specialty.id).where(Specialty.faculty_id == faculty_id)
+        ))
+    if course is not None:
+        criteria.append(Group.course == course)
+    if semester is not None:
+        criteria.append(Group.semester == semester)
+    
+    total_students = db.select(db.func.count(Student.id))
+    query = db.session.query(
+        StandardResult.standard_id,
+        db.func.count(db.distinct(StandardResult.student_id)),
+        db.func.count(StandardResult.id),
+        db.func.avg(StandardResult.points)
+    )
+    
+    # Фильтры относятся к группе; без них соединение с группами не нужно
+    if criteria:
+        total_students = total_students.join(Group, Group.id == Student.group_id).where(*criteria)
+        query = query.join(
+            Student, Student.id == StandardResult.student_id
+        ).join(
+            Group, Group.id == Student.group_id
+        ).filter(*criteria)
+    
+    total_students = total_students.scalar_subquery()
+    rows = query.add_columns(total_students).group_by(StandardResult.standard_id).all()
+    
+    if rows:
+        total = rows[0][4]
+    else:
+        total = db.session.query(total_students).scalar()
+    
+    return {
+        'total_students': total or 0,
+        'standards': {
+            standard_id: {
+                'completed_by': completed_by,
+                'attempts': attempts,
+                'avg_points': round(float(avg_points), 2) if avg_points else 0
+            }
+            for standard_id, completed_by, attempts, avg_points, _ in rows
+        }
+    }
+
+
+def invalidate_standards_completion(broadcast=True):
+    """
+    Сбросить кэш сводки выполнения нормативов
+    
+    Args:
+        broadcast: Сообщить о сбросе остальным рабочим процессам
+    """
+    get_completion_cache().invalidate()
+    
+    if broadcast:
+        publish_invalidation('standards_completion')
+
+
+# ===================== СИНХРОНИЗАЦИЯ =====================
+
+def _changed_pairs(session):
+    """Пары (студент, норматив), затронутые изменениями результатов в сессии"""
+    pairs = set()
+    
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, StandardResult):
+            continue
+        
+        pairs.add((obj.student_id, obj.standard_id))
+        
+        # Перенос результата к другому студенту или нормативу
+        state = inspect(obj)
+        student_history = state.attrs.student_id.history
+        standard_history = state.attrs.standard_id.history
+        for student_id in student_history.deleted or ():
+            pairs.add((student_id, obj.standard_id))
+        for standard_id in standard_history.deleted or ():
+            pairs.add((obj.student_id, standard_id))
+    
+    return pairs
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_best_results(session, flush_context):
+    pairs = _changed_pairs(session)
+    
+    deleted_students = [obj.id for obj in session.deleted if isinstance(obj, Student)]
+    deleted_standards = [obj.id for obj in session.deleted if isinstance(obj, Standard)]
+    
+    # Состав студентов и групп влияет на сводку выполнения нормативов
+    if pairs or any(isinstance(obj, (Student, Group)) for obj in
+                    list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info['results_changed'] = True
+    
+    if not (pairs or deleted_students or deleted_standards):
+        return
+    
+    connection = session.connection()
+    
+    if deleted_students:
+        connection.execute(
+            db.delete(StudentBestResult).where(StudentBestResult.student_id.in_(deleted_students))
+        )
+    if deleted_standards:
+        connection.execute(
+            db.delete(StudentBestResult).where(StudentBestResult.standard_id.in_(deleted_standards))
+        )
+    
+    rebuild_best_results(connection, pairs)
+
+
+# ===================== ПАКЕТНЫЙ ВВОД =====================
+
+def has_attempt_constraint(connection):
+    """
+    Есть ли в БД уникальность номеров попыток
+    
+    create_all создает ограничение только в новых базах; в существующие
+    его добавляет flask renumber-attempts (в SQLite - уникальным индексом).
+    Без него повтор вставки в insert_results не срабатывает.
+    """
+    inspector = inspect(connection)
+    names = {c['name'] for c in inspector.get_unique_constraints(StandardResult.__tablename__)}
+    names.update(i['name'] for i in inspector.get_indexes(StandardResult.__tablename__) if i['unique'])
+    return ATTEMPT_CONSTRAINT in names
+
+
+def _next_attempt(student_id, standard_id, offset):
+    """Номер попытки, вычисляемый в самом INSERT: MAX(attempt_number) + offset"""
+    previous = db.aliased(StandardResult)
+    return db.select(
+        db.func.coalesce(db.func.max(previous.attempt_number), 0) + offset
+    ).where(
+        previous.student_id == student_id,
+        previous.standard_id == standard_id
+    ).scalar_subquery()
+
+
+def insert_results(cells, result_date, created_by):
+    """
+    Сохранить пачку результатов одним INSERT
+    
+    Баллы считаются по скомпилированному индексу шкал. Номера попыток
+    вычисляет сама БД подзапросом MAX(attempt_number) + n в том же INSERT;
+    уникальное ограничение (student_id, standard_id, attempt_number)
+    отклоняет параллельную вставку с тем же номером, и тогда INSERT
+    повторяется в точке сохранения (блокировки на весь запрос не нужны).
+    Лучшие результаты обновляются явно (Core-запрос не проходит через flush).
+    Коммит выполняет вызывающий код.
+    
+    Args:
+        cells: Список словарей {'student_id', 'standard_id', 'result_value', 'gender'}
+        result_date: Дата результатов
+        created_by: ID пользователя
+    
+    Returns:
+        list: [{'student_id', 'standard_id', 'result_value', 'points', 'attempt'}]
+              в порядке cells
+    """
+    from sqlalchemy.exc import IntegrityError
+    from app.scoring import get_scale_index, score_result
+    
+    if not cells:
+        return []
+    
+    index = get_scale_index()
+    offsets = {}
+    saved = []
+    values = []
+    for cell in cells:
+        key = (cell['student_id'], cell['standard_id'])
+        offsets[key] = offsets.get(key, 0) + 1
+        row = {
+            'student_id': cell['student_id'],
+            'standard_id': cell['standard_id'],
+            'result_value': float(cell['result_value']),
+            'points': score_result(index, cell['standard_id'], cell['gender'], cell['result_value']),
+            'attempt': None
+        }
+        saved.append(row)
+        values.append({
+            'student_id': row['student_id'],
+            'standard_id': row['standard_id'],
+            'result_value': row['result_value'],
+            'points': row['points'],
+            'date': result_date,
+            'attempt_number': _next_attempt(row['student_id'], row['standard_id'], offsets[key]),
+            'created_by': created_by
+        })
+    
+    statement = db.insert(StandardResult).values(values).returning(
+        StandardResult.student_id,
+        StandardResult.standard_id,
+        StandardResult.attempt_number
+    )
+    
+    for retry in range(ATTEMPT_RETRIES):
+        try:
+            with db.session.begin_nested():
+                returned = db.session.execute(statement).all()
+            break
+        except IntegrityError:
+            if retry == ATTEMPT_RETRIES - 1:
+                raise
+    
+    # Порядок RETURNING не гарантирован; внутри пары номера растут в порядке cells
+    attempts = {}
+    for student_id, standard_id, attempt_number in returned:
+        attempts.setdefault((student_id, standard_id), []).append(attempt_number)
+    for numbers in attempts.values():
+        numbers.sort(reverse=True)
+    for row in saved:
+        row['attempt'] = attempts[(row['student_id'], row['standard_id'])].pop()
+    
+    refresh_best_results(offsets)
+    
+    return saved
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('results_changed', False) and current_app:
+        invalidate_standards_completion()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_after_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('results_changed', None)
+
@@ -1,14 +1,28 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, current_app,
+                   jsonify, send_file, Response, stream_with_context)
 from flask_login import login_required, current_user
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, date
 from app import db
 from app.models import (User, Faculty, Specialty, EducationForm, Group, Student,
                         Module, Theme, Standard, StandardScale, Attendance,
-                        StandardResult, Assignment, Statement)
-from app.utils import allowed_file, get_unique_filename
+                        StandardResult, StudentBestResult, Assignment, Statement, ImportJob)
+from app.utils import allowed_file, get_unique_filename, run_ratings_refresh_job
+from app.scoring import invalidate_scale_index, rescore_results, build_scale_index
+from app.curriculum import invalidate_curriculum
+from app.imports import create_student_import_job, get_imports_folder
+from app.bulk_load import BULK_COLUMNS, run_bulk_load_job
+from app.jobs import submit_job
+from app.dashboard_stats import get_stats_cache
+from app.results import get_completion_cache
+from app.single_flight import get_single_flight
+from app.principals import invalidate_principals
+from app.choices import (get_specialty_choices, get_education_form_choices, get_teacher_choices,
+                         get_module_choices, get_theme_choices, get_active_standard_choices,
+                         get_active_standard_options)
+from app.statements import (create_semester_statements, generate_statement_files,
+                            iter_zip, statement_archive_name)
 import os
-from openpyxl import load_workbook
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -56,6 +70,17 @@ def dashboard():
                          recent_groups=recent_groups)
 
 
+
+@bp.route('/cache-stats')
+@login_required
+@admin_required
+def cache_stats():
+    """Счетчики кэшей статистики этого рабочего процесса (JSON)"""
+    stats = get_stats_cache().stats()
+    stats['single_flight'] = get_single_flight().stats()
+    stats['standards_completion'] = get_completion_cache().stats()
+    return jsonify(stats)
+
 # ===================== УПРАВЛЕНИЕ ПОЛЬЗОВАТЕЛЯМИ =====================
 
 @bp.route('/users')
@@ -160,6 +185,7 @@ def edit_user(user_id):
             user.set_password(new_password)
         
         db.session.commit()
+        invalidate_principals([user_id])
         
         flash(f'Пользователь "{full_name}" успешно обновлен.', 'success')
         return redirect(url_for('admin.users'))
@@ -181,6 +207,7 @@ def delete_user(user_id):
     
     db.session.delete(user)
     db.session.commit()
+    invalidate_principals([user_id])
     
     flash(f'Пользователь "{full_name}" успешно удален.', 'success')
     return redirect(url_for('admin.users'))
@@ -482,7 +509,7 @@ def groups():
         query = query.filter_by(course=course)
     
     groups = query.order_by(Group.name).all()
-    teachers = User.query.filter_by(role='teacher').all()
+    teachers = get_teacher_choices(include_inactive=True)
     
     return render_template('admin/groups.html',
                          groups=groups,
@@ -501,9 +528,9 @@ def create_group():
     print("Rendering: admin/group_form.html")
     print("="*50 + "\n")
     
-    specialties = Specialty.query.all()
-    education_forms = EducationForm.query.all()
-    teachers = User.query.filter_by(role='teacher').all()
+    specialties = get_specialty_choices()
+    education_forms = get_education_form_choices()
+    teachers = get_teacher_choices(include_inactive=True)
     
     if request.method == 'POST':
         name = request.form.get('name')
@@ -556,9 +583,9 @@ def create_group():
 def edit_group(group_id):
     """Редактировать группу"""
     group = Group.query.get_or_404(group_id)
-    specialties = Specialty.query.all()
-    education_forms = EducationForm.query.all()
-    teachers = User.query.filter_by(role='teacher').all()
+    specialties = get_specialty_choices()
+    education_forms = get_education_form_choices()
+    teachers = get_teacher_choices(include_inactive=True)
     
     if request.method == 'POST':
         name = request.form.get('name')
@@ -629,7 +656,12 @@ def delete_group(group_id):
 @admin_required
 def import_students():
     """Импорт студентов из Excel"""
-    groups = Group.query.order_by(Group.name).all()
+    # Список групп с числом студентов - один агрегирующий запрос по столбцам
+    groups = db.session.query(
+        Group.id, Group.name, Group.course, db.func.count(Student.id).label('students_count')
+    ).outerjoin(Student, Student.group_id == Group.id).group_by(
+        Group.id, Group.name, Group.course
+    ).order_by(Group.name).all()
     
     if request.method == 'POST':
         if 'file' not in request.files:
@@ -646,95 +678,139 @@ def import_students():
             flash('Неверный формат файла. Используйте .xlsx или .xls', 'danger')
             return render_template('admin/import_students.html', groups=groups)
         
+        # Сохранить файл и поставить импорт в очередь
+        filepath = os.path.join(get_imports_folder(), get_unique_filename(file.filename))
+        file.save(filepath)
+        
+        job = create_student_import_job(filepath, file.filename, current_user.id)
+        
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'job_id': job.id, 'status_url': url_for('admin.import_job_status', job_id=job.id)}), 202
+        
+        flash('Файл принят, импорт выполняется в фоне.', 'info')
+        return redirect(url_for('admin.import_job', job_id=job.id))
+    
+    jobs = ImportJob.query.order_by(ImportJob.created_at.desc()).limit(10).all()
+    return render_template('admin/import_students.html', groups=groups, jobs=jobs)
+
+
+@bp.route('/bulk-load', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_load():
+    """Массовая загрузка CSV (студенты, посещаемость, результаты)"""
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        delimiter = {'comma': ',', 'semicolon': ';', 'tab': '\t'}.get(request.form.get('delimiter'), ',')
+        file = request.files.get('file')
+        
+        if kind not in BULK_COLUMNS:
+            flash('Неверный вид загрузки.', 'danger')
+            return render_template('admin/bulk_load.html', columns=BULK_COLUMNS)
+        
+        if not file or file.filename == '':
+            flash('Файл не выбран.', 'danger')
+            return render_template('admin/bulk_load.html', columns=BULK_COLUMNS)
+        
+        if not allowed_file(file.filename, {'csv'}):
+            flash('Неверный формат файла. Используйте .csv', 'danger')
+            return render_template('admin/bulk_load.html', columns=BULK_COLUMNS)
+        
+        filepath = os.path.join(get_imports_folder(), get_unique_filename(file.filename))
+        file.save(filepath)
+        
+        job = ImportJob(kind=f'csv_{kind}', filename=file.filename, created_by=current_user.id)
+        db.session.add(job)
+        db.session.commit()
+        
+        submit_job(run_bulk_load_job, job.id, filepath, kind, delimiter)
+        
+        flash('Файл принят, загрузка выполняется в фоне.', 'info')
+        return redirect(url_for('admin.import_job', job_id=job.id))
+    
+    return render_template('admin/bulk_load.html', columns=BULK_COLUMNS)
+
+
+@bp.route('/import-jobs/<int:job_id>')
+@login_required
+@admin_required
+def import_job(job_id):
+    """Страница хода фонового импорта"""
+    job = ImportJob.query.get_or_404(job_id)
+    return render_template('admin/import_job.html', job=job)
+
+
+@bp.route('/import-jobs/<int:job_id>/status')
+@login_required
+@admin_required
+def import_job_status(job_id):
+    """Состояние фонового импорта (AJAX)"""
+    job = ImportJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+
+@bp.route('/import-jobs/<int:job_id>/errors')
+@login_required
+@admin_required
+def import_job_errors(job_id):
+    """Скачать отчет об ошибках импорта"""
+    job = ImportJob.query.get_or_404(job_id)
+    
+    if not job.error_file:
+        flash('Отчет об ошибках отсутствует.', 'warning')
+        return redirect(url_for('admin.import_job', job_id=job.id))
+    
+    return send_file(
+        os.path.abspath(os.path.join(get_imports_folder(), job.error_file)),
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=f'import_{job.id}_errors.csv'
+    )
+
+
+
+# ===================== ВЕДОМОСТИ =====================
+
+@bp.route('/statements/generate', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def generate_statements():
+    """Сформировать ведомости всех групп семестра и скачать ZIP-архивом"""
+    semesters = [semester for (semester,) in db.session.query(Group.semester).distinct().order_by(Group.semester)]
+    
+    if request.method == 'POST':
+        semester = request.form.get('semester', type=int)
+        statement_type = request.form.get('type')
+        dean_name = request.form.get('dean_name', '').strip() or None
+        
         try:
-            # Сохранить файл временно
-            filename = get_unique_filename(file.filename)
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            # Загрузить Excel
-            workbook = load_workbook(filepath)
-            sheet = workbook.active
-            
-            imported = 0
-            errors = []
-            
-            # Пропустить заголовок
-            for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                if not row[0]:  # Пустая строка
-                    continue
-                
-                try:
-                    full_name = row[0]
-                    student_number = row[1]
-                    group_name = row[2]
-                    gender = row[3]
-                    birth_date = row[4] if len(row) > 4 else None
-                    medical_group = row[5] if len(row) > 5 else 'основная'
-                    
-                    # Проверка обязательных полей
-                    if not all([full_name, student_number, group_name, gender]):
-                        errors.append(f'Строка {row_num}: отсутствуют обязательные поля')
-                        continue
-                    
-                    # Проверка пола
-                    if gender.lower() not in ['м', 'ж', 'male', 'female', 'мужской', 'женский']:
-                        errors.append(f'Строка {row_num}: неверный пол')
-                        continue
-                    
-                    # Нормализация пола
-                    if gender.lower() in ['м', 'male', 'мужской']:
-                        gender = 'male'
-                    else:
-                        gender = 'female'
-                    
-                    # Найти группу
-                    group = Group.query.filter_by(name=group_name).first()
-                    if not group:
-                        errors.append(f'Строка {row_num}: группа "{group_name}" не найдена')
-                        continue
-                    
-                    # Проверка на дубликат
-                    if Student.query.filter_by(student_number=student_number).first():
-                        errors.append(f'Строка {row_num}: студент с номером {student_number} уже существует')
-                        continue
-                    
-                    # Создать студента
-                    student = Student(
-                        full_name=full_name,
-                        student_number=student_number,
-                        gender=gender,
-                        birth_date=birth_date if isinstance(birth_date, datetime) else None,
-                        medical_group=medical_group,
-                        group_id=group.id
-                    )
-                    db.session.add(student)
-                    imported += 1
-                    
-                except Exception as e:
-                    errors.append(f'Строка {row_num}: {str(e)}')
-            
+            statement_date = datetime.strptime(request.form.get('date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            statement_date = date.today()
+        
+        if semester not in semesters or statement_type not in ('зачет', 'экзамен'):
+            flash('Выберите семестр и тип ведомости.', 'danger')
+            return render_template('admin/generate_statements.html', semesters=semesters, today=date.today())
+        
+        try:
+            statements = create_semester_statements(semester, statement_type, statement_date,
+                                                    dean_name, current_user.id)
             db.session.commit()
-            
-            # Удалить временный файл
-            os.remove(filepath)
-            
-            if imported > 0:
-                flash(f'Импорт завершен. Добавлено студентов: {imported}', 'success')
-            
-            if errors:
-                flash(f'Обнаружено ошибок: {len(errors)}', 'warning')
-                for error in errors[:10]:  # Показать первые 10 ошибок
-                    flash(error, 'warning')
-            
-            return redirect(url_for('admin.import_students'))
-            
+            files = generate_statement_files(statements)
         except Exception as e:
-            flash(f'Ошибка импорта: {str(e)}', 'danger')
-            return render_template('admin/import_students.html', groups=groups)
+            db.session.rollback()
+            flash(f'Ошибка при формировании ведомостей: {str(e)}', 'danger')
+            return render_template('admin/generate_statements.html', semesters=semesters, today=date.today())
+        
+        entries = [(statement_archive_name(statement), path) for statement, path in files]
+        
+        return Response(
+            stream_with_context(iter_zip(entries)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=statements_semester_{semester}.zip'}
+        )
     
-    return render_template('admin/import_students.html', groups=groups)
-
+    return render_template('admin/generate_statements.html', semesters=semesters, today=date.today())
 
 # ===================== МОДУЛИ И ТЕМЫ =====================
 
@@ -747,6 +823,26 @@ def modules():
     return render_template('admin/modules.html', modules=modules)
 
 
+def _students_with_results(theme_ids):
+    """
+    Студенты с результатами по нормативам тем
+    
+    Структура курса влияет только на их рейтинг: у остальных баллы
+    по этим темам нулевые при любых настройках.
+    """
+    if not theme_ids:
+        return []
+    return [student_id for (student_id,) in db.session.query(StudentBestResult.student_id).join(
+        Standard, Standard.id == StudentBestResult.standard_id
+    ).filter(Standard.theme_id.in_(theme_ids)).distinct().all()]
+
+
+def _refresh_ratings_in_background(student_ids):
+    """Поставить пересчет рейтингов в фоновую задачу (после коммита изменения)"""
+    if student_ids:
+        submit_job(run_ratings_refresh_job, sorted(student_ids))
+
+
 @bp.route('/modules/create', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -765,9 +861,11 @@ def create_module():
             flash('Модуль с таким номером уже существует.', 'danger')
             return render_template('admin/module_form.html', module=None)
         
+        # Модуль без тем не меняет рейтинги
         module = Module(number=number, name=name, max_points=max_points)
         db.session.add(module)
         db.session.commit()
+        invalidate_curriculum()
         
         flash(f'Модуль "{name}" успешно создан.', 'success')
         return redirect(url_for('admin.modules'))
@@ -780,7 +878,7 @@ def create_module():
 @admin_required
 def create_theme():
     """Создать тему"""
-    modules = Module.query.order_by(Module.number).all()
+    modules = get_module_choices()
     
     if request.method == 'POST':
         name = request.form.get('name')
@@ -799,9 +897,11 @@ def create_theme():
                                  theme=None,
                                  modules=modules)
         
+        # Тема без нормативов не меняет рейтинги
         theme = Theme(name=name, module_id=module_id, max_points=max_points)
         db.session.add(theme)
         db.session.commit()
+        invalidate_curriculum()
         
         flash(f'Тема "{name}" успешно создана.', 'success')
         return redirect(url_for('admin.modules'))
@@ -830,10 +930,18 @@ def edit_module(module_id):
             flash('Модуль с таким номером уже существует.', 'danger')
             return render_template('admin/module_form.html', module=module)
         
+        affected = []
+        if (module.number, module.max_points) != (number, max_points):
+            affected = _students_with_results(
+                [theme_id for (theme_id,) in db.session.query(Theme.id).filter_by(module_id=module.id).all()]
+            )
+        
         module.number = number
         module.name = name
         module.max_points = max_points
         db.session.commit()
+        invalidate_curriculum()
+        _refresh_ratings_in_background(affected)
         
         flash(f'Модуль "{name}" успешно обновлен.', 'success')
         return redirect(url_for('admin.modules'))
@@ -852,6 +960,7 @@ def delete_module(module_id):
     # Подсчет удаляемых объектов
     themes_count = module.themes.count()
     standards_count = 0
+    affected = _students_with_results([theme.id for theme in module.themes.all()])
     
     # Каскадное удаление: сначала удалить все темы и их нормативы
     for theme in module.themes.all():
@@ -869,6 +978,9 @@ def delete_module(module_id):
     # Удалить модуль
     db.session.delete(module)
     db.session.commit()
+    invalidate_curriculum()
+    invalidate_scale_index()
+    _refresh_ratings_in_background(affected)
     
     # Информативное сообщение
     message = f'Модуль "{name}" успешно удален.'
@@ -887,7 +999,7 @@ def delete_module(module_id):
 def edit_theme(theme_id):
     """Редактировать тему"""
     theme = Theme.query.get_or_404(theme_id)
-    modules = Module.query.order_by(Module.number).all()
+    modules = get_module_choices()
     
     if request.method == 'POST':
         name = request.form.get('name')
@@ -906,10 +1018,16 @@ def edit_theme(theme_id):
                                  theme=theme,
                                  modules=modules)
         
+        affected = []
+        if (theme.module_id, theme.max_points) != (module_id, max_points):
+            affected = _students_with_results([theme.id])
+        
         theme.name = name
         theme.module_id = module_id
         theme.max_points = max_points
         db.session.commit()
+        invalidate_curriculum()
+        _refresh_ratings_in_background(affected)
         
         flash(f'Тема "{name}" успешно обновлена.', 'success')
         return redirect(url_for('admin.modules'))
@@ -927,6 +1045,7 @@ def delete_theme(theme_id):
     
     # Подсчет удаляемых объектов
     standards_count = theme.standards.count()
+    affected = _students_with_results([theme.id])
     
     # Каскадное удаление: удалить все нормативы темы
     for standard in theme.standards.all():
@@ -939,6 +1058,9 @@ def delete_theme(theme_id):
     # Удалить тему
     db.session.delete(theme)
     db.session.commit()
+    invalidate_curriculum()
+    invalidate_scale_index()
+    _refresh_ratings_in_background(affected)
     
     # Информативное сообщение
     message = f'Тема "{name}" успешно удалена.'
@@ -965,7 +1087,7 @@ def standards():
         query = query.filter_by(is_active=is_active.lower() == 'true')
     
     standards = query.all()
-    themes = Theme.query.all()
+    themes = get_theme_choices()
     
     return render_template('admin/standards.html',
                          standards=standards,
@@ -978,7 +1100,7 @@ def standards():
 @admin_required
 def create_standard():
     """Создать норматив"""
-    themes = Theme.query.all()
+    themes = get_theme_choices()
     
     if request.method == 'POST':
         name = request.form.get('name')
@@ -1014,6 +1136,11 @@ def create_standard():
         )
         db.session.add(standard)
         db.session.commit()
+        invalidate_curriculum()
+        invalidate_scale_index()
+        # Активный норматив меняет средний балл темы
+        if is_active:
+            _refresh_ratings_in_background(_students_with_results([theme_id]))
         
         flash(f'Норматив "{name}" успешно создан.', 'success')
         return redirect(url_for('admin.standards'))
@@ -1029,7 +1156,7 @@ def create_standard():
 def edit_standard(standard_id):
     """Редактировать норматив"""
     standard = Standard.query.get_or_404(standard_id)
-    themes = Theme.query.all()
+    themes = get_theme_choices()
     
     if request.method == 'POST':
         name = request.form.get('name')
@@ -1049,11 +1176,17 @@ def edit_standard(standard_id):
                                  standard=standard,
                                  themes=themes)
         
+        activity_changed = standard.is_active != is_active
+        
         standard.name = name
         standard.unit = unit
         standard.comparison_type = comparison_type
         standard.is_active = is_active
         db.session.commit()
+        invalidate_curriculum()
+        invalidate_scale_index()
+        if activity_changed:
+            _refresh_ratings_in_background(_students_with_results([standard.theme_id]))
         
         flash(f'Норматив "{name}" успешно обновлен.', 'success')
         return redirect(url_for('admin.standards'))
@@ -1075,8 +1208,13 @@ def delete_standard(standard_id):
         return redirect(url_for('admin.standards'))
     
     name = standard.name
+    theme_id, was_active = standard.theme_id, standard.is_active
     db.session.delete(standard)
     db.session.commit()
+    invalidate_curriculum()
+    invalidate_scale_index()
+    if was_active:
+        _refresh_ratings_in_background(_students_with_results([theme_id]))
     
     flash(f'Норматив "{name}" успешно удален.', 'success')
     return redirect(url_for('admin.standards'))
@@ -1084,6 +1222,28 @@ def delete_standard(standard_id):
 
 # ===================== ОЦЕНОЧНЫЕ ШКАЛЫ =====================
 
+def _commit_scale_change(standard_id, gender):
+    """
+    Зафиксировать изменение шкалы вместе с пересчетом результатов
+    
+    Баллы, лучшие результаты и рейтинги пересчитываются по индексу,
+    построенному в той же транзакции, и коммитятся вместе со шкалой:
+    ошибка пересчета откатывает и само изменение.
+    
+    Returns:
+        str: Текст для flash
+    """
+    db.session.flush()
+    summary = rescore_results(standard_id, gender, index=build_scale_index())
+    db.session.commit()
+    invalidate_scale_index()
+    
+    if not summary['updated']:
+        return ''
+    return (f' Пересчитано результатов: {summary["updated"]}, '
+            f'изменился рейтинг студентов: {summary["ratings_changed"]}.')
+
+
 @bp.route('/standard-scales')
 @login_required
 @admin_required
@@ -1098,7 +1258,7 @@ def standard_scales():
     scales = query.order_by(StandardScale.standard_id, 
                            StandardScale.gender,
                            StandardScale.points.desc()).all()
-    standards = Standard.query.filter_by(is_active=True).all()
+    standards = get_active_standard_choices()
     
     return render_template('admin/standard_scales.html',
                          scales=scales,
@@ -1111,7 +1271,7 @@ def standard_scales():
 @admin_required
 def create_standard_scale():
     """Создать оценочную шкалу"""
-    standards = Standard.query.filter_by(is_active=True).all()
+    standards = get_active_standard_options()
     
     if request.method == 'POST':
         standard_id = request.form.get('standard_id', type=int)
@@ -1152,9 +1312,8 @@ def create_standard_scale():
             max_value=max_value
         )
         db.session.add(scale)
-        db.session.commit()
         
-        flash('Оценочная шкала успешно создана.', 'success')
+        flash('Оценочная шкала успешно создана.' + _commit_scale_change(standard_id, gender), 'success')
         return redirect(url_for('admin.standard_scales'))
     
     return render_template('admin/standard_scale_form.html',
@@ -1168,7 +1327,7 @@ def create_standard_scale():
 def edit_standard_scale(scale_id):
     """Редактировать оценочную шкалу"""
     scale = StandardScale.query.get_or_404(scale_id)
-    standards = Standard.query.filter_by(is_active=True).all()
+    standards = get_active_standard_options()
     
     if request.method == 'POST':
         points = request.form.get('points', type=int)
@@ -1190,9 +1349,8 @@ def edit_standard_scale(scale_id):
         scale.points = points
         scale.min_value = min_value
         scale.max_value = max_value
-        db.session.commit()
         
-        flash('Оценочная шкала успешно обновлена.', 'success')
+        flash('Оценочная шкала успешно обновлена.' + _commit_scale_change(scale.standard_id, scale.gender), 'success')
         return redirect(url_for('admin.standard_scales'))
     
     return render_template('admin/standard_scale_form.html',
@@ -1206,8 +1364,8 @@ def edit_standard_scale(scale_id):
 def delete_standard_scale(scale_id):
     """Удалить оценочную шкалу"""
     scale = StandardScale.query.get_or_404(scale_id)
+    standard_id, gender = scale.standard_id, scale.gender
     db.session.delete(scale)
-    db.session.commit()
     
-    flash('Оценочная шкала успешно удалена.', 'success')
+    flash('Оценочная шкала успешно удалена.' + _commit_scale_change(standard_id, gender), 'success')
     return redirect(url_for('admin.standard_scales'))
\ No newline at end of file
@@ -2,6 +2,7 @@ from flask import Blueprint, request, render_template, redirect, url_for, flash
 from flask_login import login_user, logout_user, current_user, login_required
 from app import db
 from app.models import User
+from app.principals import get_current_user_record, invalidate_principals
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -73,7 +74,7 @@ def logout():
 @login_required
 def profile():
     """Профиль пользователя"""
-    return render_template('auth/profile.html', user=current_user)
+    return render_template('auth/profile.html', user=get_current_user_record())
 
 
 @bp.route('/change-password', methods=['GET', 'POST'])
@@ -93,7 +94,8 @@ def change_password():
         flash('Все поля обязательны для заполнения.', 'danger')
         return redirect(url_for('auth.change_password'))
     
-    if not current_user.check_password(old_password):
+    user = get_current_user_record()
+    if not user.check_password(old_password):
         flash('Неверный текущий пароль.', 'danger')
         return redirect(url_for('auth.change_password'))
     
@@ -110,8 +112,9 @@ def change_password():
         return redirect(url_for('auth.change_password'))
     
     # Изменить пароль
-    current_user.set_password(new_password)
+    user.set_password(new_password)
     db.session.commit()
+    invalidate_principals([user.id])
     
     flash('Пароль успешно изменен.', 'success')
     return redirect(url_for('auth.profile'))
@@ -122,7 +125,7 @@ def change_password():
 def edit_profile():
     """Редактировать профиль"""
     if request.method == 'GET':
-        return render_template('auth/edit_profile.html', user=current_user)
+        return render_template('auth/edit_profile.html', user=get_current_user_record())
     
     # POST запрос - обработка формы
     full_name = request.form.get('full_name')
@@ -140,9 +143,11 @@ def edit_profile():
         return redirect(url_for('auth.edit_profile'))
     
     # Обновить данные
-    current_user.full_name = full_name
-    current_user.email = email
+    user = get_current_user_record()
+    user.full_name = full_name
+    user.email = email
     db.session.commit()
+    invalidate_principals([user.id])
     
     flash('Профиль успешно обновлен.', 'success')
     return redirect(url_for('auth.profile'))
\ No newline at end of file
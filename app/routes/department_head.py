@@ -4,9 +4,13 @@ from functools import wraps
 from datetime import datetime, timedelta
 from sqlalchemy import func
 from app import db
-from app.models import (User, Group, Student, Attendance, StandardResult, 
+from app.models import (User, Faculty, Group, Student, Attendance, StandardResult, 
                         Statement, Standard, Assignment)
-from app.utils import calculate_student_rating
+from app.utils import get_student_ratings, calculate_attendance_percentages
+from app.attendance import get_attendance_dynamics, get_attendance_by_group
+from app.results import get_standards_completion
+from app.curriculum import get_curriculum
+from app.dashboard_stats import cached_stats, get_group_stats, summarize_group_stats
 
 bp = Blueprint('department', __name__, url_prefix='/department')
 
@@ -22,6 +26,98 @@ def department_head_required(f):
     return decorated_function
 
 
+def _get_students_by_group(group_ids):
+    """ID студентов, сгруппированные по группам"""
+    students_by_group = {}
+    for student_id, group_id in db.session.query(Student.id, Student.group_id).filter(
+        Student.group_id.in_(group_ids)
+    ).all():
+        students_by_group.setdefault(group_id, []).append(student_id)
+    return students_by_group
+
+
+def _summarize_students(student_ids, ratings, attendance):
+    """Сводная статистика по набору студентов"""
+    total_rating = 0
+    total_attendance = 0
+    passed = 0
+    failed = 0
+    
+    for student_id in student_ids:
+        rating = ratings[student_id]
+        total_rating += rating['total']
+        total_attendance += attendance[student_id]
+        
+        if rating['passed']:
+            passed += 1
+        else:
+            failed += 1
+    
+    students_count = len(student_ids)
+    return {
+        'students_count': students_count,
+        'avg_rating': round(total_rating / students_count, 2) if students_count > 0 else 0,
+        'avg_attendance': round(total_attendance / students_count, 2) if students_count > 0 else 0,
+        'passed': passed,
+        'failed': failed,
+        'pass_rate': round((passed / students_count * 100), 2) if students_count > 0 else 0
+    }
+
+
+def _compute_department_stats():
+    """
+    Сводка кафедры и показатели преподавателей из блоков групп
+    
+    Returns:
+        dict: {'total_groups', 'summary', 'by_teacher': {teacher_id: сводка + groups_count}}
+    """
+    groups = db.session.query(Group.id, Group.teacher_id).all()
+    blocks = get_group_stats([group_id for group_id, _ in groups])
+    
+    blocks_by_teacher = {}
+    for group_id, teacher_id in groups:
+        if teacher_id is not None:
+            blocks_by_teacher.setdefault(teacher_id, []).append(blocks[group_id])
+    
+    by_teacher = {}
+    for teacher_id, teacher_blocks in blocks_by_teacher.items():
+        by_teacher[teacher_id] = summarize_group_stats(teacher_blocks)
+        by_teacher[teacher_id]['groups_count'] = len(teacher_blocks)
+    
+    return {
+        'total_groups': len(groups),
+        'summary': summarize_group_stats(blocks.values()),
+        'by_teacher': by_teacher
+    }
+
+
+def _get_department_stats():
+    """Сводка кафедры из кэша статистики (зависит от всех групп)"""
+    return cached_stats(('department',), _compute_department_stats)
+
+
+def _compute_low_performance(threshold):
+    """
+    Студенты с рейтингом ниже порога простыми значениями
+    
+    Результат общий для всех запросов, поэтому в нем нет объектов ORM -
+    студенты загружаются в сессию каждого запроса отдельно.
+    
+    Returns:
+        list: [{'student_id', 'rating', 'attendance'}], худшие первыми
+    """
+    ratings = get_student_ratings()
+    low_ids = sorted(student_id for student_id, rating in ratings.items() if rating['total'] < threshold)
+    attendance = calculate_attendance_percentages(student_ids=low_ids) if low_ids else {}
+    
+    report = [
+        {'student_id': student_id, 'rating': ratings[student_id], 'attendance': attendance[student_id]}
+        for student_id in low_ids
+    ]
+    report.sort(key=lambda x: x['rating']['total'])
+    return report
+
+
 # ===================== ПАНЕЛЬ ЗАВЕДУЮЩЕГО КАФЕДРОЙ =====================
 
 @bp.route('/')
@@ -30,35 +126,16 @@ def department_head_required(f):
 def dashboard():
     """Главная панель заведующего кафедрой"""
     
-    # Общая статистика
-    total_students = Student.query.count()
-    total_groups = Group.query.count()
+    # Общая статистика (кэшируется до изменения данных)
+    department = _get_department_stats()
+    summary = department['summary']
     total_teachers = User.query.filter_by(role='teacher', is_active=True).count()
     
     # Средняя посещаемость
-    total_attendance = db.session.query(func.count(Attendance.id)).scalar() or 0
-    present_attendance = db.session.query(func.count(Attendance.id)).filter(
-        Attendance.status == 'присутствовал'
-    ).scalar() or 0
-    
-    avg_attendance = round((present_attendance / total_attendance * 100) if total_attendance > 0 else 0, 2)
-    
-    # Средний рейтинг и процент сдачи
-    students = Student.query.all()
-    total_rating = 0
-    passed_count = 0
-    failed_count = 0
-    
-    for student in students:
-        rating = calculate_student_rating(student.id)
-        total_rating += rating['total']
-        if rating['passed']:
-            passed_count += 1
-        else:
-            failed_count += 1
-    
-    avg_rating = round(total_rating / total_students if total_students > 0 else 0, 2)
-    pass_rate = round((passed_count / total_students * 100) if total_students > 0 else 0, 2)
+    total_attendance = summary['attendance_total']
+    avg_attendance = round(
+        (summary['attendance_present'] / total_attendance * 100) if total_attendance > 0 else 0, 2
+    )
     
     # Последние ведомости
     recent_statements = Statement.query.order_by(Statement.date.desc()).limit(5).all()
@@ -68,43 +145,30 @@ def dashboard():
     teachers_performance = []
     
     for teacher in teachers:
-        groups = Group.query.filter_by(teacher_id=teacher.id).all()
-        if not groups:
+        teacher_stats = department['by_teacher'].get(teacher.id)
+        if not teacher_stats or teacher_stats['students_count'] == 0:
             continue
         
-        teacher_passed = 0
-        teacher_total = 0
-        
-        for group in groups:
-            students = Student.query.filter_by(group_id=group.id).all()
-            for student in students:
-                rating = calculate_student_rating(student.id)
-                teacher_total += 1
-                if rating['passed']:
-                    teacher_passed += 1
-        
-        if teacher_total > 0:
-            pass_rate = round((teacher_passed / teacher_total * 100), 2)
-            teachers_performance.append({
-                'teacher': teacher,
-                'groups_count': len(groups),
-                'students_count': teacher_total,
-                'pass_rate': pass_rate
-            })
+        teachers_performance.append({
+            'teacher': teacher,
+            'groups_count': teacher_stats['groups_count'],
+            'students_count': teacher_stats['students_count'],
+            'pass_rate': teacher_stats['pass_rate']
+        })
     
     # Сортировка по проценту сдачи (худшие первыми)
     teachers_performance.sort(key=lambda x: x['pass_rate'])
     low_performance_teachers = teachers_performance[:5]
     
     stats = {
-        'total_students': total_students,
-        'total_groups': total_groups,
+        'total_students': summary['students_count'],
+        'total_groups': department['total_groups'],
         'total_teachers': total_teachers,
         'avg_attendance': avg_attendance,
-        'avg_rating': avg_rating,
-        'passed_count': passed_count,
-        'failed_count': failed_count,
-        'pass_rate': pass_rate
+        'avg_rating': summary['avg_rating'],
+        'passed_count': summary['passed'],
+        'failed_count': summary['failed'],
+        'pass_rate': summary['pass_rate']
     }
     
     return render_template('department/dashboard.html',
@@ -122,46 +186,22 @@ def teachers():
     """Статистика по преподавателям"""
     
     teachers = User.query.filter_by(role='teacher', is_active=True).all()
+    by_teacher = _get_department_stats()['by_teacher']
+    empty = summarize_group_stats([])
     
     teachers_data = []
     for teacher in teachers:
-        groups = Group.query.filter_by(teacher_id=teacher.id).all()
-        
-        total_students = 0
-        total_rating = 0
-        total_attendance = 0
-        passed = 0
-        failed = 0
-        
-        for group in groups:
-            students = Student.query.filter_by(group_id=group.id).all()
-            total_students += len(students)
-            
-            for student in students:
-                rating = calculate_student_rating(student.id)
-                attendance_pct = student.get_attendance_percentage()
-                
-                total_rating += rating['total']
-                total_attendance += attendance_pct
-                
-                if rating['passed']:
-                    passed += 1
-                else:
-                    failed += 1
-        
-        avg_rating = round(total_rating / total_students, 2) if total_students > 0 else 0
-        avg_attendance = round(total_attendance / total_students, 2) if total_students > 0 else 0
-        pass_rate = round((passed / total_students * 100), 2) if total_students > 0 else 0
+        summary = by_teacher.get(teacher.id, empty)
         
         teachers_data.append({
             'teacher': teacher,
-            'groups_count': len(groups),
-            'students_count': total_students,
-            'avg_rating': avg_rating,
-            'avg_attendance': avg_attendance,
-            'passed': passed,
-            'failed': failed,
-            'pass_rate': pass_rate
+            'groups_count': summary.get('groups_count', 0),
+            'students_count': summary['students_count'],
+            'avg_rating': summary['avg_rating'],
+            'avg_attendance': summary['avg_attendance'],
+            'passed': summary['passed'],
+            'failed': summary['failed'],
+            'pass_rate': summary['pass_rate']
         })
     
     # Сортировка по рейтингу
@@ -194,41 +234,16 @@ def teacher_details(teacher_id):
     
     groups = Group.query.filter_by(teacher_id=teacher_id).all()
     
+    group_ids = [group.id for group in groups]
+    ratings = get_student_ratings(group_ids=group_ids)
+    attendance = calculate_attendance_percentages(group_ids=group_ids)
+    students_by_group = _get_students_by_group(group_ids)
+    
     groups_data = []
     for group in groups:
-        students = Student.query.filter_by(group_id=group.id).all()
-        
-        group_total_rating = 0
-        group_total_attendance = 0
-        group_passed = 0
-        group_failed = 0
-        
-        for student in students:
-            rating = calculate_student_rating(student.id)
-            attendance_pct = student.get_attendance_percentage()
-            
-            group_total_rating += rating['total']
-            group_total_attendance += attendance_pct
-            
-            if rating['passed']:
-                group_passed += 1
-            else:
-                group_failed += 1
-        
-        students_count = len(students)
-        group_avg_rating = round(group_total_rating / students_count, 2) if students_count > 0 else 0
-        group_avg_attendance = round(group_total_attendance / students_count, 2) if students_count > 0 else 0
-        group_pass_rate = round((group_passed / students_count * 100), 2) if students_count > 0 else 0
-        
-        groups_data.append({
-            'group': group,
-            'students_count': students_count,
-            'avg_rating': group_avg_rating,
-            'avg_attendance': group_avg_attendance,
-            'passed': group_passed,
-            'failed': group_failed,
-            'pass_rate': group_pass_rate
-        })
+        summary = _summarize_students(students_by_group.get(group.id, []), ratings, attendance)
+        summary['group'] = group
+        groups_data.append(summary)
     
     return render_template('department/teacher_details.html',
                          teacher=teacher,
@@ -254,41 +269,15 @@ def compare_groups():
     
     groups = query.order_by(Group.name).all()
     
+    # Блоки групп из кэша статистики: одновременные одинаковые запросы
+    # вычисляют недостающие группы один раз
+    blocks = get_group_stats([group.id for group in groups])
+    
     comparison = []
     for group in groups:
-        students = Student.query.filter_by(group_id=group.id).all()
-        
-        total_rating = 0
-        total_attendance = 0
-        passed = 0
-        failed = 0
-        
-        for student in students:
-            rating = calculate_student_rating(student.id)
-            attendance_pct = student.get_attendance_percentage()
-            
-            total_rating += rating['total']
-            total_attendance += attendance_pct
-            
-            if rating['passed']:
-                passed += 1
-            else:
-                failed += 1
-        
-        students_count = len(students)
-        avg_rating = round(total_rating / students_count, 2) if students_count > 0 else 0
-        avg_attendance = round(total_attendance / students_count, 2) if students_count > 0 else 0
-        pass_rate = round((passed / students_count * 100), 2) if students_count > 0 else 0
-        
-        comparison.append({
-            'group': group,
-            'students_count': students_count,
-            'avg_rating': avg_rating,
-            'avg_attendance': avg_attendance,
-            'passed': passed,
-            'failed': failed,
-            'pass_rate': pass_rate
-        })
+        summary = summarize_group_stats([blocks[group.id]])
+        summary['group'] = group
+        comparison.append(summary)
     
     # Сортировка по среднему рейтингу
     sort_by = request.args.get('sort', 'rating')
@@ -356,10 +345,11 @@ def statement_details(statement_id):
     
     # Получить студентов с рейтингами
     students = Student.query.filter_by(group_id=statement.group_id).order_by(Student.full_name).all()
+    ratings = get_student_ratings(group_ids=[statement.group_id])
     
     students_data = []
     for student in students:
-        rating = calculate_student_rating(student.id)
+        rating = ratings[student.id]
         students_data.append({
             'student': student,
             'rating': rating,
@@ -396,40 +386,46 @@ def attendance_dynamics():
     if not date_to:
         date_to = datetime.now().strftime('%Y-%m-%d')
     
-    query = db.session.query(
-        func.date(Attendance.date).label('date'),
-        func.count(Attendance.id).label('total'),
-        func.sum(db.case((Attendance.status == 'присутствовал', 1), else_=0)).label('present')
-    )
-    
+    from_date = to_date = None
     try:
         from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-        query = query.filter(Attendance.date >= from_date)
     except ValueError:
         pass
     
     try:
         to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-        query = query.filter(Attendance.date <= to_date)
     except ValueError:
         pass
     
-    results = query.group_by(func.date(Attendance.date)).order_by(
-        func.date(Attendance.date)
-    ).all()
-    
-    dynamics = []
-    for result in results:
-        percentage = round((result.present / result.total * 100) if result.total > 0 else 0, 2)
-        dynamics.append({
-            'date': result.date,
-            'total': result.total,
-            'present': result.present,
-            'percentage': percentage
-        })
+    faculty_id = request.args.get('faculty_id', type=int)
+    group_id = request.args.get('group_id', type=int)
+    
+    # Отчет строится по дневной сводке attendance_daily_rollup
+    dynamics = get_attendance_dynamics(
+        date_from=from_date,
+        date_to=to_date,
+        group_ids=[group_id] if group_id else None,
+        faculty_id=faculty_id
+    )
+    
+    # Разбивка по группам за тот же период
+    by_group = get_attendance_by_group(date_from=from_date, date_to=to_date, faculty_id=faculty_id)
+    group_names = dict(db.session.query(Group.id, Group.name).filter(
+        Group.id.in_(list(by_group))
+    ).all()) if by_group else {}
+    groups_stats = sorted(
+        [dict(stats, id=gid, name=group_names.get(gid, '')) for gid, stats in by_group.items()],
+        key=lambda item: item['name']
+    )
+    
+    faculties = Faculty.query.order_by(Faculty.name).all()
     
     return render_template('department/attendance_dynamics.html',
                          dynamics=dynamics,
+                         groups_stats=groups_stats,
+                         faculties=faculties,
+                         faculty_id=faculty_id,
+                         group_id=group_id,
                          date_from=date_from,
                          date_to=date_to)
 
@@ -440,30 +436,31 @@ def attendance_dynamics():
 def standards_completion():
     """Отчет по выполнению нормативов"""
     
-    standards = Standard.query.filter_by(is_active=True).all()
-    total_students = Student.query.count()
+    faculty_id = request.args.get('faculty_id', type=int)
+    course = request.args.get('course', type=int)
+    semester = request.args.get('semester', type=int)
+    
+    # Сводка считается одним запросом и кэшируется по фильтрам
+    summary = get_standards_completion(faculty_id=faculty_id, course=course, semester=semester)
+    total_students = summary['total_students']
+    curriculum = get_curriculum()
     
     completion = []
-    for standard in standards:
-        # Количество студентов, выполнивших норматив
-        completed = db.session.query(func.count(func.distinct(StandardResult.student_id))).filter(
-            StandardResult.standard_id == standard.id
-        ).scalar() or 0
-        
-        completion_rate = round((completed / total_students * 100), 2) if total_students > 0 else 0
+    for standard in curriculum.standards.values():
+        if not standard.is_active:
+            continue
         
-        # Средний балл
-        avg_points = db.session.query(func.avg(StandardResult.points)).filter(
-            StandardResult.standard_id == standard.id
-        ).scalar()
-        avg_points = round(float(avg_points), 2) if avg_points else 0
+        stats = summary['standards'].get(standard.id, {})
+        completed = stats.get('completed_by', 0)
         
         completion.append({
             'standard': standard,
+            'theme': curriculum.themes.get(standard.theme_id),
             'completed_by': completed,
+            'attempts': stats.get('attempts', 0),
             'total_students': total_students,
-            'completion_rate': completion_rate,
-            'avg_points': avg_points
+            'completion_rate': round((completed / total_students * 100), 2) if total_students > 0 else 0,
+            'avg_points': stats.get('avg_points', 0)
         })
     
     # Сортировка по проценту выполнения
@@ -475,8 +472,14 @@ def standards_completion():
     elif sort_by == 'name':
         completion.sort(key=lambda x: x['standard'].name)
     
+    faculties = Faculty.query.order_by(Faculty.name).all()
+    
     return render_template('department/standards_completion.html',
                          completion=completion,
+                         faculties=faculties,
+                         faculty_id=faculty_id,
+                         course=course,
+                         semester=semester,
                          sort_by=sort_by)
 
 
@@ -518,24 +521,29 @@ def low_performance():
     
     threshold = request.args.get('threshold', type=int, default=60)
     
-    students = Student.query.all()
+    # Отчет по всем студентам кэшируется и вычисляется один раз на
+    # одновременные запросы с одним порогом
+    report = cached_stats(('low_performance', threshold), lambda: _compute_low_performance(threshold))
     
     low_performers = []
-    for student in students:
-        rating = calculate_student_rating(student.id)
-        attendance_pct = student.get_attendance_percentage()
+    if report:
+        students = Student.query.options(db.joinedload(Student.group)).filter(
+            Student.id.in_([item['student_id'] for item in report])
+        ).all()
+        students_by_id = {student.id: student for student in students}
         
-        if rating['total'] < threshold:
+        for item in report:
+            student = students_by_id.get(item['student_id'])
+            if student is None:
+                continue
+            
             low_performers.append({
                 'student': student,
-                'rating': rating,
-                'attendance': attendance_pct,
+                'rating': item['rating'],
+                'attendance': item['attendance'],
                 'group': student.group
             })
     
-    # Сортировка по рейтингу (худшие первыми)
-    low_performers.sort(key=lambda x: x['rating']['total'])
-    
     return render_template('department/low_performance.html',
                          low_performers=low_performers,
                          threshold=threshold)
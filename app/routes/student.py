@@ -1,7 +1,10 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash
 from app import db
 from app.models import Student, Attendance, StandardResult, Assignment
-from app.utils import calculate_student_rating
+from app.utils import get_student_ratings
+from app.curriculum import get_curriculum
+from app.results import get_best_results
+from app.attendance import get_attendance_streaks, get_month_heatmap
 from datetime import datetime
 
 bp = Blueprint('student', __name__, url_prefix='/student')
@@ -54,7 +57,7 @@ def profile(student_id):
     student = Student.query.get_or_404(student_id)
     
     # Рейтинг студента
-    rating = calculate_student_rating(student_id)
+    rating = get_student_ratings(student_ids=[student_id])[student_id]
     attendance_pct = student.get_attendance_percentage()
     
     # Последние 10 записей посещаемости
@@ -145,10 +148,22 @@ def attendance(student_id):
         'percentage': student.get_attendance_percentage()
     }
     
+    # Серии и календарь месяца по битовым маскам
+    streaks = get_attendance_streaks(student_id)
+    
+    try:
+        month_date = datetime.strptime(request.args.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month_date = datetime.now().date().replace(day=1)
+    heatmap = get_month_heatmap(student_id, month_date.year, month_date.month)
+    
     return render_template('student/attendance.html',
                          student=student,
                          records=records,
                          stats=stats,
+                         streaks=streaks,
+                         heatmap=heatmap,
+                         month_date=month_date,
                          date_from=date_from,
                          date_to=date_to)
 
@@ -238,30 +253,25 @@ def rating_details(student_id):
     """Детальный расчет рейтинга студента (без авторизации)"""
     student = Student.query.get_or_404(student_id)
     
-    rating = calculate_student_rating(student_id)
+    rating = get_student_ratings(student_ids=[student_id])[student_id]
     
     # Получить детализацию по модулям
-    from app.models import Module, Theme, Standard
-    
     modules_data = []
+    best_results = get_best_results(student_ids=[student_id])
     
-    modules = Module.query.order_by(Module.number).all()
-    for module in modules:
+    for module in get_curriculum().modules:
         themes_data = []
         
         for theme in module.themes:
             # Результаты по теме
-            standards = theme.standards.filter_by(is_active=True).all()
+            standards = theme.active_standards
             
             theme_results = []
             theme_total_points = 0
             
             for standard in standards:
                 # Лучший результат студента по этому нормативу
-                best_result = StandardResult.query.filter_by(
-                    student_id=student_id,
-                    standard_id=standard.id
-                ).order_by(StandardResult.points.desc()).first()
+                best_result = best_results.get((student_id, standard.id))
                 
                 if best_result:
                     theme_results.append({
@@ -292,7 +302,7 @@ def print_profile(student_id):
     """Версия профиля для печати (без авторизации)"""
     student = Student.query.get_or_404(student_id)
     
-    rating = calculate_student_rating(student_id)
+    rating = get_student_ratings(student_ids=[student_id])[student_id]
     attendance_pct = student.get_attendance_percentage()
     
     # Все результаты
@@ -1,12 +1,20 @@
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash
+from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, send_file
 from flask_login import login_required, current_user
 from functools import wraps
 from datetime import datetime, date, timedelta
 from app import db
 from app.models import (Group, Student, Attendance, StandardResult, Assignment, 
                         Standard, Module, Theme, Statement)
-from app.utils import calculate_student_rating, calculate_points_from_result
+from app.utils import (calculate_points_from_result, get_student_ratings,
+                       calculate_attendance_percentages, refresh_student_ratings)
+from app.curriculum import get_curriculum
+from app.dashboard_stats import cached_stats, get_group_stats, summarize_group_stats
+from app.statements import XLSX_MIMETYPE, allocate_statement_numbers, build_statement_file
+from app.results import get_result_matrix, insert_results
+from app.attendance import (ATTENDANCE_STATUSES, upsert_attendance, get_attendance_counts,
+                            get_group_attendance_for_date, write_attendance_journal)
 from sqlalchemy import func, and_
+import tempfile
 
 from app.forms import StatementForm  
 from werkzeug.utils import secure_filename  
@@ -40,27 +48,14 @@ def dashboard():
     else:
         groups = Group.query.filter_by(teacher_id=current_user.id).all()
     
-    # Статистика
-    total_students = 0
-    total_groups = len(groups)
-    avg_attendance = 0
-    passed_count = 0
-    
-    for group in groups:
-        students = Student.query.filter_by(group_id=group.id).all()
-        total_students += len(students)
-        
-        for student in students:
-            avg_attendance += student.get_attendance_percentage()
-            rating = calculate_student_rating(student.id)
-            if rating['passed']:
-                passed_count += 1
-    
-    if total_students > 0:
-        avg_attendance = round(avg_attendance / total_students, 1)
-        pass_rate = round((passed_count / total_students * 100), 1)
-    else:
-        pass_rate = 0
+    # Статистика (блоки групп и сводка преподавателя кэшируются до изменения данных)
+    group_ids = [group.id for group in groups]
+    is_admin = current_user.role == 'admin'
+    summary = cached_stats(
+        ('teacher', None if is_admin else current_user.id),
+        lambda: summarize_group_stats(get_group_stats(group_ids).values(), ndigits=1),
+        group_ids=None if is_admin else group_ids
+    )
     
     # Последние задания
     recent_assignments = Assignment.query.filter_by(
@@ -69,12 +64,12 @@ def dashboard():
     ).order_by(Assignment.deadline.asc()).limit(5).all()
     
     stats = {
-        'total_students': total_students,
-        'total_groups': total_groups,
-        'avg_attendance': avg_attendance,
-        'pass_rate': pass_rate,
-        'passed_count': passed_count,
-        'failed_count': total_students - passed_count
+        'total_students': summary['students_count'],
+        'total_groups': len(groups),
+        'avg_attendance': summary['avg_attendance'],
+        'pass_rate': summary['pass_rate'],
+        'passed_count': summary['passed'],
+        'failed_count': summary['failed']
     }
     
     return render_template('teacher/dashboard.html',
@@ -95,33 +90,19 @@ def groups():
     else:
         groups = Group.query.filter_by(teacher_id=current_user.id).order_by(Group.name).all()
     
-    # Добавить статистику для каждой группы
+    # Добавить статистику для каждой группы (блоки групп из кэша)
+    blocks = get_group_stats([group.id for group in groups])
+    
     groups_data = []
     for group in groups:
-        students = Student.query.filter_by(group_id=group.id).all()
-        
-        total_attendance = 0
-        total_rating = 0
-        passed = 0
-        
-        for student in students:
-            total_attendance += student.get_attendance_percentage()
-            rating = calculate_student_rating(student.id)
-            total_rating += rating['total']
-            if rating['passed']:
-                passed += 1
-        
-        students_count = len(students)
-        avg_attendance = round(total_attendance / students_count, 1) if students_count > 0 else 0
-        avg_rating = round(total_rating / students_count, 1) if students_count > 0 else 0
-        pass_rate = round((passed / students_count * 100), 1) if students_count > 0 else 0
+        summary = summarize_group_stats([blocks[group.id]], ndigits=1)
         
         groups_data.append({
             'group': group,
-            'students_count': students_count,
-            'avg_attendance': avg_attendance,
-            'avg_rating': avg_rating,
-            'pass_rate': pass_rate
+            'students_count': summary['students_count'],
+            'avg_attendance': summary['avg_attendance'],
+            'avg_rating': summary['avg_rating'],
+            'pass_rate': summary['pass_rate']
         })
     
     return render_template('teacher/groups.html', groups_data=groups_data)
@@ -140,16 +121,15 @@ def group_details(group_id):
         return redirect(url_for('teacher.groups'))
     
     students = Student.query.filter_by(group_id=group_id).order_by(Student.full_name).all()
+    ratings = get_student_ratings(group_ids=[group_id])
+    attendance = calculate_attendance_percentages(group_ids=[group_id])
     
     students_data = []
     for student in students:
-        rating = calculate_student_rating(student.id)
-        attendance_pct = student.get_attendance_percentage()
-        
         students_data.append({
             'student': student,
-            'rating': rating,
-            'attendance_percentage': attendance_pct
+            'rating': ratings[student.id],
+            'attendance_percentage': attendance[student.id]
         })
     
     # Сортировка
@@ -200,16 +180,13 @@ def attendance():
             
             students = Student.query.filter_by(group_id=selected_group_id).order_by(Student.full_name).all()
             
+            # Отметки всей группы за дату одним запросом
+            records = get_group_attendance_for_date(selected_group_id, attendance_date)
+            
             for student in students:
-                # Найти существующую запись посещаемости
-                attendance_record = Attendance.query.filter_by(
-                    student_id=student.id,
-                    date=attendance_date
-                ).first()
-                
                 students_data.append({
                     'student': student,
-                    'attendance': attendance_record
+                    'attendance': records.get(student.id)
                 })
     
     return render_template('teacher/attendance.html',
@@ -265,11 +242,56 @@ def mark_attendance():
         db.session.add(attendance)
         message = 'Отмечено'
     
+    refresh_student_ratings(student_ids=[student.id])
     db.session.commit()
     
     return jsonify({'message': message}), 200
 
 
+@bp.route('/attendance/bulk', methods=['POST'])
+@login_required
+@teacher_required
+def bulk_mark_attendance():
+    """Отметить посещаемость группы одним запросом (AJAX)"""
+    data = request.get_json(silent=True) or {}
+    records = data.get('records')
+    
+    if not data.get('date') or not isinstance(records, list) or not records:
+        return jsonify({'error': 'Отсутствуют обязательные поля'}), 400
+    
+    try:
+        attendance_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Неверный формат даты'}), 400
+    
+    for record in records:
+        if not isinstance(record, dict) or not isinstance(record.get('student_id'), int):
+            return jsonify({'error': 'Неверный ID студента'}), 400
+        if record.get('status') not in ATTENDANCE_STATUSES:
+            return jsonify({'error': 'Неверный статус'}), 400
+    
+    student_ids = {record['student_id'] for record in records}
+    
+    # Проверка доступа: один запрос на все группы студентов
+    group_teachers = dict(db.session.query(Student.id, Group.teacher_id).join(
+        Group, Group.id == Student.group_id
+    ).filter(Student.id.in_(student_ids)).all())
+    
+    if len(group_teachers) != len(student_ids):
+        return jsonify({'error': 'Студент не найден'}), 404
+    
+    if current_user.role == 'teacher' and any(
+        teacher_id != current_user.id for teacher_id in group_teachers.values()
+    ):
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    
+    saved = upsert_attendance(attendance_date, records, current_user.id)
+    refresh_student_ratings(student_ids=list(student_ids))
+    db.session.commit()
+    
+    return jsonify({'message': f'Сохранено записей: {saved}', 'saved': saved}), 200
+
+
 @bp.route('/attendance/history/<int:group_id>')
 @login_required
 @teacher_required
@@ -292,30 +314,29 @@ def attendance_history(group_id):
     if not date_to:
         date_to = date.today().isoformat()
     
+    try:
+        from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+    except ValueError:
+        from_date = None
+    
+    try:
+        to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
+    except ValueError:
+        to_date = None
+    
     students = Student.query.filter_by(group_id=group_id).order_by(Student.full_name).all()
     
+    # Счетчики статусов по всем студентам одним запросом
+    counts = get_attendance_counts(group_ids=[group_id], date_from=from_date, date_to=to_date)
+    
     students_stats = []
     for student in students:
-        query = student.attendances
+        student_counts = counts.get(student.id, {})
         
-        try:
-            from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-            query = query.filter(Attendance.date >= from_date)
-        except ValueError:
-            pass
-        
-        try:
-            to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-            query = query.filter(Attendance.date <= to_date)
-        except ValueError:
-            pass
-        
-        records = query.order_by(Attendance.date.desc()).all()
-        
-        total = len(records)
-        present = sum(1 for r in records if r.status == 'присутствовал')
-        absent = sum(1 for r in records if r.status == 'отсутствовал')
-        excused = sum(1 for r in records if r.status == 'уважительная')
+        total = student_counts.get('total', 0)
+        present = student_counts.get('present', 0)
+        absent = student_counts.get('absent', 0)
+        excused = student_counts.get('excused', 0)
         
         percentage = round((present / total * 100), 1) if total > 0 else 0
         
@@ -335,6 +356,41 @@ def attendance_history(group_id):
                          date_to=date_to)
 
 
+@bp.route('/attendance/history/<int:group_id>/export')
+@login_required
+@teacher_required
+def export_attendance_journal(group_id):
+    """Скачать журнал посещаемости группы (студенты x даты) в Excel"""
+    group = Group.query.get_or_404(group_id)
+    
+    # Проверка доступа
+    if current_user.role == 'teacher' and group.teacher_id != current_user.id:
+        flash('Доступ запрещен.', 'danger')
+        return redirect(url_for('teacher.groups'))
+    
+    try:
+        from_date = datetime.strptime(request.args.get('date_from', ''), '%Y-%m-%d').date()
+    except ValueError:
+        from_date = date.today() - timedelta(days=30)
+    
+    try:
+        to_date = datetime.strptime(request.args.get('date_to', ''), '%Y-%m-%d').date()
+    except ValueError:
+        to_date = date.today()
+    
+    # Книга пишется во временный файл, который удаляется после отправки
+    journal_file = tempfile.TemporaryFile()
+    write_attendance_journal(journal_file, group, from_date, to_date)
+    journal_file.seek(0)
+    
+    return send_file(
+        journal_file,
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=f'Журнал_{group.name}_{from_date.isoformat()}_{to_date.isoformat()}.xlsx'
+    )
+
+
 # ===================== НОРМАТИВЫ =====================
 
 @bp.route('/standards')
@@ -349,7 +405,8 @@ def standards():
         groups = Group.query.filter_by(teacher_id=current_user.id).order_by(Group.name).all()
     
     # Модули и темы
-    modules = Module.query.order_by(Module.number).all()
+    curriculum = get_curriculum()
+    modules = curriculum.modules
     
     # Выбранная группа и тема
     selected_group_id = request.args.get('group_id', type=int)
@@ -362,7 +419,7 @@ def standards():
     
     if selected_group_id and selected_theme_id:
         selected_group = Group.query.get(selected_group_id)
-        selected_theme = Theme.query.get(selected_theme_id)
+        selected_theme = curriculum.themes.get(selected_theme_id)
         
         if selected_group and selected_theme:
             # Проверка доступа
@@ -370,29 +427,13 @@ def standards():
                 flash('Доступ запрещен.', 'danger')
                 return redirect(url_for('teacher.standards'))
             
-            standards = Standard.query.filter_by(
-                theme_id=selected_theme_id,
-                is_active=True
-            ).all()
-            
-            students = Student.query.filter_by(group_id=selected_group_id).order_by(Student.full_name).all()
+            standards = selected_theme.active_standards
             
-            for student in students:
-                student_results = {}
-                
-                for standard in standards:
-                    # Лучший результат
-                    best_result = StandardResult.query.filter_by(
-                        student_id=student.id,
-                        standard_id=standard.id
-                    ).order_by(StandardResult.points.desc()).first()
-                    
-                    student_results[standard.id] = best_result
-                
-                students_data.append({
-                    'student': student,
-                    'results': student_results
-                })
+            # Студенты и их лучшие результаты одним запросом
+            students_data = get_result_matrix(
+                selected_group_id,
+                [standard.id for standard in standards]
+            )
     
     return render_template('teacher/standards.html',
                          groups=groups,
@@ -427,38 +468,80 @@ def add_result():
     except ValueError:
         return jsonify({'error': 'Неверный формат даты'}), 400
     
-    # Автоматический расчет баллов
-    points = calculate_points_from_result(
-        data['standard_id'],
-        student.gender,
-        data['result_value']
-    )
+    # Баллы и номер попытки рассчитываются при вставке
+    saved = insert_results([{
+        'student_id': student.id,
+        'standard_id': standard.id,
+        'result_value': data['result_value'],
+        'gender': student.gender
+    }], result_date, current_user.id)[0]
+    refresh_student_ratings(student_ids=[student.id])
+    db.session.commit()
     
-    # Номер попытки
-    attempt_number = StandardResult.query.filter_by(
-        student_id=data['student_id'],
-        standard_id=data['standard_id']
-    ).count() + 1
+    return jsonify({
+        'message': 'Результат добавлен',
+        'points': saved['points'],
+        'attempt': saved['attempt']
+    }), 201
+
+@bp.route('/standards/bulk-results', methods=['POST'])
+@login_required
+@teacher_required
+def bulk_add_results():
+    """Сохранить результаты зачетного занятия одним запросом (AJAX)"""
+    data = request.get_json(silent=True) or {}
+    cells = data.get('results')
     
-    result = StandardResult(
-        student_id=data['student_id'],
-        standard_id=data['standard_id'],
-        result_value=data['result_value'],
-        points=points,
-        date=result_date,
-        attempt_number=attempt_number,
-        created_by=current_user.id
-    )
+    if not data.get('date') or not isinstance(cells, list) or not cells:
+        return jsonify({'error': 'Отсутствуют обязательные поля'}), 400
+    
+    try:
+        result_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Неверный формат даты'}), 400
+    
+    curriculum = get_curriculum()
+    for cell in cells:
+        if not isinstance(cell, dict) or not isinstance(cell.get('student_id'), int):
+            return jsonify({'error': 'Неверный ID студента'}), 400
+        if cell.get('standard_id') not in curriculum.standards:
+            return jsonify({'error': 'Норматив не найден'}), 404
+        if isinstance(cell.get('result_value'), bool) or not isinstance(cell.get('result_value'), (int, float)):
+            return jsonify({'error': 'Неверное значение результата'}), 400
+    
+    student_ids = {cell['student_id'] for cell in cells}
+    
+    # Проверка доступа и пол студентов одним запросом
+    students = {
+        student_id: (teacher_id, gender)
+        for student_id, teacher_id, gender in db.session.query(
+            Student.id, Group.teacher_id, Student.gender
+        ).join(Group, Group.id == Student.group_id).filter(Student.id.in_(student_ids)).all()
+    }
+    
+    if len(students) != len(student_ids):
+        return jsonify({'error': 'Студент не найден'}), 404
+    
+    if current_user.role == 'teacher' and any(
+        teacher_id != current_user.id for teacher_id, _ in students.values()
+    ):
+        return jsonify({'error': 'Доступ запрещен'}), 403
     
-    db.session.add(result)
+    saved = insert_results(
+        [dict(cell, gender=students[cell['student_id']][1]) for cell in cells],
+        result_date,
+        current_user.id
+    )
+    refresh_student_ratings(student_ids=list(student_ids))
     db.session.commit()
     
     return jsonify({
-        'message': 'Результат добавлен',
-        'points': points,
-        'attempt': attempt_number
+        'message': f'Сохранено результатов: {len(saved)}',
+        'saved': len(saved),
+        'results': saved
     }), 201
 
+
 @bp.route('/standards/edit-result/<int:result_id>', methods=['POST'])
 @login_required
 @teacher_required
@@ -493,6 +576,7 @@ def edit_result(result_id):
     
     result.updated_at = datetime.utcnow()
     
+    refresh_student_ratings(student_ids=[result.student_id])
     db.session.commit()
     
     return jsonify({
@@ -512,7 +596,9 @@ def delete_result(result_id):
     if current_user.role == 'teacher' and result.student.group.teacher_id != current_user.id:
         return jsonify({'error': 'Доступ запрещен'}), 403
     
+    student_id = result.student_id
     db.session.delete(result)
+    refresh_student_ratings(student_ids=[student_id])
     db.session.commit()
     
     return jsonify({'message': 'Результат удален'}), 200
@@ -571,13 +657,13 @@ def rating(group_id):
         return redirect(url_for('teacher.groups'))
     
     students = Student.query.filter_by(group_id=group_id).all()
+    group_ratings = get_student_ratings(group_ids=[group_id])
     
     ratings = []
     for student in students:
-        rating = calculate_student_rating(student.id)
         ratings.append({
             'student': student,
-            'rating': rating
+            'rating': group_ratings[student.id]
         })
     
     # Сортировка
@@ -705,6 +791,7 @@ def create_assignment():
     )
     
     db.session.add(assignment)
+    refresh_student_ratings(student_ids=[student_id])
     db.session.commit()
     
     flash(f'Задание "{title}" успешно создано для студента {student.full_name}.', 'success')
@@ -755,6 +842,7 @@ def edit_assignment(assignment_id):
     if bonus_points is not None:
         assignment.bonus_points = bonus_points
     
+    refresh_student_ratings(student_ids=[assignment.student_id])
     db.session.commit()
     
     flash('Задание успешно обновлено.', 'success')
@@ -774,7 +862,9 @@ def delete_assignment(assignment_id):
         return redirect(url_for('teacher.assignments'))
     
     title = assignment.title
+    student_id = assignment.student_id
     db.session.delete(assignment)
+    refresh_student_ratings(student_ids=[student_id])
     db.session.commit()
     
     flash(f'Задание "{title}" успешно удалено.', 'success')
@@ -833,16 +923,7 @@ def create_statement():
                 file.save(file_path)
             
             # Генерировать номер ведомости
-            year = date.today().year
-            last_statement = Statement.query.filter(
-                Statement.number.like(f'ФК-{year}-%')
-            ).order_by(Statement.number.desc()).first()
-            
-            if last_statement:
-                last_num = int(last_statement.number.split('-')[-1])
-                statement_number = f'ФК-{year}-{last_num + 1:03d}'
-            else:
-                statement_number = f'ФК-{year}-001'
+            statement_number = allocate_statement_numbers(1)[0]
             
             # Создать ведомость
             statement = Statement(
@@ -885,10 +966,11 @@ def statement_details(statement_id):
     
     # Получить студентов с рейтингами
     students = Student.query.filter_by(group_id=statement.group_id).order_by(Student.full_name).all()
+    ratings = get_student_ratings(group_ids=[statement.group_id])
     
     students_data = []
     for student in students:
-        rating = calculate_student_rating(student.id)
+        rating = ratings[student.id]
         students_data.append({
             'student': student,
             'rating': rating,
@@ -900,6 +982,29 @@ def statement_details(statement_id):
                          students_data=students_data)
 
 
+@bp.route('/statements/<int:statement_id>/download')
+@login_required
+@teacher_required
+def download_statement(statement_id):
+    """Скачать ведомость в формате Excel"""
+    statement = Statement.query.get_or_404(statement_id)
+    
+    # Проверка доступа
+    if current_user.role == 'teacher' and statement.teacher_id != current_user.id:
+        flash('Доступ запрещен.', 'danger')
+        return redirect(url_for('teacher.statements'))
+    
+    # Файл берется из дискового кэша, если рейтинги группы не менялись
+    path = build_statement_file(statement)
+    
+    return send_file(
+        path,
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=f'Ведомость_{statement.number}.xlsx'
+    )
+
+
 # ===================== ОТЧЕТЫ =====================
 
 @bp.route('/reports')
@@ -937,10 +1042,12 @@ def summary_report(group_id):
     total_rating = 0
     
     students_data = []
+    ratings = get_student_ratings(group_ids=[group_id])
+    attendance = calculate_attendance_percentages(group_ids=[group_id])
     
     for student in students:
-        rating = calculate_student_rating(student.id)
-        attendance_pct = student.get_attendance_percentage()
+        rating = ratings[student.id]
+        attendance_pct = attendance[student.id]
         
         if rating['passed']:
             passed += 1
@@ -0,0 +1,295 @@
+from bisect import bisect_left
+from flask import current_app
+import numpy as np
+from app import db
+from app.models import Standard, StandardScale, StandardResult, Student
+from app.cache_bus import publish_invalidation
+
+
+# Размер пачки студентов при пересчете сохраненных рейтингов
+RESCORE_CHUNK_SIZE = 5000
+
+
+# ===================== СКОМПИЛИРОВАННЫЕ ШКАЛЫ =====================
+
+class CompiledScale:
+    """
+    Оценочная шкала норматива для одного пола, подготовленная к поиску bisect
+    
+    Границы всех интервалов шкалы сортируются в массив breakpoints. Числовая
+    ось делится на точки-границы и промежутки между ними; внутри каждого
+    участка результат оценки постоянен, поэтому баллы вычисляются заранее:
+    point_points[i] - для значения, равного breakpoints[i],
+    gap_points[i] - для значений между breakpoints[i - 1] и breakpoints[i]
+    (gap_points[0] и gap_points[-1] - открытые концы оси).
+    """
+    
+    def __init__(self, comparison_type, scales):
+        """
+        Args:
+            comparison_type: Тип сравнения норматива
+            scales: Список (points, min_value, max_value) в порядке убывания баллов
+        """
+        self.comparison_type = comparison_type
+        
+        bounds = set()
+        for points, min_value, max_value in scales:
+            if min_value is not None:
+                bounds.add(min_value)
+            if max_value is not None:
+                bounds.add(max_value)
+        self.breakpoints = sorted(bounds)
+        
+        probes = []
+        if self.breakpoints:
+            probes.append(self.breakpoints[0] - 1)
+            for left, right in zip(self.breakpoints, self.breakpoints[1:]):
+                probes.append((left + right) / 2)
+            probes.append(self.breakpoints[-1] + 1)
+        else:
+            probes.append(0)
+        
+        self.point_points = [_match_scale(scales, value) for value in self.breakpoints]
+        self.gap_points = [_match_scale(scales, value) for value in probes]
+    
+    def score(self, value):
+        """Баллы за результат (без обращения к БД)"""
+        index = bisect_left(self.breakpoints, value)
+        if index < len(self.breakpoints) and self.breakpoints[index] == value:
+            return self.point_points[index]
+        return self.gap_points[index]
+    
+    def score_array(self, values):
+        """
+        Баллы для массива результатов (numpy.searchsorted)
+        
+        Args:
+            values: Последовательность значений результатов
+        
+        Returns:
+            numpy.ndarray: Баллы в том же порядке
+        """
+        values = np.asarray(values, dtype=float)
+        gap_points = np.asarray(self.gap_points, dtype=np.int64)
+        
+        if not self.breakpoints:
+            return np.full(len(values), gap_points[0], dtype=np.int64)
+        
+        breakpoints = np.asarray(self.breakpoints, dtype=float)
+        point_points = np.asarray(self.point_points, dtype=np.int64)
+        
+        index = np.searchsorted(breakpoints, values, side='left')
+        exact_index = np.minimum(index, len(breakpoints) - 1)
+        exact = breakpoints[exact_index] == values
+        
+        return np.where(exact, point_points[exact_index], gap_points[index])
+
+
+def _match_scale(scales, value):
+    """Первый интервал шкалы, содержащий значение (эталонная линейная проверка)"""
+    for points, min_value, max_value in scales:
+        if min_value is not None and value < min_value:
+            continue
+        if max_value is not None and value > max_value:
+            continue
+        return points
+    return 1
+
+
+def compile_scales(standards, scales):
+    """
+    Собрать индекс шкал оценивания
+    
+    Args:
+        standards: Список (standard_id, comparison_type)
+        scales: Список (standard_id, gender, points, min_value, max_value)
+    
+    Returns:
+        dict: {'standards': {standard_id: comparison_type},
+               'scales': {(standard_id, gender): CompiledScale}}
+    """
+    comparison_types = dict(standards)
+    
+    grouped = {}
+    for standard_id, gender, points, min_value, max_value in scales:
+        grouped.setdefault((standard_id, gender), []).append((points, min_value, max_value))
+    
+    compiled = {}
+    for key, items in grouped.items():
+        # Порядок проверки как в исходном алгоритме: по убыванию баллов
+        items.sort(key=lambda item: -item[0])
+        compiled[key] = CompiledScale(comparison_types.get(key[0]), items)
+    
+    return {'standards': comparison_types, 'scales': compiled}
+
+
+def score_result(index, standard_id, gender, result_value):
+    """
+    Рассчитать баллы за результат по скомпилированному индексу
+    
+    Args:
+        index: Индекс из compile_scales / get_scale_index
+        standard_id: ID норматива
+        gender: Пол студента
+        result_value: Значение результата
+    
+    Returns:
+        int: Баллы (0 - норматив или шкала не найдены, 1 - вне всех интервалов)
+    """
+    if standard_id not in index['standards']:
+        return 0
+    
+    scale = index['scales'].get((standard_id, gender))
+    if scale is None:
+        return 0
+    
+    return scale.score(float(result_value))
+
+
+# ===================== КЭШ ИНДЕКСА =====================
+
+def build_scale_index():
+    """
+    Построить индекс шкал двумя запросами в текущей сессии (без кэширования)
+    
+    Видит и незафиксированные изменения сессии, поэтому подходит для
+    пересчета результатов в одной транзакции с изменением шкалы.
+    """
+    standards = db.session.query(Standard.id, Standard.comparison_type).all()
+    scales = db.session.query(
+        StandardScale.standard_id,
+        StandardScale.gender,
+        StandardScale.points,
+        StandardScale.min_value,
+        StandardScale.max_value
+    ).order_by(StandardScale.id).all()
+    
+    return compile_scales(standards, scales)
+
+
+def get_scale_index():
+    """
+    Индекс шкал оценивания текущего приложения
+    
+    Строится двумя запросами при первом обращении и хранится в
+    app.extensions вместе с номером версии до вызова invalidate_scale_index().
+    Версия читается до запросов: индекс, построенный по шкалам, прочитанным
+    до сброса, не сохраняется.
+    """
+    version = get_scale_index_version()
+    entry = current_app.extensions.get('scale_index')
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    
+    index = build_scale_index()
+    if get_scale_index_version() == version:
+        current_app.extensions['scale_index'] = (version, index)
+    
+    return index
+
+
+def get_scale_index_version():
+    """Номер версии шкал (меняется при каждом сбросе индекса)"""
+    return current_app.extensions.get('scale_index_version', 0)
+
+
+def invalidate_scale_index(broadcast=True):
+    """
+    Сбросить индекс шкал после изменения нормативов или шкал
+    
+    Args:
+        broadcast: Сообщить о сбросе остальным рабочим процессам
+    """
+    current_app.extensions['scale_index_version'] = get_scale_index_version() + 1
+    current_app.extensions.pop('scale_index', None)
+    
+    if broadcast:
+        publish_invalidation('scale_index')
+
+
+# ===================== ПЕРЕСЧЕТ РЕЗУЛЬТАТОВ =====================
+
+def rescore_results(standard_id, gender, index=None):
+    """
+    Пересчитать сохраненные баллы результатов норматива после изменения шкалы
+    
+    Результаты загружаются массивами и оцениваются через numpy.searchsorted;
+    в БД одним пакетным UPDATE записываются только изменившиеся строки,
+    после чего пересчитываются лучшие результаты и сохраненные рейтинги
+    затронутых студентов.
+    Коммит выполняет вызывающий код.
+    
+    Args:
+        standard_id: ID норматива
+        gender: Пол, для которого изменилась шкала
+        index: Индекс шкал или None (кэшированный - тогда он должен быть
+               уже сброшен); в одной транзакции с изменением шкалы -
+               построенный build_scale_index
+    
+    Returns:
+        dict: checked - проверено результатов, updated - изменено результатов,
+              students - затронуто студентов, ratings_changed - у скольких
+              студентов изменился рейтинг
+    """
+    from app.utils import get_student_ratings, refresh_student_ratings
+    from app.results import refresh_best_results
+    
+    rows = db.session.query(
+        StandardResult.id,
+        StandardResult.student_id,
+        StandardResult.result_value,
+        StandardResult.points
+    ).join(
+        Student, Student.id == StandardResult.student_id
+    ).filter(
+        StandardResult.standard_id == standard_id,
+        Student.gender == gender
+    ).all()
+    
+    summary = {'checked': len(rows), 'updated': 0, 'students': 0, 'ratings_changed': 0}
+    if not rows:
+        return summary
+    
+    result_ids, student_ids, values, points = (np.asarray(column) for column in zip(*rows))
+    
+    if index is None:
+        index = get_scale_index()
+    scale = index['scales'].get((standard_id, gender))
+    if standard_id not in index['standards'] or scale is None:
+        new_points = np.zeros(len(rows), dtype=np.int64)
+    else:
+        new_points = scale.score_array(values.astype(float))
+    
+    changed = new_points != points.astype(np.int64)
+    if not changed.any():
+        return summary
+    
+    affected = np.unique(student_ids[changed]).tolist()
+    chunks = [affected[i:i + RESCORE_CHUNK_SIZE] for i in range(0, len(affected), RESCORE_CHUNK_SIZE)]
+    
+    ratings_before = {}
+    for chunk in chunks:
+        ratings_before.update(get_student_ratings(student_ids=chunk))
+    
+    db.session.execute(
+        db.update(StandardResult),
+        [
+            {'id': result_id, 'points': new_value}
+            for result_id, new_value in zip(result_ids[changed].tolist(), new_points[changed].tolist())
+        ]
+    )
+    
+    ratings_changed = 0
+    for chunk in chunks:
+        refresh_best_results((student_id, standard_id) for student_id in chunk)
+        ratings_after = refresh_student_ratings(student_ids=chunk)
+        ratings_changed += sum(
+            1 for student_id, rating in ratings_after.items()
+            if ratings_before.get(student_id) != rating
+        )
+    
+    summary['updated'] = int(changed.sum())
+    summary['students'] = len(affected)
+    summary['ratings_changed'] = ratings_changed
+    return summary
+
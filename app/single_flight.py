@@ -0,0 +1,196 @@
+import threading
+import zlib
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+
+
+# Класс ключей advisory-блокировок PostgreSQL для вычисления отчетов
+# (второй ключ - хэш ключа отчета)
+REPORT_LOCK_CLASS = 731002
+
+# Сколько ждать чужого вычисления, прежде чем считать самостоятельно (секунды)
+SINGLE_FLIGHT_TIMEOUT = 60
+
+
+# ===================== ВНУТРИ ПРОЦЕССА =====================
+
+class _Call:
+    """Выполняющееся вычисление, результат которого ждут остальные потоки"""
+    
+    __slots__ = ('done', 'value', 'failed')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вычислений
+    
+    Первый поток с данным ключом вычисляет значение, остальные ждут его
+    и получают тот же результат. Если вычисление завершилось ошибкой или
+    не уложилось в timeout, ожидавшие потоки считают самостоятельно:
+    ошибка одного запроса (например, его сессии БД) не передается другим.
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.fallbacks = 0
+    
+    def do(self, key, compute, timeout=None):
+        """
+        Вычислить значение или дождаться уже идущего вычисления
+        
+        Args:
+            key: Хэшируемый ключ вычисления
+            compute: Функция без аргументов
+            timeout: Предельное время ожидания чужого вычисления (секунды)
+        
+        Returns:
+            Результат compute (общий объект для всех ожидавших - не изменять)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+        
+        if not leader:
+            if call.done.wait(timeout) and not call.failed:
+                with self._lock:
+                    self.shared += 1
+                return call.value
+            
+            with self._lock:
+                self.fallbacks += 1
+            return compute()
+        
+        try:
+            call.value = compute()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            # Ключ удаляется до пробуждения ожидающих: пришедшие позже
+            # начнут новое вычисление, а не получат устаревший результат
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        
+        return call.value
+    
+    def stats(self):
+        """Счетчики вычислений"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'shared': self.shared,
+                'fallbacks': self.fallbacks
+            }
+
+
+def get_single_flight():
+    """Объединитель вычислений текущего приложения (создается при первом обращении)"""
+    flight = current_app.extensions.get('single_flight')
+    if flight is None:
+        flight = current_app.extensions.setdefault('single_flight', SingleFlight())
+    return flight
+
+
+# ===================== МЕЖДУ ПРОЦЕССАМИ =====================
+
+def get_report_lock_key(key):
+    """
+    Ключ advisory-блокировки для ключа отчета
+    
+    Используется crc32, а не hash(): хэш строк различается между
+    процессами, а ключ должен совпадать во всех рабочих процессах.
+    
+    Returns:
+        int: Знаковое 32-битное число
+    """
+    value = zlib.crc32(repr(key).encode('utf-8'))
+    return value - (1 << 32) if value >= (1 << 31) else value
+
+
+def _is_report_lock_enabled():
+    return (current_app.config.get('REPORT_LOCK_ENABLED', True)
+            and db.engine.dialect.name == 'postgresql')
+
+
+@contextmanager
+def report_lock(key):
+    """
+    Advisory-блокировка PostgreSQL на время вычисления отчета
+    
+    Берется на отдельном соединении в его транзакции и снимается при ее
+    откате, поэтому коммиты сессии запроса внутри вычисления блокировку не
+    отпускают. Блокировка только выстраивает процессы в очередь: готовый
+    отчет хранится в памяти процесса, и дождавшийся процесс вычисляет его
+    заново (сокращается лишь одновременная нагрузка на БД). Пока процесс
+    ждет, его запрос держит второе соединение из пула. Если блокировку не
+    удалось получить за SINGLE_FLIGHT_TIMEOUT, вычисление выполняется без нее.
+    
+    Args:
+        key: Ключ отчета
+    """
+    connection = None
+    
+    if _is_report_lock_enabled():
+        timeout = current_app.config.get('SINGLE_FLIGHT_TIMEOUT', SINGLE_FLIGHT_TIMEOUT)
+        try:
+            connection = db.engine.connect()
+            connection.execute(
+                text("SELECT set_config('lock_timeout', :timeout, true)"),
+                {'timeout': f'{int(timeout * 1000)}ms'}
+            )
+            connection.execute(
+                text('SELECT pg_advisory_xact_lock(:lock_class, :lock_key)'),
+                {'lock_class': REPORT_LOCK_CLASS, 'lock_key': get_report_lock_key(key)}
+            )
+        except SQLAlchemyError as e:
+            current_app.logger.warning(f'Блокировка отчета {key!r} не получена: {e}')
+            if connection is not None:
+                connection.close()
+                connection = None
+    
+    try:
+        yield
+    finally:
+        if connection is not None:
+            # Откат транзакции снимает блокировку
+            connection.close()
+
+
+def coalesce(key, compute):
+    """
+    Вычислить отчет один раз на все одновременные запросы
+    
+    Внутри процесса одинаковые вычисления объединяются, между процессами
+    (на PostgreSQL) - только выполняются по очереди под advisory-блокировкой:
+    каждый процесс считает отчет сам, а ожидающий запрос занимает
+    дополнительное соединение пула (см. report_lock).
+    
+    Args:
+        key: Ключ отчета (кортеж простых значений)
+        compute: Функция без аргументов, вычисляющая отчет
+    
+    Returns:
+        Результат compute (общий объект - не изменять)
+    """
+    def locked_compute():
+        with report_lock(key):
+            return compute()
+    
+    timeout = current_app.config.get('SINGLE_FLIGHT_TIMEOUT', SINGLE_FLIGHT_TIMEOUT)
+    return get_single_flight().do(key, locked_compute, timeout)
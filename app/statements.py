@@ -0,0 +1,427 @@
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from flask import current_app
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment
+from openpyxl.utils import get_column_letter
+from app import db
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from app.models import Group, Student, Statement
+from app.utils import get_student_ratings
+
+
+STATEMENT_COLUMNS = [
+    ('№', 6),
+    ('ФИО студента', 40),
+    ('Номер зачетки', 16),
+    ('Посещаемость', 14),
+    ('Модуль 1', 12),
+    ('Модуль 2', 12),
+    ('Бонусы', 10),
+    ('Итого', 10),
+    ('Оценка', 18),
+    ('Результат', 14)
+]
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Ключ advisory-блокировки PostgreSQL на время выдачи номеров ведомостей
+STATEMENT_NUMBER_LOCK = 731001
+
+# Размер блока при упаковке файлов в ZIP
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+# ===================== ДАННЫЕ ВЕДОМОСТИ =====================
+
+def get_statement_header(statement):
+    """
+    Реквизиты ведомости простыми значениями (пригодны для передачи в другой процесс)
+    
+    Args:
+        statement: Объект Statement
+    
+    Returns:
+        dict: Номер, группа, семестр, тип, дата, преподаватель, декан
+    """
+    return {
+        'number': statement.number,
+        'group': statement.group.name,
+        'course': statement.group.course,
+        'semester': statement.semester,
+        'type': statement.type,
+        'date': statement.date.strftime('%d.%m.%Y'),
+        'teacher': statement.teacher.full_name if statement.teacher else '',
+        'dean': statement.dean_name or ''
+    }
+
+
+def get_groups_statement_rows(group_ids):
+    """
+    Строки ведомостей нескольких групп
+    
+    Студенты всех групп читаются одним запросом по столбцам, рейтинги -
+    одним вызовом get_student_ratings на все группы.
+    
+    Args:
+        group_ids: Список ID групп
+    
+    Returns:
+        dict: {group_id: список кортежей (ФИО, номер, посещаемость, модуль 1,
+              модуль 2, бонусы, итого, оценка, результат) в порядке ФИО}
+    """
+    rows = {group_id: [] for group_id in group_ids}
+    if not rows:
+        return rows
+    
+    students = db.session.query(
+        Student.id, Student.group_id, Student.full_name, Student.student_number
+    ).filter(
+        Student.group_id.in_(rows)
+    ).order_by(Student.group_id, Student.full_name, Student.id).all()
+    
+    ratings = get_student_ratings(group_ids=list(rows))
+    
+    for student_id, group_id, full_name, student_number in students:
+        rating = ratings[student_id]
+        # Свежерассчитанный и сохраненный рейтинг различаются типами чисел
+        points = [round(float(rating[key]), 2) for key in ('attendance', 'module1', 'module2', 'bonus', 'total')]
+        rows[group_id].append((
+            full_name,
+            student_number,
+            *points,
+            rating['grade'],
+            'Зачтено' if rating['passed'] else 'Не зачтено'
+        ))
+    
+    return rows
+
+
+def get_statement_rows(group_id):
+    """Строки ведомости одной группы (см. get_groups_statement_rows)"""
+    return get_groups_statement_rows([group_id])[group_id]
+
+
+def statement_digest(header, rows):
+    """Хэш содержимого ведомости - ключ файла в дисковом кэше"""
+    payload = json.dumps([header, rows], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+
+# ===================== ФАЙЛ EXCEL =====================
+
+def write_statement_xlsx(path, header, rows):
+    """
+    Записать ведомость в .xlsx в режиме write_only
+    
+    Строки пишутся в лист потоково, книга сохраняется во временный файл
+    и атомарно переименовывается, чтобы параллельный запрос не увидел
+    недописанный файл.
+    
+    Args:
+        path: Путь итогового файла
+        header: Реквизиты ведомости (get_statement_header)
+        rows: Строки ведомости (get_statement_rows)
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Ведомость')
+    
+    for index, (_, width) in enumerate(STATEMENT_COLUMNS):
+        sheet.column_dimensions[get_column_letter(index + 1)].width = width
+    
+    def bold(value):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.font = Font(bold=True)
+        return cell
+    
+    title = WriteOnlyCell(sheet, value=f'Ведомость № {header["number"]} ({header["type"]})')
+    title.font = Font(bold=True, size=14)
+    sheet.append([title])
+    sheet.append(['Группа:', header['group'], None, f'Курс: {header["course"]}',
+                  None, f'Семестр: {header["semester"]}'])
+    sheet.append(['Дата:', header['date']])
+    sheet.append([])
+    
+    header_cells = []
+    for name, _ in STATEMENT_COLUMNS:
+        cell = bold(name)
+        cell.alignment = Alignment(horizontal='center', wrap_text=True)
+        header_cells.append(cell)
+    sheet.append(header_cells)
+    
+    passed = 0
+    for number, row in enumerate(rows, start=1):
+        sheet.append((number,) + tuple(row))
+        if row[-1] == 'Зачтено':
+            passed += 1
+    
+    sheet.append([])
+    sheet.append([None, bold(f'Всего студентов: {len(rows)}, зачтено: {passed}')])
+    sheet.append([])
+    sheet.append([None, f'Преподаватель: {header["teacher"]}', None, None, None, '____________'])
+    sheet.append([None, f'Декан: {header["dean"]}', None, None, None, '____________'])
+    
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        workbook.save(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def get_generated_statements_folder():
+    """Папка дискового кэша сгенерированных ведомостей"""
+    folder = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), 'statements', 'generated')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _remove_stale_files(folder, statement_id, path):
+    """Удалить прежние версии файла ведомости"""
+    for stale_path in glob.glob(os.path.join(folder, f'statement_{statement_id}_*.xlsx')):
+        if stale_path != path:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+
+
+def generate_statement_files(statements, max_workers=1):
+    """
+    Получить файлы ведомостей, сгенерировав недостающие
+    
+    Строки всех ведомостей собираются пакетно (get_groups_statement_rows).
+    По умолчанию книги Excel пишутся в текущем процессе - так вызывают
+    веб-запросы. Команда flask generate-statements может распределить
+    запись по пулу процессов (max_workers > 1); дочерние процессы работают
+    только с готовыми данными и к БД не обращаются.
+    
+    Имя файла содержит хэш реквизитов и рейтингов, поэтому файл без
+    изменений данных повторно не формируется.
+    
+    Args:
+        statements: Список Statement
+        max_workers: Число процессов записи (1 - без пула процессов)
+    
+    Returns:
+        list: Пары (Statement, абсолютный путь к файлу .xlsx) в исходном порядке
+    """
+    folder = os.path.abspath(get_generated_statements_folder())
+    rows_by_group = get_groups_statement_rows(list({statement.group_id for statement in statements}))
+    
+    files = []
+    tasks = []
+    written = []
+    for statement in statements:
+        header = get_statement_header(statement)
+        rows = rows_by_group[statement.group_id]
+        path = os.path.join(folder, f'statement_{statement.id}_{statement_digest(header, rows)}.xlsx')
+        files.append((statement, path))
+        if not os.path.exists(path):
+            tasks.append((path, header, rows))
+            written.append((statement.id, path))
+    
+    if len(tasks) > 1 and max_workers > 1:
+        # spawn: не наследовать соединения с БД и потоки веб-сервера
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            list(pool.map(write_statement_xlsx, *zip(*tasks)))
+    else:
+        for task in tasks:
+            write_statement_xlsx(*task)
+    
+    for statement_id, path in written:
+        _remove_stale_files(folder, statement_id, path)
+    
+    return files
+
+
+def build_statement_file(statement):
+    """
+    Получить файл одной ведомости (см. generate_statement_files)
+    
+    Args:
+        statement: Объект Statement
+    
+    Returns:
+        str: Абсолютный путь к файлу .xlsx
+    """
+    return generate_statement_files([statement])[0][1]
+
+
+# ===================== ВЕДОМОСТИ ЗА СЕМЕСТР =====================
+
+def _lock_statement_numbers():
+    """Взять advisory-блокировку выдачи ведомостей до конца транзакции (только PostgreSQL)"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': STATEMENT_NUMBER_LOCK})
+
+
+def allocate_statement_numbers(count, year=None):
+    """
+    Выдать номера новых ведомостей вида ФК-<год>-<номер>
+    
+    На PostgreSQL выдача сериализуется транзакционной advisory-блокировкой
+    (держится до коммита), поэтому параллельные запросы не получат один
+    номер. На остальных СУБД защитой служит уникальность Statement.number.
+    Последний номер определяется по числу, а не по строке (ФК-2025-1000
+    больше ФК-2025-999).
+    
+    Args:
+        count: Количество номеров
+        year: Год (по умолчанию текущий)
+    
+    Returns:
+        list: Номера по возрастанию
+    """
+    prefix = f'ФК-{year or date.today().year}-'
+    _lock_statement_numbers()
+    
+    numbers = db.session.query(Statement.number).filter(Statement.number.like(f'{prefix}%')).all()
+    suffixes = [number[len(prefix):] for (number,) in numbers]
+    last = max((int(suffix) for suffix in suffixes if suffix.isdigit()), default=0)
+    
+    return [f'{prefix}{last + offset:03d}' for offset in range(1, count + 1)]
+
+
+def create_semester_statements(semester, statement_type, statement_date, dean_name, created_by):
+    """
+    Создать ведомости всех групп семестра
+    
+    Для групп, у которых ведомость этого семестра и типа уже есть,
+    используется существующая. Проверка наличия выполняется под той же
+    блокировкой, что и выдача номеров, поэтому параллельные запросы не
+    создадут вторую ведомость группы. Новые ведомости оформляются на
+    преподавателя группы, а при его отсутствии - на created_by.
+    Коммит выполняет вызывающий код.
+    
+    Args:
+        semester: Номер семестра
+        statement_type: Тип ведомости ('зачет' или 'экзамен')
+        statement_date: Дата ведомости
+        dean_name: ФИО декана
+        created_by: ID пользователя, запустившего формирование
+    
+    Returns:
+        list: Ведомости в порядке названий групп
+    """
+    groups = db.session.query(Group.id, Group.teacher_id).filter(
+        Group.semester == semester
+    ).order_by(Group.name, Group.id).all()
+    group_ids = [group_id for group_id, _ in groups]
+    if not group_ids:
+        return []
+    
+    # Блокировка держится до коммита вызывающего кода
+    _lock_statement_numbers()
+    existing = {
+        group_id for (group_id,) in db.session.query(Statement.group_id).filter(
+            Statement.group_id.in_(group_ids),
+            Statement.semester == semester,
+            Statement.type == statement_type
+        )
+    }
+    
+    missing = [(group_id, teacher_id) for group_id, teacher_id in groups if group_id not in existing]
+    numbers = allocate_statement_numbers(len(missing), statement_date.year) if missing else []
+    
+    for number, (group_id, teacher_id) in zip(numbers, missing):
+        db.session.add(Statement(
+            number=number,
+            group_id=group_id,
+            semester=semester,
+            type=statement_type,
+            date=statement_date,
+            teacher_id=teacher_id or created_by,
+            dean_name=dean_name
+        ))
+    db.session.flush()
+    
+    statements = Statement.query.options(
+        joinedload(Statement.group),
+        joinedload(Statement.teacher)
+    ).filter(
+        Statement.group_id.in_(group_ids),
+        Statement.semester == semester,
+        Statement.type == statement_type
+    ).order_by(Statement.id).all()
+    
+    # Одна ведомость на группу (самая ранняя), порядок - как у групп
+    by_group = {}
+    for statement in statements:
+        by_group.setdefault(statement.group_id, statement)
+    
+    return [by_group[group_id] for group_id in group_ids]
+
+
+def statement_archive_name(statement):
+    """Имя файла ведомости внутри ZIP-архива"""
+    group_name = statement.group.name.replace('/', '-').replace('\\', '-')
+    return f'Ведомость_{statement.number}_{group_name}.xlsx'
+
+
+class _ZipBuffer:
+    """Поток записи для zipfile, отдающий записанное порциями"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries, chunk_size=ZIP_CHUNK_SIZE):
+    """
+    Потоковая упаковка файлов в ZIP
+    
+    Архив не собирается целиком ни в памяти, ни на диске: данные
+    отдаются по мере чтения исходных файлов (режим записи zipfile
+    в поток без позиционирования). Файлы .xlsx уже сжаты, поэтому
+    сохраняются без сжатия.
+    
+    Args:
+        entries: Пары (имя в архиве, путь к файлу)
+        chunk_size: Размер блока чтения
+    
+    Yields:
+        bytes: Очередная порция архива
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, path in entries:
+            with open(path, 'rb') as source, archive.open(name, 'w') as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    
+    data = buffer.drain()
+    if data:
+        yield data
@@ -116,6 +116,20 @@ async function apiRequest(url, options = {}) {
     }
 }
 
+// Массовое сохранение посещаемости одним запросом
+async function saveAttendanceBulk(url, date, records, csrfToken) {
+    return apiRequest(url, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrfToken
+        },
+        body: JSON.stringify({
+            date: date,
+            records: records
+        })
+    });
+}
+
 // Инициализация tooltips
 document.addEventListener('DOMContentLoaded', function() {
     const tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
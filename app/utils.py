@@ -1,7 +1,11 @@
 from datetime import datetime, date, timedelta
 from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 from app import db
-from app.models import Student, Attendance, StandardResult, Assignment, StandardScale, Theme
+from app.models import Student, Attendance, StandardResult, Assignment
+from app.attendance import get_attendance_counts
 import os
 import uuid
 
@@ -9,15 +13,27 @@ import uuid
 # ===================== РАСЧЕТ БАЛЛОВ =====================
 
 def calculate_attendance_points(student_id):
-    student = Student.query.get(student_id)
-    if not student:
+    counts = get_attendance_counts(student_ids=[student_id]).get(student_id)
+    if not counts:
         return 0
     
-    total = student.attendances.count()
+    return get_attendance_points(counts['present'], counts['total'])
+
+
+def get_attendance_points(present, total):
+    """
+    Перевести количество посещений в баллы за посещаемость
+    
+    Args:
+        present: Количество занятий со статусом "присутствовал"
+        total: Общее количество отмеченных занятий
+    
+    Returns:
+        int: Баллы за посещаемость
+    """
     if total == 0:
         return 0
     
-    present = student.attendances.filter_by(status='присутствовал').count()
     percentage = (present / total) * 100
     
     max_points = current_app.config.get('ATTENDANCE_MAX_POINTS', 30)
@@ -35,19 +51,18 @@ def calculate_attendance_points(student_id):
 
 
 def calculate_module_points(student_id, module_number):
-    from app.models import Module
+    from app.curriculum import get_curriculum
     
-    module = Module.query.filter_by(number=module_number).first()
+    module = get_curriculum().modules_by_number.get(module_number)
     if not module:
         return 0
     
-    themes = module.themes.all()
-    if not themes:
+    if not module.themes:
         return 0
     
     total_points = 0
     
-    for theme in themes:
+    for theme in module.themes:
         theme_points = calculate_theme_points(student_id, theme.id)
         total_points += theme_points
     
@@ -55,25 +70,23 @@ def calculate_module_points(student_id, module_number):
 
 
 def calculate_theme_points(student_id, theme_id):
-    theme = Theme.query.get(theme_id)
+    from app.curriculum import get_curriculum
+    from app.results import get_best_points
+    
+    theme = get_curriculum().themes.get(theme_id)
     if not theme:
         return 0
     
-    standards = theme.standards.filter_by(is_active=True).all()
+    standards = theme.active_standards
     if not standards:
         return 0
     
     total_points = 0
     standards_count = len(standards)
     
+    best_points = get_best_points(student_ids=[student_id])
     for standard in standards:
-        best_result = StandardResult.query.filter_by(
-            student_id=student_id,
-            standard_id=standard.id
-        ).order_by(StandardResult.points.desc()).first()
-        
-        if best_result:
-            total_points += best_result.points
+        total_points += best_points.get((student_id, standard.id), 0)
     
     if standards_count > 0:
         avg_points = total_points / standards_count
@@ -84,15 +97,22 @@ def calculate_theme_points(student_id, theme_id):
 
 
 def calculate_student_rating(student_id):
-    attendance_points = calculate_attendance_points(student_id)
-    module1_points = calculate_module_points(student_id, 1)
-    module2_points = calculate_module_points(student_id, 2)
+    return calculate_ratings(student_ids=[student_id])[student_id]
+
+
+def build_rating(attendance_points, module1_points, module2_points, bonus_points):
+    """
+    Собрать итоговый рейтинг из составляющих
     
-    bonus_points = db.session.query(db.func.sum(Assignment.bonus_points)).filter(
-        Assignment.student_id == student_id,
-        Assignment.status.in_(['выполнено', 'проверено'])
-    ).scalar() or 0
+    Args:
+        attendance_points: Баллы за посещаемость
+        module1_points: Баллы за модуль 1
+        module2_points: Баллы за модуль 2
+        bonus_points: Бонусные баллы за задания
     
+    Returns:
+        dict: Рейтинг (attendance, module1, module2, bonus, total, passed, grade)
+    """
     total = attendance_points + module1_points + module2_points + bonus_points
     
     max_points = current_app.config.get('TOTAL_MAX_POINTS', 100)
@@ -111,32 +131,333 @@ def calculate_student_rating(student_id):
     }
 
 
-def calculate_points_from_result(standard_id, gender, result_value):
-    from app.models import Standard
+def _student_scope(column, student_ids=None, group_ids=None):
+    """
+    Условие фильтрации по студентам для пакетных запросов
     
-    standard = Standard.query.get(standard_id)
-    if not standard:
-        return 0
+    Для групп используется подзапрос, а не список ID, чтобы не передавать
+    в БД тысячи параметров.
     
-    scales = StandardScale.query.filter_by(
-        standard_id=standard_id,
-        gender=gender
-    ).order_by(StandardScale.points.desc()).all()
+    Returns:
+        Условие SQLAlchemy или None (все студенты)
+    """
+    if student_ids is not None:
+        return column.in_(student_ids)
     
-    if not scales:
-        return 0
+    if group_ids is not None:
+        return column.in_(
+            db.select(Student.id).where(Student.group_id.in_(group_ids))
+        )
+    
+    return None
+
+
+def _scoped(query, column, student_ids=None, group_ids=None):
+    condition = _student_scope(column, student_ids, group_ids)
+    if condition is not None:
+        query = query.filter(condition)
+    return query
+
+
+def _get_scope_student_ids(student_ids=None, group_ids=None):
+    """Список ID студентов в выборке (без лишних запросов, если он уже известен)"""
+    if student_ids is not None:
+        return list(dict.fromkeys(student_ids))
+    
+    query = _scoped(db.session.query(Student.id), Student.id, group_ids=group_ids)
+    return [row[0] for row in query.all()]
+
+
+def calculate_attendance_percentages(student_ids=None, group_ids=None):
+    """
+    Процент посещаемости для множества студентов
     
-    for scale in scales:
-        if standard.comparison_type == 'less_better':
-            if scale.max_value is None or result_value <= scale.max_value:
-                if scale.min_value is None or result_value >= scale.min_value:
-                    return scale.points
+    Считается так же, как Student.get_attendance_percentage():
+    присутствие и уважительная причина относительно всех отметок.
+    
+    Args:
+        student_ids: Список ID студентов или None
+        group_ids: Список ID групп или None (если оба None - все студенты)
+    
+    Returns:
+        dict: {student_id: процент}
+    """
+    ids = _get_scope_student_ids(student_ids, group_ids)
+    counts = get_attendance_counts(student_ids, group_ids)
+    
+    percentages = {}
+    for student_id in ids:
+        c = counts.get(student_id)
+        if not c or c['total'] == 0:
+            percentages[student_id] = 0
         else:
-            if scale.min_value is None or result_value >= scale.min_value:
-                if scale.max_value is None or result_value <= scale.max_value:
-                    return scale.points
+            percentages[student_id] = round(((c['present'] + c['excused']) / c['total']) * 100, 1)
     
-    return 1 
+    return percentages
+
+
+def calculate_ratings(student_ids=None, group_ids=None, curriculum=None):
+    """
+    Рассчитать рейтинг сразу для множества студентов
+    
+    Количество запросов к БД не зависит от числа студентов: посещаемость
+    и бонусы считаются агрегирующими запросами, лучшие результаты читаются
+    из проекции student_best_results,
+    а разбалловка по модулям и темам выполняется в Python по тем же правилам,
+    что и calculate_module_points / calculate_theme_points.
+    
+    Args:
+        student_ids: Список ID студентов или None
+        group_ids: Список ID групп или None (если оба None - все студенты)
+        curriculum: Снимок структуры курса или None (текущий из get_curriculum)
+    
+    Returns:
+        dict: {student_id: рейтинг} в формате calculate_student_rating
+    """
+    from app.curriculum import get_curriculum
+    from app.results import get_best_points
+    
+    ids = _get_scope_student_ids(student_ids, group_ids)
+    if not ids:
+        return {}
+    
+    # Структура курса из снимка в памяти (без запросов к БД)
+    if curriculum is None:
+        curriculum = get_curriculum()
+    
+    # Посещаемость
+    attendance = get_attendance_counts(student_ids, group_ids)
+    
+    # Лучший результат по каждому нормативу (проекция student_best_results)
+    best_points = get_best_points(student_ids, group_ids)
+    
+    # Бонусные баллы
+    bonus_query = db.session.query(
+        Assignment.student_id,
+        db.func.sum(Assignment.bonus_points)
+    ).filter(Assignment.status.in_(['выполнено', 'проверено']))
+    bonus_query = _scoped(bonus_query, Assignment.student_id, student_ids, group_ids)
+    bonuses = dict(bonus_query.group_by(Assignment.student_id).all())
+    
+    ratings = {}
+    for student_id in ids:
+        counts = attendance.get(student_id)
+        attendance_points = get_attendance_points(counts['present'], counts['total']) if counts else 0
+        
+        module_points = {}
+        for module_number in (1, 2):
+            module = curriculum.modules_by_number.get(module_number)
+            if not module or not module.themes:
+                module_points[module_number] = 0
+                continue
+            
+            total_points = 0
+            for theme in module.themes:
+                if not theme.active_standards:
+                    continue
+                theme_total = sum(best_points.get((student_id, s.id), 0) for s in theme.active_standards)
+                avg_points = theme_total / len(theme.active_standards)
+                total_points += round((avg_points / 5) * theme.max_points, 2)
+            
+            module_points[module_number] = min(total_points, module.max_points)
+        
+        ratings[student_id] = build_rating(
+            attendance_points,
+            module_points[1],
+            module_points[2],
+            bonuses.get(student_id) or 0
+        )
+    
+    return ratings
+
+
+
+# ===================== СОХРАНЕННЫЕ РЕЙТИНГИ =====================
+
+def refresh_student_ratings(student_ids=None, group_ids=None, curriculum=None):
+    """
+    Пересчитать и сохранить рейтинги в таблицу student_ratings
+    
+    Коммит не выполняется: функция вызывается внутри транзакции, изменяющей
+    исходные данные (посещаемость, результаты, задания), чтобы сохраненный
+    рейтинг и данные фиксировались вместе.
+    
+    Args:
+        student_ids: Список ID студентов или None
+        group_ids: Список ID групп или None (если оба None - все студенты)
+        curriculum: Снимок структуры курса (при изменении структуры в
+            текущей транзакции - построенный через build_curriculum)
+    
+    Returns:
+        dict: {student_id: рейтинг} для пересчитанных студентов
+    """
+    from app.models import StudentRating
+    
+    if student_ids is not None:
+        # Только существующие студенты (удаленные уходят из таблицы каскадно)
+        student_ids = [row[0] for row in db.session.query(Student.id).filter(
+            Student.id.in_(list(dict.fromkeys(student_ids)))
+        ).all()]
+    
+    ratings = calculate_ratings(student_ids, group_ids, curriculum)
+    if not ratings:
+        return {}
+    
+    query = _scoped(StudentRating.query, StudentRating.student_id, student_ids, group_ids)
+    records = {record.student_id: record for record in query.all()}
+    
+    now = datetime.utcnow()
+    for student_id, rating in ratings.items():
+        record = records.get(student_id)
+        if record is None:
+            record = StudentRating(student_id=student_id)
+            db.session.add(record)
+        
+        record.attendance_points = rating['attendance']
+        record.module1_points = rating['module1']
+        record.module2_points = rating['module2']
+        record.bonus_points = rating['bonus']
+        record.total = rating['total']
+        record.passed = rating['passed']
+        record.grade = rating['grade']
+        record.last_recomputed_at = now
+    
+    return ratings
+
+
+def run_ratings_refresh_job(student_ids):
+    """
+    Фоновая задача: пересчитать рейтинги после изменения структуры курса
+    
+    Пересчет идет пачками с коммитом каждой, чтобы не держать одну длинную
+    транзакцию; структура курса берется уже зафиксированная.
+    
+    Args:
+        student_ids: Список ID студентов
+    """
+    from app.scoring import RESCORE_CHUNK_SIZE
+    
+    for i in range(0, len(student_ids), RESCORE_CHUNK_SIZE):
+        refresh_student_ratings(student_ids=student_ids[i:i + RESCORE_CHUNK_SIZE])
+        db.session.commit()
+
+
+def _insert_ratings(connection, ratings):
+    """INSERT ... ON CONFLICT DO NOTHING рассчитанных рейтингов (существующие записи не меняются)"""
+    from app.models import StudentRating
+    
+    if not ratings:
+        return
+    
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    
+    now = datetime.utcnow()
+    connection.execute(insert(StudentRating).on_conflict_do_nothing(index_elements=['student_id']), [
+        {
+            'student_id': student_id,
+            'attendance_points': rating['attendance'],
+            'module1_points': rating['module1'],
+            'module2_points': rating['module2'],
+            'bonus_points': rating['bonus'],
+            'total': rating['total'],
+            'passed': rating['passed'],
+            'grade': rating['grade'],
+            'last_recomputed_at': now
+        }
+        for student_id, rating in ratings.items()
+    ])
+
+
+def create_student_ratings(student_ids):
+    """
+    Создать сохраненные рейтинги добавленных студентов
+    
+    Вызывается путями, добавляющими студентов в обход ORM (импорт, массовая
+    загрузка); для ORM это делает обработчик after_flush. Существующие
+    записи не изменяются. Коммит выполняет вызывающий код.
+    
+    Args:
+        student_ids: Список ID студентов
+    """
+    if student_ids:
+        _insert_ratings(db.session.connection(), calculate_ratings(student_ids=list(student_ids)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _create_ratings_for_new_students(session, flush_context):
+    student_ids = [obj.id for obj in session.new if isinstance(obj, Student)]
+    if student_ids:
+        _insert_ratings(session.connection(), calculate_ratings(student_ids=student_ids))
+
+
+def _store_missing_ratings(ratings):
+    """
+    Сохранить рассчитанные при чтении рейтинги отдельной короткой транзакцией
+    
+    Запись фиксируется сразу на своем соединении, поэтому транзакция
+    вызывающего кода не затрагивается, а параллельные читатели не ждут ее
+    завершения. Только на PostgreSQL: в SQLite второе соединение ждало бы
+    блокировку записи сессии.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    
+    try:
+        with db.engine.begin() as connection:
+            _insert_ratings(connection, ratings)
+    except SQLAlchemyError as e:
+        current_app.logger.warning(f'Не удалось сохранить рейтинги: {e}')
+
+
+def get_student_ratings(student_ids=None, group_ids=None):
+    """
+    Прочитать сохраненные рейтинги студентов
+    
+    Записи создаются при добавлении студентов и обновляются при записи
+    исходных данных. Отсутствующие (база до появления таблицы) рассчитываются
+    и сохраняются отдельной транзакцией, не затрагивающей сессию вызывающего кода.
+    
+    Args:
+        student_ids: Список ID студентов или None
+        group_ids: Список ID групп или None (если оба None - все студенты)
+    
+    Returns:
+        dict: {student_id: рейтинг} в формате calculate_student_rating
+    """
+    from app.models import StudentRating
+    
+    ids = _get_scope_student_ids(student_ids, group_ids)
+    if not ids:
+        return {}
+    
+    query = _scoped(StudentRating.query, StudentRating.student_id, student_ids, group_ids)
+    ratings = {record.student_id: record.to_rating() for record in query.all()}
+    
+    missing = [student_id for student_id in ids if student_id not in ratings]
+    if missing:
+        if len(missing) == len(ids):
+            computed = calculate_ratings(student_ids, group_ids)
+        else:
+            computed = calculate_ratings(student_ids=missing)
+        
+        _store_missing_ratings(computed)
+        ratings.update(computed)
+    
+    return {student_id: ratings[student_id] for student_id in ids}
+
+def calculate_points_from_result(standard_id, gender, result_value):
+    """
+    Рассчитать баллы за результат норматива
+    
+    Используется скомпилированный индекс шкал (app.scoring), поэтому
+    обращение к БД происходит только при первом построении индекса.
+    """
+    from app.scoring import get_scale_index, score_result
+    
+    return score_result(get_scale_index(), int(standard_id), gender, result_value)
 
 
 def get_grade_from_points(points):
@@ -441,14 +762,18 @@ def get_group_statistics(group_id):
             'pass_rate': 0
         }
     
+    student_ids = [s.id for s in students]
+    ratings = calculate_ratings(student_ids=student_ids)
+    attendance = calculate_attendance_percentages(student_ids=student_ids)
+    
     total_attendance = 0
     total_rating = 0
     passed = 0
     failed = 0
     
     for student in students:
-        total_attendance += student.get_attendance_percentage()
-        rating = calculate_student_rating(student.id)
+        total_attendance += attendance[student.id]
+        rating = ratings[student.id]
         total_rating += rating['total']
         
         if rating['passed']:
@@ -42,6 +42,19 @@ class Config:
     # Пагинация
     ITEMS_PER_PAGE = 20
     
+    # Кэши: размер кэша статистики панелей и сброс кэшей во всех
+    # рабочих процессах через PostgreSQL LISTEN/NOTIFY
+    STATS_CACHE_SIZE = 1024
+    CACHE_BUS_ENABLED = True
+    
+    # Объединение одновременных вычислений отчетов: ожидание чужого
+    # вычисления (секунды) и очередь между процессами под advisory-блокировкой
+    SINGLE_FLIGHT_TIMEOUT = 60
+    REPORT_LOCK_ENABLED = True
+    
+    # Время жизни кэша пользователей для Flask-Login (секунды)
+    USER_CACHE_TTL = 60
+    
     # Логирование
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
 
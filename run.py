@@ -1,8 +1,11 @@
 import os
+import click
 from app import create_app, db
 from app.models import (User, Faculty, Specialty, EducationForm, Group, 
                        Student, Module, Theme, Standard, StandardScale,
-                       Attendance, StandardResult, Assignment, Statement)
+                       Attendance, StandardResult, Assignment, Statement,
+                       StudentRating, StudentBestResult, AttendanceBitmap,
+                       AttendanceDailyRollup, ImportJob)
 
 
 # Создать приложение
@@ -30,7 +33,12 @@ def make_shell_context():
         'Attendance': Attendance,
         'StandardResult': StandardResult,
         'Assignment': Assignment,
-        'Statement': Statement
+        'Statement': Statement,
+        'StudentRating': StudentRating,
+        'StudentBestResult': StudentBestResult,
+        'AttendanceBitmap': AttendanceBitmap,
+        'AttendanceDailyRollup': AttendanceDailyRollup,
+        'ImportJob': ImportJob
     }
 
 
@@ -112,6 +120,167 @@ def check_deadlines():
     print(f'Обновлено просроченных заданий: {count}')
 
 
+@app.cli.command()
+def recompute_ratings():
+    """Пересчитать сохраненные рейтинги всех студентов"""
+    from app.utils import refresh_student_ratings
+    ratings = refresh_student_ratings()
+    db.session.commit()
+    print(f'Пересчитано рейтингов: {len(ratings)}')
+
+
+@app.cli.command()
+def rebuild_best_results():
+    """Перестроить таблицу лучших результатов студентов"""
+    from app.results import rebuild_all_best_results
+    count = rebuild_all_best_results()
+    db.session.commit()
+    print(f'Лучших результатов: {count}')
+
+
+@app.cli.command()
+def rebuild_attendance_bitmaps():
+    """Перестроить битовые маски посещаемости"""
+    from app.attendance import rebuild_all_attendance_bitmaps
+    count = rebuild_all_attendance_bitmaps()
+    db.session.commit()
+    print(f'Масок посещаемости: {count}')
+
+
+@app.cli.command()
+def backfill_attendance_rollup():
+    """Заполнить дневную сводку посещаемости по существующим отметкам"""
+    from app.attendance import rebuild_all_daily_rollup
+    count = rebuild_all_daily_rollup()
+    db.session.commit()
+    print(f'Строк дневной сводки: {count}')
+
+
+@app.cli.command()
+def renumber_attempts():
+    """
+    Перенумеровать попытки результатов и добавить ограничение уникальности
+    
+    Обязательный шаг обновления существующей базы (см. readme.md)
+    """
+    from sqlalchemy import text
+    from sqlalchemy.schema import AddConstraint
+    from app.results import ATTEMPT_CONSTRAINT, has_attempt_constraint
+    
+    rows = db.session.query(
+        StandardResult.id,
+        StandardResult.student_id,
+        StandardResult.standard_id,
+        StandardResult.attempt_number
+    ).order_by(
+        StandardResult.student_id,
+        StandardResult.standard_id,
+        StandardResult.date,
+        StandardResult.id
+    ).all()
+    
+    changes = []
+    previous_key = None
+    number = 0
+    for result_id, student_id, standard_id, attempt_number in rows:
+        number = number + 1 if (student_id, standard_id) == previous_key else 1
+        previous_key = (student_id, standard_id)
+        if attempt_number != number:
+            changes.append({'id': result_id, 'attempt_number': number})
+    
+    if changes:
+        # Сначала сдвинуть номера за пределы текущих, чтобы не нарушить ограничение
+        db.session.execute(db.update(StandardResult), [
+            {'id': change['id'], 'attempt_number': -change['attempt_number']} for change in changes
+        ])
+        db.session.execute(db.update(StandardResult), changes)
+    
+    added = not has_attempt_constraint(db.session.connection())
+    if added and db.engine.dialect.name == 'postgresql':
+        constraint = next(c for c in StandardResult.__table__.constraints if c.name == ATTEMPT_CONSTRAINT)
+        db.session.execute(AddConstraint(constraint))
+    elif added:
+        # SQLite не добавляет ограничения в существующую таблицу - уникальный индекс равносилен
+        db.session.execute(text(
+            f'CREATE UNIQUE INDEX {ATTEMPT_CONSTRAINT} '
+            f'ON standard_results (student_id, standard_id, attempt_number)'
+        ))
+    
+    db.session.commit()
+    print(f'Перенумеровано результатов: {len(changes)}')
+    if added:
+        print(f'Добавлено ограничение {ATTEMPT_CONSTRAINT}')
+
+
+@app.cli.command()
+@click.argument('kind', type=click.Choice(['students', 'attendance', 'results']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'user_email', help='Email автора записей (по умолчанию - первый администратор)')
+@click.option('--delimiter', default=',', help='Разделитель CSV: "," ";" или "\\t"')
+def bulk_load(kind, path, user_email, delimiter):
+    """Массовая загрузка студентов, посещаемости или результатов из CSV"""
+    from app.bulk_load import bulk_load as load_csv
+    
+    if user_email:
+        user = User.query.filter_by(email=user_email).first()
+    else:
+        user = User.query.filter_by(role='admin').order_by(User.id).first()
+    if user is None:
+        raise click.ClickException('Пользователь не найден')
+    
+    delimiter = '\t' if delimiter == '\\t' else delimiter
+    
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        summary = load_csv(kind, stream, user.id, delimiter)
+    db.session.commit()
+    
+    print(f'Загружено строк: {summary["loaded"]}, отклонено: {summary["error_count"]}')
+    for line_no, message in summary['errors'][:20]:
+        print(f'  Строка {line_no}: {message}')
+
+
+@app.cli.command()
+@click.option('--semester', type=int, required=True, help='Номер семестра')
+@click.option('--type', 'statement_type', type=click.Choice(['зачет', 'экзамен']), default='зачет',
+              help='Тип ведомости')
+@click.option('--date', 'statement_date', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Дата ведомости (по умолчанию - сегодня)')
+@click.option('--dean', 'dean_name', help='ФИО декана')
+@click.option('--user', 'user_email', help='Email преподавателя для групп без преподавателя '
+                                           '(по умолчанию - первый администратор)')
+@click.option('--workers', type=int, help='Число процессов генерации (по умолчанию - число CPU)')
+@click.option('--output', type=click.Path(dir_okay=False), help='Путь ZIP-архива')
+def generate_statements(semester, statement_type, statement_date, dean_name, user_email, workers, output):
+    """Сформировать ведомости всех групп семестра и упаковать в ZIP"""
+    from datetime import date
+    from app.statements import (create_semester_statements, generate_statement_files,
+                                iter_zip, statement_archive_name)
+    
+    if user_email:
+        user = User.query.filter_by(email=user_email).first()
+    else:
+        user = User.query.filter_by(role='admin').order_by(User.id).first()
+    if user is None:
+        raise click.ClickException('Пользователь не найден')
+    
+    statement_date = statement_date.date() if statement_date else date.today()
+    statements = create_semester_statements(semester, statement_type, statement_date, dean_name, user.id)
+    db.session.commit()
+    
+    if not statements:
+        print(f'Групп в семестре {semester} нет')
+        return
+    
+    files = generate_statement_files(statements, max_workers=workers or os.cpu_count() or 1)
+    
+    output = output or f'statements_semester_{semester}.zip'
+    with open(output, 'wb') as archive:
+        for chunk in iter_zip([(statement_archive_name(statement), path) for statement, path in files]):
+            archive.write(chunk)
+    
+    print(f'Ведомостей: {len(files)}, архив: {output}')
+
+
 @app.cli.command()
 def routes():
     """Показать все маршруты приложения"""
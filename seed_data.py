@@ -741,6 +741,12 @@ def seed_all():
         db.session.commit()
         print(f"Создано ведомостей: {len(statements)}")
         
+        # Рейтинги созданы вместе со студентами, до посещаемости и результатов
+        from app.utils import refresh_student_ratings
+        refresh_student_ratings()
+        db.session.commit()
+        print("Рейтинги студентов пересчитаны")
+        
         print("\nЗаполнение завершено!")
         print("\n" + "=" * 70)
         print("СТАТИСТИКА СОЗДАННЫХ ДАННЫХ:")
@@ -0,0 +1,208 @@
+from datetime import date
+from app.models import Attendance, User
+from tests.test_utils import create_group_with_students
+
+
+def login(client, email, password='pass'):
+    return client.post('/auth/login', data={'email': email, 'password': password})
+
+
+def test_bulk_attendance_upserts_whole_group(app, client):
+    """Массовая отметка создает и обновляет записи одним запросом"""
+    with app.app_context():
+        from app import db
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=3)
+        db.session.commit()
+        student_ids = [s.id for s in students]
+    
+    login(client, 'teacher@test.com')
+    
+    response = client.post('/teacher/attendance/bulk', json={
+        'date': '2025-02-03',
+        'records': [{'student_id': sid, 'status': 'присутствовал'} for sid in student_ids]
+    })
+    assert response.status_code == 200
+    assert response.get_json()['saved'] == 3
+    
+    response = client.post('/teacher/attendance/bulk', json={
+        'date': '2025-02-03',
+        'records': [{'student_id': student_ids[0], 'status': 'уважительная', 'comment': 'Справка'}]
+    })
+    assert response.status_code == 200
+    
+    with app.app_context():
+        records = {a.student_id: a for a in Attendance.query.filter_by(date=date(2025, 2, 3)).all()}
+        assert len(records) == 3
+        assert records[student_ids[0]].status == 'уважительная'
+        assert records[student_ids[0]].comment == 'Справка'
+        assert records[student_ids[1]].status == 'присутствовал'
+
+
+def test_bulk_attendance_rejects_foreign_group(app, client):
+    """Преподаватель не может отмечать студентов чужой группы"""
+    with app.app_context():
+        from app import db
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        other = User(email='other@test.com', full_name='Other', role='teacher')
+        other.set_password('pass')
+        db.session.add(other)
+        db.session.commit()
+        student_id = students[0].id
+    
+    login(client, 'other@test.com')
+    
+    response = client.post('/teacher/attendance/bulk', json={
+        'date': '2025-02-03',
+        'records': [{'student_id': student_id, 'status': 'присутствовал'}]
+    })
+    assert response.status_code == 403
+    
+    response = client.post('/teacher/attendance/bulk', json={
+        'date': '2025-02-03',
+        'records': [{'student_id': student_id, 'status': 'опоздал'}]
+    })
+    assert response.status_code == 400
+
+
+def test_attendance_query_service(app):
+    """Счетчики за период и отметки за дату считаются по всей группе"""
+    with app.app_context():
+        from app import db
+        from app.attendance import get_attendance_counts, get_group_attendance_for_date
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        statuses = ['присутствовал', 'отсутствовал', 'уважительная', 'присутствовал']
+        for day, status in enumerate(statuses, start=1):
+            db.session.add(Attendance(student_id=students[0].id, date=date(2025, 3, day),
+                                      status=status, created_by=teacher.id))
+        db.session.commit()
+        
+        counts = get_attendance_counts(group_ids=[group.id], date_from=date(2025, 3, 2))
+        assert counts == {students[0].id: {'total': 3, 'present': 1, 'absent': 1, 'excused': 1}}
+        
+        records = get_group_attendance_for_date(group.id, date(2025, 3, 3))
+        assert list(records) == [students[0].id]
+        assert records[students[0].id].status == 'уважительная'
+
+
+def test_attendance_bitmaps_follow_writes(app):
+    """Битовые маски совпадают с таблицей attendance после изменений"""
+    with app.app_context():
+        from app import db
+        from app.attendance import (get_bitmap_counts, get_attendance_streaks, get_month_heatmap,
+                                    upsert_attendance, rebuild_all_attendance_bitmaps)
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        student = students[0]
+        statuses = ['присутствовал', 'присутствовал', 'отсутствовал', 'присутствовал',
+                    'присутствовал', 'присутствовал', 'уважительная']
+        for day, status in enumerate(statuses, start=1):
+            db.session.add(Attendance(student_id=student.id, date=date(2025, 3, day),
+                                      status=status, created_by=teacher.id))
+        db.session.add(Attendance(student_id=student.id, date=date(2025, 1, 20),
+                                  status='присутствовал', created_by=teacher.id))
+        db.session.commit()
+        
+        assert get_bitmap_counts([student.id])[student.id] == {
+            'total': 8, 'present': 6, 'absent': 1, 'excused': 1
+        }
+        assert get_attendance_streaks(student.id) == {'current': 0, 'longest': 3}
+        
+        heatmap = get_month_heatmap(student.id, 2025, 3)
+        assert heatmap[3] == 'отсутствовал' and heatmap[7] == 'уважительная' and heatmap[8] is None
+        
+        upsert_attendance(date(2025, 3, 7), [{'student_id': student.id, 'status': 'присутствовал'}], teacher.id)
+        db.session.delete(Attendance.query.filter_by(date=date(2025, 3, 3)).one())
+        db.session.commit()
+        
+        assert get_attendance_streaks(student.id) == {'current': 7, 'longest': 7}
+        assert student.get_attendance_percentage() == 100.0
+        
+        counts = get_bitmap_counts([student.id])
+        assert rebuild_all_attendance_bitmaps() == 2
+        assert get_bitmap_counts([student.id]) == counts
+
+
+def test_existing_attendance_without_bitmaps(app):
+    """На базе без масок проценты берутся из таблицы, а маски строятся при запуске"""
+    with app.app_context():
+        from app import db
+        from app.models import AttendanceBitmap
+        from app.attendance import backfill_attendance_bitmaps, get_attendance_streaks
+        from app.utils import calculate_attendance_percentages, calculate_attendance_points, calculate_ratings
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        student = students[0]
+        # Отметки, записанные до появления масок (в обход синхронизации)
+        db.session.execute(db.insert(Attendance), [
+            {'student_id': student.id, 'date': date(2025, 3, day), 'status': status, 'created_by': teacher.id}
+            for day, status in enumerate(['присутствовал', 'присутствовал', 'отсутствовал'], start=1)
+        ])
+        db.session.commit()
+        assert AttendanceBitmap.query.count() == 0
+        
+        assert student.get_attendance_percentage() == calculate_attendance_percentages([student.id])[student.id]
+        assert student.get_attendance_percentage() == 66.7
+        assert calculate_attendance_points(student.id) == calculate_ratings([student.id])[student.id]['attendance'] == 15
+        
+        assert backfill_attendance_bitmaps() == 1
+        assert get_attendance_streaks(student.id) == {'current': 0, 'longest': 2}
+        assert backfill_attendance_bitmaps() == 0
+
+
+def test_daily_rollup_follows_writes(app):
+    """Дневная сводка совпадает с таблицей attendance после изменений"""
+    with app.app_context():
+        from app import db
+        from app.attendance import (get_attendance_dynamics, get_attendance_by_group,
+                                    upsert_attendance, rebuild_all_daily_rollup)
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=3)
+        for student in students:
+            db.session.add(Attendance(student_id=student.id, date=date(2025, 3, 3),
+                                      status='присутствовал', created_by=teacher.id))
+        db.session.commit()
+        
+        upsert_attendance(date(2025, 3, 3), [{'student_id': students[0].id, 'status': 'отсутствовал'}], teacher.id)
+        upsert_attendance(date(2025, 3, 4), [{'student_id': students[1].id, 'status': 'присутствовал'}], teacher.id)
+        db.session.delete(Attendance.query.filter_by(student_id=students[2].id).one())
+        db.session.commit()
+        
+        dynamics = get_attendance_dynamics(date(2025, 3, 1), date(2025, 3, 31), group_ids=[group.id])
+        assert [(d['date'], d['total'], d['present']) for d in dynamics] == [
+            (date(2025, 3, 3), 2, 1), (date(2025, 3, 4), 1, 1)
+        ]
+        assert get_attendance_by_group()[group.id]['total'] == 3
+        
+        rebuild_all_daily_rollup()
+        assert get_attendance_dynamics(date(2025, 3, 1), date(2025, 3, 31)) == dynamics
+
+
+def test_attendance_journal_pivot(app):
+    """Журнал: строка на студента, столбец на дату, итоги по строкам и столбцам"""
+    with app.app_context():
+        import io
+        from openpyxl import load_workbook
+        from app import db
+        from app.attendance import upsert_attendance, write_attendance_journal
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        upsert_attendance(date(2025, 3, 3), [
+            {'student_id': students[0].id, 'status': 'присутствовал'},
+            {'student_id': students[1].id, 'status': 'отсутствовал'}
+        ], teacher.id)
+        upsert_attendance(date(2025, 3, 5), [{'student_id': students[0].id, 'status': 'уважительная'}], teacher.id)
+        upsert_attendance(date(2025, 4, 1), [{'student_id': students[0].id, 'status': 'присутствовал'}], teacher.id)
+        db.session.commit()
+        
+        journal = io.BytesIO()
+        write_attendance_journal(journal, group, date(2025, 3, 1), date(2025, 3, 31))
+        rows = list(load_workbook(journal).active.iter_rows(min_row=3, values_only=True))
+        
+        assert rows[0][3:5] == ('03.03', '05.03')
+        assert rows[1] == (1, 'Student 0', 'TEST000', '+', 'у', 1, 0, 1, 50.0)
+        assert rows[2] == (2, 'Student 1', 'TEST001', 'н', None, 0, 1, 0, 0)
+        assert rows[4][3:6] == (1, 0, 1)
+        assert rows[5][3:7] == (1, 0, None, 1)
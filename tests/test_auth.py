@@ -65,4 +65,45 @@ def test_get_current_user_authenticated(client, admin_user):
 def test_get_current_user_not_authenticated(client):
     """Тест получения пользователя без авторизации"""
     response = client.get('/auth/me')
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_user_loader_uses_principal_cache(app, client, admin_user):
+    """Пользователь запроса берется из кэша и перечитывается после сброса"""
+    from flask import g
+    from sqlalchemy import event
+    from app import db
+    from app.models import User
+    from app.principals import Principal, invalidate_principals
+    
+    def get(url):
+        # Контекст приложения общий для всех запросов теста - убрать
+        # пользователя, запомненного Flask-Login предыдущим запросом
+        g.pop('_login_user', None)
+        return client.get(url)
+    
+    client.post('/auth/login', data={'email': 'admin@test.com', 'password': 'password123'})
+    
+    statements = []
+    def count_users_queries(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM users' in statement:
+            statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', count_users_queries)
+    try:
+        assert get('/admin/cache-stats').status_code == 200
+        assert isinstance(g._login_user, Principal)
+        assert get('/admin/cache-stats').status_code == 200
+        assert len(statements) == 1
+        
+        user = User.query.filter_by(email='admin@test.com').first()
+        user.full_name = 'Renamed Admin'
+        db.session.commit()
+        invalidate_principals([user.id])
+        statements.clear()
+        
+        assert get('/admin/cache-stats').status_code == 200
+        assert g._login_user.full_name == 'Renamed Admin'
+        assert get('/admin/cache-stats').status_code == 200
+        assert len(statements) == 1
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_users_queries)
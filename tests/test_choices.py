@@ -0,0 +1,75 @@
+from sqlalchemy import event
+from app.models import Group
+from tests.test_utils import create_group_with_students
+
+
+def test_form_choices_cached_until_table_changes(app):
+    """Списки выбора строятся один раз и перестраиваются после коммита изменений таблицы"""
+    with app.app_context():
+        from app import db
+        from app.forms import GroupForm, StudentForm
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        db.session.commit()
+        group_id, specialty_id, education_form_id = group.id, group.specialty_id, group.education_form_id
+        
+        statements = []
+        def count_queries(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        with app.test_request_context():
+            form = GroupForm()
+            assert form.teacher_id.choices == [(0, '-- Не назначен --'), (teacher.id, 'Teacher')]
+            assert form.education_form_id.choices[0][1] == 'Test Form (4.0 лет)'
+            
+            event.listen(db.engine, 'before_cursor_execute', count_queries)
+            try:
+                assert StudentForm().group_id.choices == [(group_id, 'TEST-101')]
+                assert StudentForm().group_id.choices == [(group_id, 'TEST-101')]
+                assert GroupForm().specialty_id.choices == form.specialty_id.choices
+                assert len(statements) == 1
+                
+                db.session.add(Group(name='TEST-100', course=1, semester=1,
+                                     specialty_id=specialty_id, education_form_id=education_form_id))
+                db.session.commit()
+                
+                choices = StudentForm().group_id.choices
+                assert [name for _, name in choices] == ['TEST-100', 'TEST-101']
+                
+                # Откат не меняет версии таблиц
+                db.session.add(Group(name='TEST-102', course=1, semester=1,
+                                     specialty_id=specialty_id, education_form_id=education_form_id))
+                db.session.flush()
+                db.session.rollback()
+                statements.clear()
+                assert StudentForm().group_id.choices == choices
+                assert statements == []
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count_queries)
+
+
+def test_admin_group_form_dropdowns_use_cached_choices(app, client, admin_user):
+    """Повторное открытие формы группы не читает справочники из БД"""
+    with app.app_context():
+        from app import db
+        
+        create_group_with_students(db, students_count=1)
+        db.session.commit()
+        
+        client.post('/auth/login', data={'email': 'admin@test.com', 'password': 'password123'})
+        response = client.get('/admin/groups/create')
+        assert response.status_code == 200
+        assert 'Test Form (4.0 лет)' in response.get_data(as_text=True)
+        
+        statements = []
+        def count_queries(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(db.engine, 'before_cursor_execute', count_queries)
+        try:
+            assert client.get('/admin/groups/create').status_code == 200
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_queries)
+        
+        assert not [s for s in statements if 'FROM specialties' in s or 'FROM education_forms' in s]
+        assert not [s for s in statements if 'users.role = ' in s]
@@ -0,0 +1,66 @@
+import pytest
+from app.models import Module, Theme, Standard
+
+
+def test_curriculum_snapshot_is_rebuilt_after_invalidation(app):
+    """Снимок структуры курса неизменяем и обновляется после сброса"""
+    with app.app_context():
+        from app import db
+        from app.curriculum import get_curriculum, invalidate_curriculum
+        
+        module = Module(number=1, name='Module', max_points=35)
+        db.session.add(module)
+        db.session.flush()
+        theme = Theme(name='Theme', module_id=module.id, max_points=20)
+        db.session.add(theme)
+        db.session.flush()
+        db.session.add(Standard(name='Run', theme_id=theme.id, unit='s', comparison_type='less_better'))
+        db.session.add(Standard(name='Jump', theme_id=theme.id, unit='cm',
+                                comparison_type='more_better', is_active=False))
+        db.session.commit()
+        
+        curriculum = get_curriculum()
+        assert get_curriculum() is curriculum
+        assert [m.number for m in curriculum.modules] == [1]
+        assert len(curriculum.themes[theme.id].standards) == 2
+        assert [s.name for s in curriculum.themes[theme.id].active_standards] == ['Run']
+        
+        with pytest.raises(TypeError):
+            curriculum.themes[theme.id] = None
+        
+        theme.max_points = 25
+        db.session.commit()
+        assert get_curriculum().themes[theme.id].max_points == 20
+        
+        invalidate_curriculum()
+        updated = get_curriculum()
+        assert updated.version == curriculum.version + 1
+        assert updated.themes[theme.id].max_points == 25
+
+
+def test_curriculum_change_refreshes_only_students_with_results(app):
+    """После изменения темы пересчитываются рейтинги только студентов с результатами по ней"""
+    with app.app_context():
+        from datetime import date
+        from app import db
+        from app.models import StandardResult, StudentRating
+        from app.curriculum import invalidate_curriculum
+        from app.routes.admin import _students_with_results
+        from app.utils import refresh_student_ratings, run_ratings_refresh_job
+        from tests.test_utils import create_group_with_students
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        db.session.add(StandardResult(student_id=students[0].id, standard_id=standard.id, result_value=12.0,
+                                      points=5, date=date(2025, 1, 15), created_by=teacher.id))
+        refresh_student_ratings(student_ids=[students[0].id])
+        db.session.commit()
+        assert db.session.get(StudentRating, students[0].id).module1_points == 20
+        
+        standard.theme.max_points = 10
+        db.session.commit()
+        invalidate_curriculum()
+        
+        affected = _students_with_results([standard.theme_id])
+        assert affected == [students[0].id]
+        run_ratings_refresh_job(affected)
+        assert db.session.get(StudentRating, students[0].id).module1_points == 10
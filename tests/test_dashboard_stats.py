@@ -0,0 +1,151 @@
+from datetime import date
+from app.models import Assignment
+from tests.test_utils import create_group_with_students
+
+
+def test_stats_cache_lru_and_group_invalidation():
+    """LRU-вытеснение и сброс только зависящих от группы записей"""
+    from app.dashboard_stats import StatsCache, _MISSING
+    
+    cache = StatsCache(max_size=2)
+    cache.put('a', 1, [1])
+    cache.put('b', 2, [2])
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    
+    assert cache.get('b') is _MISSING
+    assert cache.stats()['evictions'] == 1
+    
+    cache.invalidate([1])
+    assert cache.get('a') is _MISSING and cache.get('c') is _MISSING
+    
+    # Значение, вычисленное до сброса, не сохраняется
+    generation = cache.generation
+    cache.invalidate([5])
+    cache.put('d', 4, [2], generation)
+    assert cache.get('d') is _MISSING
+    assert cache.stats()['hits'] == 1
+
+
+def test_group_stats_invalidated_by_writes(app):
+    """Блок группы берется из кэша и сбрасывается после коммита изменений"""
+    with app.app_context():
+        from app import db
+        from app.attendance import upsert_attendance
+        from app.dashboard_stats import get_group_stats, get_stats_cache
+        from app.utils import refresh_student_ratings, get_student_ratings
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        db.session.commit()
+        
+        # Первое обращение создает недостающие рейтинги
+        get_student_ratings(group_ids=[group.id])
+        db.session.commit()
+        
+        assert get_group_stats([group.id])[group.id]['students_count'] == 2
+        hits = get_stats_cache().hits
+        assert get_group_stats([group.id])[group.id]['attendance_total'] == 0
+        assert get_stats_cache().hits == hits + 1
+        
+        upsert_attendance(date(2025, 3, 3), [{'student_id': students[0].id, 'status': 'присутствовал'}], teacher.id)
+        db.session.commit()
+        assert get_group_stats([group.id])[group.id]['attendance_total'] == 1
+        
+        db.session.add(Assignment(student_id=students[1].id, type='реферат', title='Essay',
+                                  deadline=date(2025, 5, 1), status='выполнено',
+                                  bonus_points=5, created_by=teacher.id))
+        refresh_student_ratings(student_ids=[students[1].id])
+        db.session.commit()
+        assert get_group_stats([group.id])[group.id]['rating_sum'] == 5
+        
+        # Откат не сбрасывает кэш
+        invalidations = get_stats_cache().invalidations
+        upsert_attendance(date(2025, 3, 4), [{'student_id': students[0].id, 'status': 'присутствовал'}], teacher.id)
+        db.session.rollback()
+        assert get_stats_cache().invalidations == invalidations
+
+
+def test_cache_bus_message_applies_remote_invalidation(app):
+    """Сообщение другого процесса сбрасывает локальные кэши, свое - пропускается"""
+    with app.app_context():
+        import json
+        from app.cache_bus import apply_invalidation, get_worker_id
+        from app.curriculum import get_curriculum_version
+        from app.dashboard_stats import get_stats_cache
+        
+        cache = get_stats_cache()
+        cache.put(('group', 1), {}, [1])
+        cache.put(('group', 2), {}, [2])
+        version = get_curriculum_version()
+        
+        apply_invalidation(json.dumps({'origin': get_worker_id(), 'cache': 'stats', 'keys': None}))
+        assert cache.stats()['size'] == 2
+        
+        apply_invalidation(json.dumps({'origin': 'other:1', 'cache': 'stats', 'keys': [1]}))
+        apply_invalidation(json.dumps({'origin': 'other:1', 'cache': 'curriculum', 'keys': None}))
+        assert cache.stats()['size'] == 1
+        assert get_curriculum_version() == version + 1
+
+
+def test_commit_broadcasts_stats_invalidation_without_local_cache(app, monkeypatch):
+    """Процесс без кэша статистики (CLI, фоновое задание) все равно сообщает о сбросе"""
+    with app.app_context():
+        from app import db
+        from app import dashboard_stats
+        from app.attendance import upsert_attendance
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        db.session.commit()
+        
+        published = []
+        monkeypatch.setattr(dashboard_stats, 'publish_invalidation',
+                            lambda cache, keys=None: published.append((cache, keys)))
+        app.extensions.pop('stats_cache', None)
+        
+        upsert_attendance(date(2025, 3, 3), [{'student_id': students[0].id, 'status': 'присутствовал'}], teacher.id)
+        db.session.commit()
+        
+        assert published == [('stats', {group.id})]
+        assert 'stats_cache' not in app.extensions
+
+def test_single_flight_shares_result():
+    """Одновременные вызовы с одним ключом выполняют вычисление один раз"""
+    import threading
+    import time
+    from app.single_flight import SingleFlight, get_report_lock_key
+    
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'value': 42}
+    
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('report', compute, 5)))
+    leader.start()
+    started.wait(5)
+    
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do('report', compute, 5)))
+        for _ in range(3)
+    ]
+    for thread in followers:
+        thread.start()
+    # Дать ожидающим потокам встать в ожидание
+    time.sleep(0.2)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    
+    assert len(calls) == 1
+    assert len(results) == 4 and all(result is results[0] for result in results)
+    assert flight.stats() == {'in_flight': 0, 'leaders': 1, 'shared': 3, 'fallbacks': 0}
+    
+    # Ключ блокировки одинаков во всех процессах и помещается в int4
+    assert get_report_lock_key(('stats', 'department')) == get_report_lock_key(('stats', 'department'))
+    assert -2 ** 31 <= get_report_lock_key(('low_performance', 60)) < 2 ** 31
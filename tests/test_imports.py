@@ -0,0 +1,168 @@
+import csv
+from datetime import datetime
+from openpyxl import Workbook
+from app.models import Student, StudentRating
+from tests.test_utils import create_group_with_students
+
+
+def test_import_students_file_in_chunks(app, tmp_path):
+    """Потоковый импорт вставляет пачками и сообщает об ошибках по строкам"""
+    with app.app_context():
+        from app import db
+        from app.imports import import_students_file
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        db.session.commit()
+        
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['ФИО', 'Номер', 'Группа', 'Пол', 'Дата рождения', 'Медгруппа'])
+        for i in range(5):
+            sheet.append([f'New {i}', f'N{i}', 'TEST-101', 'Ж' if i % 2 else 'м', datetime(2005, 1, i + 1)])
+        sheet.append(['Duplicate', 'TEST000', 'TEST-101', 'м'])
+        sheet.append(['Duplicate in file', 'N1', 'TEST-101', 'м'])
+        sheet.append(['Unknown group', 'N9', 'NOPE', 'м'])
+        sheet.append(['Bad gender', 'N10', 'TEST-101', 'x'])
+        sheet.append([None, None, None, None])
+        filepath = tmp_path / 'students.xlsx'
+        workbook.save(filepath)
+        
+        summary = import_students_file(str(filepath), chunk_size=2)
+        db.session.commit()
+        
+        assert summary['imported'] == 5
+        assert [row_num for row_num, _ in summary['errors']] == [7, 8, 9, 10]
+        assert Student.query.count() == 6
+        # Рейтинги создаются вместе со студентами, а не при первом чтении
+        assert StudentRating.query.count() == 6
+        
+        imported = Student.query.filter_by(student_number='N1').one()
+        assert imported.gender == 'female' and imported.birth_date.year == 2005
+
+
+def test_student_import_job_reports_progress_and_errors(app, tmp_path):
+    """Фоновая задача сохраняет прогресс и CSV-отчет об ошибках"""
+    with app.app_context():
+        import os
+        from app import db
+        from app.models import ImportJob
+        from app.imports import run_student_import_job, get_imports_folder
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        job = ImportJob(filename='students.xlsx', created_by=teacher.id)
+        db.session.add(job)
+        db.session.commit()
+        
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['ФИО', 'Номер', 'Группа', 'Пол'])
+        sheet.append(['New', 'N1', 'TEST-101', 'м'])
+        sheet.append(['Unknown group', 'N2', 'NOPE', 'м'])
+        filepath = tmp_path / 'students.xlsx'
+        workbook.save(filepath)
+        
+        os.makedirs(get_imports_folder(), exist_ok=True)
+        run_student_import_job(job.id, str(filepath))
+        
+        job = db.session.get(ImportJob, job.id)
+        assert (job.status, job.rows_processed, job.imported, job.error_count) == ('завершен', 2, 1, 1)
+        assert not filepath.exists()
+        
+        error_path = os.path.join(get_imports_folder(), job.error_file)
+        with open(error_path, newline='', encoding='utf-8-sig') as error_file:
+            assert list(csv.reader(error_file, delimiter=';'))[1] == ['3', 'группа "NOPE" не найдена']
+        os.remove(error_path)
+
+
+def test_orphaned_jobs_failed_on_startup(app):
+    """Задачи завершившихся процессов помечаются ошибкой, задачи живых и других узлов - нет"""
+    with app.app_context():
+        import os
+        import socket
+        import subprocess
+        import sys
+        from app import db
+        from app.models import ImportJob, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED
+        from app.jobs import fail_orphaned_jobs
+        from app.cache_bus import get_worker_id
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        host = socket.gethostname()
+        workers = [
+            (get_worker_id(), JOB_RUNNING),
+            (f'{host}:{process.pid}', JOB_QUEUED),
+            (f'{host}:{os.getppid()}', JOB_RUNNING),
+            ('other-host:1', JOB_RUNNING),
+            (f'{host}:{process.pid}', JOB_DONE)
+        ]
+        for worker, status in workers:
+            db.session.add(ImportJob(filename='f.csv', created_by=teacher.id, worker=worker, status=status))
+        db.session.commit()
+        
+        assert fail_orphaned_jobs() == 2
+        statuses = [job.status for job in ImportJob.query.order_by(ImportJob.id)]
+        assert statuses == [JOB_FAILED, JOB_FAILED, JOB_RUNNING, JOB_RUNNING, JOB_DONE]
+
+
+def test_bulk_load_csv_merges_rows(app):
+    """Массовая загрузка CSV обновляет существующие записи и отклоняет неверные строки"""
+    with app.app_context():
+        import io
+        from app import db
+        from app.models import Attendance, AttendanceDailyRollup, Group, StandardResult, StandardScale
+        from app.bulk_load import bulk_load
+        from app.results import get_best_points
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        db.session.add(StandardScale(standard_id=standard.id, gender='male', points=5, min_value=0, max_value=10))
+        db.session.commit()
+        
+        summary = bulk_load('students', io.StringIO(
+            'full_name,student_number,group_name,gender,birth_date,medical_group\n'
+            'Renamed,TEST000,TEST-101,м,2004-05-06,\n'
+            'New,N1,TEST-101,ж,,\n'
+            'Bad,N2,NOPE,м,,\n'
+            'Again,N1,TEST-101,ж,,\n'
+        ), teacher.id)
+        db.session.commit()
+        assert (summary['loaded'], [line for line, _ in summary['errors']]) == (2, [4, 5])
+        assert Student.query.filter_by(student_number='TEST000').one().full_name == 'Renamed'
+        assert StudentRating.query.count() == 2
+        
+        summary = bulk_load('attendance', io.StringIO(
+            'student_number;date;status;comment\n'
+            'TEST000;2025-03-03;присутствовал;\n'
+            'TEST000;2025-03-03;отсутствовал;\n'
+            'N1;2025-13-01;присутствовал;\n'
+        ), teacher.id, delimiter=';')
+        db.session.commit()
+        assert (summary['loaded'], summary['error_count']) == (1, 2)
+        assert Attendance.query.one().status == 'присутствовал'
+        
+        # Перевод в другую группу переносит отметку в дневную сводку новой группы
+        other = Group(name='TEST-102', course=1, semester=1, specialty_id=group.specialty_id,
+                      education_form_id=group.education_form_id, teacher_id=teacher.id)
+        db.session.add(other)
+        db.session.commit()
+        bulk_load('students', io.StringIO(
+            'full_name,student_number,group_name,gender,birth_date,medical_group\n'
+            'Renamed,TEST000,TEST-102,м,,\n'
+        ), teacher.id)
+        db.session.commit()
+        assert [(r.group_id, r.count) for r in AttendanceDailyRollup.query.all()] == [(other.id, 1)]
+        
+        summary = bulk_load('results', io.StringIO(
+            'student_number,standard_id,result_value,date\n'
+            f'TEST000,{standard.id},9.5,2025-03-03\n'
+            f'TEST000,{standard.id},12,2025-03-04\n'
+            'TEST000,999,1,2025-03-04\n'
+            f'TEST000,{standard.id},1,2024-02-30\n'
+        ), teacher.id)
+        db.session.commit()
+        assert (summary['loaded'], summary['error_count']) == (2, 2)
+        assert summary['errors'][1] == (5, 'неверная дата')
+        assert sorted((r.attempt_number, r.points) for r in StandardResult.query.all()) == [(1, 5), (2, 1)]
+        assert get_best_points()[(students[0].id, standard.id)] == 5
@@ -0,0 +1,162 @@
+from datetime import date
+from app.models import StandardResult, StudentBestResult
+from tests.test_utils import create_group_with_students
+
+
+def add_result(db, teacher, student, standard, points):
+    result = StandardResult(
+        student_id=student.id,
+        standard_id=standard.id,
+        result_value=15 - points,
+        points=points,
+        date=date(2025, 1, 15),
+        attempt_number=StandardResult.query.filter_by(student_id=student.id, standard_id=standard.id).count() + 1,
+        created_by=teacher.id
+    )
+    db.session.add(result)
+    db.session.commit()
+    return result
+
+
+def test_best_results_follow_result_writes(app):
+    """Проекция лучших результатов обновляется при добавлении, изменении и удалении"""
+    with app.app_context():
+        from app import db
+        from app.results import get_best_results, rebuild_all_best_results
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        student = students[0]
+        
+        first = add_result(db, teacher, student, standard, 3)
+        second = add_result(db, teacher, student, standard, 4)
+        add_result(db, teacher, students[1], standard, 2)
+        
+        best = get_best_results(group_ids=[group.id])
+        assert best[(student.id, standard.id)].id == second.id
+        assert best[(students[1].id, standard.id)].points == 2
+        
+        first.points = 5
+        db.session.commit()
+        assert get_best_results(student_ids=[student.id])[(student.id, standard.id)].id == first.id
+        
+        db.session.delete(first)
+        db.session.commit()
+        assert db.session.get(StudentBestResult, (student.id, standard.id)).result_id == second.id
+        
+        db.session.delete(second)
+        db.session.commit()
+        assert db.session.get(StudentBestResult, (student.id, standard.id)) is None
+        
+        assert rebuild_all_best_results() == 1
+
+
+def test_bulk_result_entry_scores_and_numbers_attempts(app, client):
+    """Пакетный ввод оценивает все ячейки и продолжает нумерацию попыток"""
+    with app.app_context():
+        from app import db
+        from app.models import StandardScale
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        db.session.add(StandardScale(standard_id=standard.id, gender='male', points=5, min_value=0, max_value=10))
+        db.session.add(StandardScale(standard_id=standard.id, gender='male', points=3, min_value=10, max_value=12))
+        add_result(db, teacher, students[0], standard, 2)
+        student_ids = [s.id for s in students]
+        standard_id = standard.id
+    
+    client.post('/auth/login', data={'email': 'teacher@test.com', 'password': 'pass'})
+    
+    response = client.post('/teacher/standards/bulk-results', json={
+        'date': '2025-03-10',
+        'results': [
+            {'student_id': student_ids[0], 'standard_id': standard_id, 'result_value': 9.5},
+            {'student_id': student_ids[1], 'standard_id': standard_id, 'result_value': 11},
+            {'student_id': student_ids[1], 'standard_id': standard_id, 'result_value': 10.5}
+        ]
+    })
+    assert response.status_code == 201
+    assert [(r['points'], r['attempt']) for r in response.get_json()['results']] == [(5, 2), (3, 1), (3, 2)]
+    
+    with app.app_context():
+        from app.results import get_best_results
+        
+        assert StandardResult.query.count() == 4
+        assert get_best_results(student_ids=[student_ids[0]])[(student_ids[0], standard_id)].points == 5
+    
+    response = client.get('/teacher/standards?group_id=1&theme_id=1')
+    assert response.status_code == 200
+    assert b'session-input' in response.data
+
+
+def test_result_matrix_loads_group_in_one_query(app):
+    """Матрица результатов включает студентов без попыток и строится одним запросом"""
+    with app.app_context():
+        from sqlalchemy import event
+        from app import db
+        from app.results import get_result_matrix
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=3)
+        add_result(db, teacher, students[0], standard, 2)
+        best = add_result(db, teacher, students[0], standard, 4)
+        group_id, standard_id, best_id = group.id, standard.id, best.id
+        db.session.expire_all()
+        
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        matrix = get_result_matrix(group_id, [standard_id])
+        
+        assert len(statements) == 1
+        assert [item['student'].full_name for item in matrix] == ['Student 0', 'Student 1', 'Student 2']
+        assert matrix[0]['results'][standard_id].id == best_id
+        assert matrix[1]['results'] == {standard_id: None}
+
+
+def test_attempt_numbers_assigned_by_insert(app):
+    """Номера попыток берутся из MAX + n и не повторяются после удаления"""
+    with app.app_context():
+        import pytest
+        from sqlalchemy.exc import IntegrityError
+        from app import db
+        from app.results import insert_results
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=1)
+        student = students[0]
+        cell = {'student_id': student.id, 'standard_id': standard.id, 'result_value': 12, 'gender': 'male'}
+        
+        assert [r['attempt'] for r in insert_results([cell, cell], date(2025, 3, 1), teacher.id)] == [1, 2]
+        db.session.commit()
+        
+        db.session.delete(StandardResult.query.filter_by(attempt_number=1).one())
+        db.session.commit()
+        assert insert_results([cell], date(2025, 3, 2), teacher.id)[0]['attempt'] == 3
+        db.session.commit()
+        
+        duplicate = StandardResult(student_id=student.id, standard_id=standard.id, result_value=12,
+                                   points=2, date=date(2025, 3, 3), attempt_number=3, created_by=teacher.id)
+        db.session.add(duplicate)
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+
+def test_standards_completion_cached_until_results_change(app):
+    """Сводка выполнения нормативов учитывает фильтры и сбрасывается после записи результата"""
+    with app.app_context():
+        from app import db
+        from app.results import get_standards_completion, get_completion_cache
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=3)
+        cache = get_completion_cache()
+        add_result(db, teacher, students[0], standard, 3)
+        add_result(db, teacher, students[0], standard, 5)
+        
+        summary = get_standards_completion()
+        assert summary['total_students'] == 3
+        assert summary['standards'][standard.id] == {'completed_by': 1, 'attempts': 2, 'avg_points': 4.0}
+        hits = cache.hits
+        assert get_standards_completion() is summary
+        assert cache.hits == hits + 1
+        
+        assert get_standards_completion(course=2) == {'total_students': 0, 'standards': {}}
+        assert get_standards_completion(course=group.course)['standards'][standard.id]['attempts'] == 2
+        
+        add_result(db, teacher, students[1], standard, 2)
+        assert get_standards_completion()['standards'][standard.id]['completed_by'] == 2
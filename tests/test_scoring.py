@@ -0,0 +1,130 @@
+import random
+from app.scoring import compile_scales, score_result
+
+
+def linear_points(scales, value):
+    """Эталонный расчет: первый подходящий интервал по убыванию баллов"""
+    if not scales:
+        return 0
+    for points, min_value, max_value in sorted(scales, key=lambda s: -s[0]):
+        if (min_value is None or value >= min_value) and (max_value is None or value <= max_value):
+            return points
+    return 1
+
+
+def test_compiled_scale_matches_linear_scan():
+    """Поиск bisect дает те же баллы, что и последовательный перебор шкал"""
+    rng = random.Random(42)
+    
+    for standard_id in range(1, 51):
+        scales = []
+        for points in range(1, 6):
+            low = rng.choice([None, rng.randint(0, 20)])
+            high = rng.choice([None, rng.randint(10, 30)])
+            scales.append((points, low, high))
+        
+        index = compile_scales(
+            [(standard_id, 'less_better')],
+            [(standard_id, 'male', p, low, high) for p, low, high in scales]
+        )
+        
+        for value in [v / 2 for v in range(-4, 70)]:
+            assert score_result(index, standard_id, 'male', value) == linear_points(scales, value)
+        
+        assert score_result(index, standard_id, 'female', 10) == 0
+    
+    assert score_result(index, 999, 'male', 10) == 0
+
+
+def test_calculate_points_uses_fresh_index_after_invalidation(app):
+    """После сброса индекса учитываются изменения шкал"""
+    with app.app_context():
+        from app import db
+        from app.models import Module, Theme, Standard, StandardScale
+        from app.scoring import invalidate_scale_index
+        from app.utils import calculate_points_from_result
+        
+        module = Module(number=1, name='Module', max_points=35)
+        db.session.add(module)
+        db.session.flush()
+        theme = Theme(name='Theme', module_id=module.id, max_points=20)
+        db.session.add(theme)
+        db.session.flush()
+        standard = Standard(name='Run', theme_id=theme.id, unit='s', comparison_type='less_better')
+        db.session.add(standard)
+        db.session.flush()
+        db.session.add(StandardScale(standard_id=standard.id, gender='male', points=5, min_value=0, max_value=13))
+        db.session.commit()
+        
+        assert calculate_points_from_result(standard.id, 'male', 12.5) == 5
+        assert calculate_points_from_result(standard.id, 'male', 14) == 1
+        
+        db.session.add(StandardScale(standard_id=standard.id, gender='male', points=4, min_value=13, max_value=15))
+        db.session.commit()
+        invalidate_scale_index()
+        
+        assert calculate_points_from_result(standard.id, 'male', 14) == 4
+
+
+def test_rescore_results_updates_changed_points(app):
+    """Пересчет по шкале обновляет баллы и сохраненные рейтинги"""
+    with app.app_context():
+        from app import db
+        from app.models import StandardScale, StandardResult, StudentRating
+        from app.scoring import build_scale_index, rescore_results
+        from app.utils import get_student_ratings
+        from tests.test_utils import create_group_with_students
+        from datetime import date
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        scale = StandardScale(standard_id=standard.id, gender='male', points=5, min_value=0, max_value=13)
+        db.session.add(scale)
+        for student, value in zip(students, [12.0, 14.0]):
+            db.session.add(StandardResult(
+                student_id=student.id,
+                standard_id=standard.id,
+                result_value=value,
+                points=5 if value <= 13 else 1,
+                date=date(2025, 1, 15),
+                created_by=teacher.id
+            ))
+        db.session.commit()
+        get_student_ratings()
+        
+        # Пересчет идет в транзакции изменения шкалы: откат отменяет и то, и другое
+        scale.max_value = 15
+        db.session.flush()
+        rescore_results(standard.id, 'male', index=build_scale_index())
+        db.session.rollback()
+        assert scale.max_value == 13
+        assert StandardResult.query.filter_by(student_id=students[1].id).one().points == 1
+        
+        scale.max_value = 15
+        db.session.flush()
+        summary = rescore_results(standard.id, 'male', index=build_scale_index())
+        db.session.commit()
+        
+        assert summary == {'checked': 2, 'updated': 1, 'students': 1, 'ratings_changed': 1}
+        assert StandardResult.query.filter_by(student_id=students[1].id).one().points == 5
+        assert db.session.get(StudentRating, students[1].id).module1_points == 20
+
+
+def test_scale_index_built_before_invalidation_is_not_cached(app, monkeypatch):
+    """Индекс по шкалам, прочитанным до сброса, не остается в кэше"""
+    with app.app_context():
+        from app import scoring
+        
+        compile_scales = scoring.compile_scales
+        
+        def compile_during_invalidation(standards, scales):
+            # Администратор изменил шкалу, пока запрос читал старые
+            scoring.invalidate_scale_index(broadcast=False)
+            return compile_scales(standards, scales)
+        
+        monkeypatch.setattr(scoring, 'compile_scales', compile_during_invalidation)
+        stale = scoring.get_scale_index()
+        monkeypatch.undo()
+        
+        assert 'scale_index' not in app.extensions
+        fresh = scoring.get_scale_index()
+        assert fresh is not stale and scoring.get_scale_index() is fresh
@@ -0,0 +1,68 @@
+import os
+from datetime import date
+from openpyxl import load_workbook
+from app.models import Statement, Assignment
+from tests.test_utils import create_group_with_students
+
+
+def test_statement_file_is_cached_by_ratings(app, tmp_path):
+    """Файл ведомости переиспользуется, пока не изменились рейтинги группы"""
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    
+    with app.app_context():
+        from app import db
+        from app.utils import refresh_student_ratings
+        from app.statements import build_statement_file
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=3)
+        statement = Statement(number='ФК-2025-001', group_id=group.id, semester=1,
+                              type='зачет', date=date(2025, 6, 1), teacher_id=teacher.id)
+        db.session.add(statement)
+        db.session.commit()
+        
+        path = build_statement_file(statement)
+        assert build_statement_file(statement) == path
+        
+        sheet = load_workbook(path).active
+        names = [row[1] for row in sheet.iter_rows(min_row=6, max_row=8, values_only=True)]
+        assert names == sorted(student.full_name for student in students)
+        
+        db.session.add(Assignment(student_id=students[0].id, type='реферат', title='Essay',
+                                  deadline=date(2025, 5, 1), status='выполнено',
+                                  bonus_points=5, created_by=teacher.id))
+        refresh_student_ratings(student_ids=[students[0].id])
+        db.session.commit()
+        
+        new_path = build_statement_file(statement)
+        assert new_path != path
+        assert not os.path.exists(path)
+
+
+def test_semester_statements_zip(app, tmp_path):
+    """Ведомости семестра создаются один раз, номера идут по числу, архив потоковый"""
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    
+    with app.app_context():
+        import io
+        import zipfile
+        from app import db
+        from app.statements import (create_semester_statements, generate_statement_files,
+                                    iter_zip, statement_archive_name)
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        db.session.add(Statement(number='ФК-2025-999', group_id=group.id, semester=2,
+                                 type='зачет', date=date(2025, 1, 1), teacher_id=teacher.id))
+        db.session.commit()
+        
+        statements = create_semester_statements(1, 'зачет', date(2025, 6, 1), 'Dean', teacher.id)
+        db.session.commit()
+        assert [statement.number for statement in statements] == ['ФК-2025-1000']
+        assert create_semester_statements(1, 'зачет', date(2025, 6, 1), 'Dean', teacher.id) == statements
+        
+        files = generate_statement_files(statements)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(
+            iter_zip([(statement_archive_name(statement), path) for statement, path in files], chunk_size=512)
+        )))
+        
+        assert archive.namelist() == ['Ведомость_ФК-2025-1000_TEST-101.xlsx']
+        assert archive.testzip() is None
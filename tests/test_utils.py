@@ -0,0 +1,147 @@
+from app.models import (User, Faculty, Specialty, EducationForm, Group, Student,
+                        Module, Theme, Standard, Attendance, StandardResult, Assignment)
+from datetime import date
+
+
+def create_group_with_students(db, students_count=3):
+    """Создать группу со студентами и минимальной структурой курса"""
+    faculty = Faculty(code='TEST', name='Test Faculty')
+    db.session.add(faculty)
+    db.session.flush()
+    
+    specialty = Specialty(code='00.00.00', name='Test Specialty', faculty_id=faculty.id)
+    db.session.add(specialty)
+    db.session.flush()
+    
+    edu_form = EducationForm(name='Test Form', duration_years=4)
+    db.session.add(edu_form)
+    db.session.flush()
+    
+    teacher = User(email='teacher@test.com', full_name='Teacher', role='teacher')
+    teacher.set_password('pass')
+    db.session.add(teacher)
+    db.session.flush()
+    
+    group = Group(
+        name='TEST-101',
+        course=1,
+        semester=1,
+        specialty_id=specialty.id,
+        education_form_id=edu_form.id,
+        teacher_id=teacher.id
+    )
+    db.session.add(group)
+    db.session.flush()
+    
+    module = Module(number=1, name='Test Module', max_points=35)
+    db.session.add(module)
+    db.session.flush()
+    
+    theme = Theme(name='Test Theme', module_id=module.id, max_points=20)
+    db.session.add(theme)
+    db.session.flush()
+    
+    standard = Standard(name='Run', theme_id=theme.id, unit='s', comparison_type='less_better')
+    db.session.add(standard)
+    db.session.flush()
+    
+    students = []
+    for i in range(students_count):
+        student = Student(
+            full_name=f'Student {i}',
+            student_number=f'TEST00{i}',
+            gender='male',
+            group_id=group.id
+        )
+        db.session.add(student)
+        students.append(student)
+    db.session.flush()
+    
+    return teacher, group, standard, students
+
+
+def test_calculate_ratings_matches_single_student(app):
+    """Пакетный расчет рейтинга совпадает с покомпонентным расчетом"""
+    with app.app_context():
+        from app import db
+        from app.utils import (calculate_ratings, calculate_attendance_points,
+                               calculate_module_points)
+        
+        teacher, group, standard, students = create_group_with_students(db)
+        
+        for i, student in enumerate(students):
+            for day in range(10):
+                db.session.add(Attendance(
+                    student_id=student.id,
+                    date=date(2025, 1, day + 1),
+                    status='присутствовал' if day < 10 - i * 2 else 'отсутствовал',
+                    created_by=teacher.id
+                ))
+            db.session.add(StandardResult(
+                student_id=student.id,
+                standard_id=standard.id,
+                result_value=14.0,
+                points=i + 3,
+                date=date(2025, 1, 15),
+                created_by=teacher.id
+            ))
+        
+        db.session.add(Assignment(
+            student_id=students[0].id,
+            type='реферат',
+            title='Test assignment',
+            deadline=date(2025, 2, 1),
+            status='выполнено',
+            bonus_points=5,
+            created_by=teacher.id
+        ))
+        db.session.commit()
+        
+        ratings = calculate_ratings(group_ids=[group.id])
+        
+        assert set(ratings) == {s.id for s in students}
+        for student in students:
+            assert ratings[student.id]['attendance'] == calculate_attendance_points(student.id)
+            assert ratings[student.id]['module1'] == calculate_module_points(student.id, 1)
+        
+        assert ratings[students[0].id]['attendance'] == 30
+        assert ratings[students[0].id]['bonus'] == 5
+
+
+def test_student_ratings_table_follows_writes(app, monkeypatch):
+    """Сохраненный рейтинг создается при чтении и обновляется при записи"""
+    with app.app_context():
+        from app import db
+        from app.models import StudentRating
+        from app.utils import get_student_ratings, refresh_student_ratings, calculate_ratings
+        
+        teacher, group, standard, students = create_group_with_students(db, students_count=2)
+        db.session.commit()
+        
+        # Чтение не фиксирует и не откатывает транзакцию вызывающего кода
+        def forbidden():
+            raise AssertionError('транзакция вызывающего кода завершена')
+        
+        monkeypatch.setattr(db.session, 'commit', forbidden)
+        monkeypatch.setattr(db.session, 'rollback', forbidden)
+        ratings = get_student_ratings(group_ids=[group.id])
+        monkeypatch.undo()
+        db.session.commit()
+        
+        assert StudentRating.query.count() == 2
+        assert ratings[students[0].id]['module1'] == 0
+        
+        db.session.add(StandardResult(
+            student_id=students[0].id,
+            standard_id=standard.id,
+            result_value=14.0,
+            points=5,
+            date=date(2025, 1, 15),
+            created_by=teacher.id
+        ))
+        refresh_student_ratings(student_ids=[students[0].id])
+        db.session.commit()
+        
+        stored = get_student_ratings(student_ids=[students[0].id])[students[0].id]
+        assert stored == calculate_ratings(student_ids=[students[0].id])[students[0].id]
+        assert stored['module1'] == 20